@@ -0,0 +1,361 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import itertools
+import mimetypes
+import aiohttp
+import tracing
+from typing import Awaitable
+from engine import UploadListener
+from folders import FOLDER_MIMETYPE
+from ratelimit import RETRY_STATUSES, RateLimiter, is_rate_limited
+from resumable import EXPIRED_STATUSES, SessionStore, round_chunk_size
+from uploader import UploadOptions, get_dated_folder_name
+from walker import walk
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+ROOT_URL: str = "https://www.googleapis.com/"
+REQUEST_CLASSES: tuple[str, ...] = ("folder", "small", "chunk")
+DEFAULT_LIMITS: dict[str, int] = {"folder": 32, "small": 256, "chunk": 8}
+WALK_BATCH: int = 256 # < Entries taken from the folder scan per hop to its thread
+TRANSIENT_ERRORS: tuple[type[Exception], ...] = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)
+
+# < ======================================================================================================
+# < Exceptions
+# < ======================================================================================================
+
+class DriveRequestError(Exception):
+
+    def __init__(self, status: int, content: bytes) -> None:
+        """Raised when a Drive request fails with a status that is not worth retrying, or after every retry"""
+        super().__init__(f"Drive request failed with status {status}: {content[:500].decode('utf-8', errors = 'replace')}")
+        self.status: int = status
+        self.content: bytes = content
+
+# < ======================================================================================================
+# < Async Drive Class
+# < ======================================================================================================
+
+class AsyncDrive:
+
+    def __init__(self, session: aiohttp.ClientSession, credentials: any, limiter: RateLimiter, limits: dict[str, int] = None, root_url: str = ROOT_URL) -> None:
+        """Initialise a minimal Drive v3 REST client sending requests on session, authorised by credentials
+
+        Each request class in REQUEST_CLASSES has its own bound on requests in flight, so hundreds of tiny uploads can
+        run at once without resumable chunks, which each hold a whole chunk in memory, doing the same. Every request
+        takes a token from limiter, and any bandwidth cap on it, first, and failures are retried with its backoff.
+        Requests go to the Drive API at root_url, which only differs for a stand-in such as fakedrive"""
+        self.session: aiohttp.ClientSession = session
+        self.credentials: any = credentials
+        self.limiter: RateLimiter = limiter
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.semaphores: dict[str, asyncio.Semaphore] = {name: asyncio.Semaphore(max(1, limits[name])) for name in REQUEST_CLASSES}
+        self.buffers: dict[str, asyncio.Semaphore] = {name: asyncio.Semaphore(max(1, limits[name])) for name in REQUEST_CLASSES} # < Held from reading a body until it is sent, so only as many bodies are in memory as could be in flight
+        self.refresh_lock: asyncio.Lock = asyncio.Lock()
+        self.files_url: str = f"{root_url}drive/v3/files"
+        self.upload_url: str = f"{root_url}upload/drive/v3/files"
+
+    async def authorization(self, force: bool = False) -> dict[str, str]:
+        """Get the Authorization header, refreshing the credentials on a thread first if they have expired"""
+        if force or not self.credentials.valid:
+            async with self.refresh_lock:
+                if force or not self.credentials.valid:
+                    from google.auth.transport.requests import Request
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+                    force = False
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    async def throttle(self) -> None:
+        """Wait for a token from the shared limiter"""
+        waiting: float = time.perf_counter()
+        while (delay := self.limiter.reserve()) > 0:
+            await asyncio.sleep(delay)
+        tracing.wait("rate limit", "throttle", waiting, overlapping = True)
+
+    async def pause(self, delay: float, cause: str) -> None:
+        """Sleep out a retry backoff"""
+        with tracing.span("backoff", "retry", overlapping = True, cause = cause):
+            await asyncio.sleep(delay)
+
+    async def send(self, kind: str, method: str, url: str, data: bytes = None, headers: dict = None, params: dict = None) -> tuple[int, dict, bytes]:
+        """Send one request of class kind without retrying, returning its status, headers and body"""
+        await self.throttle()
+        if data and self.limiter.bandwidth is not None:
+            waiting: float = time.perf_counter()
+            await asyncio.to_thread(self.limiter.bandwidth.consume, len(data))
+            tracing.wait("bandwidth cap", "bandwidth", waiting, overlapping = True)
+        headers = {**(headers or {}), **(await self.authorization())}
+        waiting = time.perf_counter()
+        async with self.semaphores[kind]:
+            tracing.wait(f"{kind} slot", "queue", waiting, overlapping = True)
+            with tracing.span(f"{method} {kind}", "request", overlapping = True, bytes = len(data or b"")) as span:
+                async with self.session.request(method, url, data = data, headers = headers, params = params) as response:
+                    span.set(status = response.status)
+                    return response.status, dict(response.headers), await response.read()
+
+    async def request(self, kind: str, method: str, url: str, data: bytes = None, headers: dict = None, params: dict = None) -> dict:
+        """Send a request of class kind, retrying transient failures, and return its decoded JSON response"""
+
+        attempt: int = 0
+        refreshed: bool = False
+
+        while True:
+
+            try:
+                status, response_headers, body = await self.send(kind, method, url, data, headers, params)
+            except TRANSIENT_ERRORS as e:
+                if attempt >= self.limiter.retries:
+                    raise
+                delay: float = self.limiter.backoff(attempt)
+                logging.info(f"Retrying {method} request in {delay:.1f}s after {e!r}")
+                await self.pause(delay, repr(e))
+                attempt += 1
+                continue
+
+            if status == 401 and not refreshed:
+                await self.authorization(force = True)
+                refreshed = True
+                continue
+
+            if status < 300:
+                return json.loads(body) if body else {}
+
+            throttled: bool = is_rate_limited(status, body)
+            if (status not in RETRY_STATUSES and not throttled) or attempt >= self.limiter.retries:
+                raise DriveRequestError(status, body)
+
+            delay: float = self.limiter.backoff(attempt, throttled)
+            logging.info(f"Retrying {method} request in {delay:.1f}s after status {status}")
+            await self.pause(delay, f"status {status}")
+            attempt += 1
+
+    async def create_folder(self, folder_name: str, parent_folder_id: str = None) -> str:
+        """Create a folder and return its ID"""
+        metadata: dict = {'name': folder_name, 'mimeType': FOLDER_MIMETYPE}
+        if parent_folder_id is not None:
+            metadata['parents'] = [parent_folder_id]
+        response: dict = await self.request("folder", "POST", self.files_url, json.dumps(metadata).encode("utf-8"), {"Content-Type": "application/json; charset=UTF-8"}, {"fields": "id"})
+        logging.info(f"Created folder on Google Drive [{folder_name} - {response['id']}]")
+        return response['id']
+
+    async def upload_multipart(self, metadata: dict, content: bytes, mimetype: str) -> dict:
+        """Create a file from metadata and content in a single multipart request"""
+        boundary: str = uuid.uuid4().hex
+        head: bytes = f"--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(metadata)}\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n\r\n".encode("utf-8")
+        body: bytes = head + content + f"\r\n--{boundary}--".encode("utf-8")
+        return await self.request("small", "POST", self.upload_url, body, {"Content-Type": f"multipart/related; boundary={boundary}"}, {"uploadType": "multipart", "fields": "id"})
+
+    async def start_session(self, metadata: dict, mimetype: str, size: int) -> str:
+        """Start a resumable upload session and return its URI"""
+        headers: dict = {"Content-Type": "application/json; charset=UTF-8", "X-Upload-Content-Type": mimetype, "X-Upload-Content-Length": str(size)}
+        for attempt in itertools.count():
+            status, response_headers, body = await self.send("chunk", "POST", self.upload_url, json.dumps(metadata).encode("utf-8"), headers, {"uploadType": "resumable", "fields": "id"})
+            if status < 300:
+                return response_headers["Location"]
+            if (status not in RETRY_STATUSES and not is_rate_limited(status, body)) or attempt >= self.limiter.retries:
+                raise DriveRequestError(status, body)
+            await self.pause(self.limiter.backoff(attempt, is_rate_limited(status, body)), f"status {status}")
+
+    async def upload_resumable(self, filepath: str, metadata: dict, mimetype: str, size: int, chunk_size: int, store: SessionStore, folder_id: str, listener: UploadListener) -> dict:
+        """Upload filepath in chunks through a resumable session, resuming a session saved for it by either engine
+
+        A chunk that fails is not sent again blindly, Drive is first asked how many bytes it committed"""
+
+        key: str = store.key(filepath, folder_id)
+        state: dict | None = store.load(key)
+        chunk_size = round_chunk_size(chunk_size)
+        uri: str | None = state["uri"] if state is not None else None
+        offset: int | None = None if state is not None else 0
+        attempt: int = 0
+
+        while True:
+
+            if uri is None:
+                uri = await self.start_session(metadata, mimetype, size)
+                offset = 0
+
+            async with self.buffers["chunk"]:
+
+                if offset is None:
+                    headers: dict = {"Content-Range": f"bytes */{size}"} # < Asks Drive for the bytes it committed
+                    data: bytes = b""
+                else:
+                    listener.check_cancelled()
+                    data = await asyncio.to_thread(read_chunk, filepath, offset, chunk_size)
+                    headers = {"Content-Range": f"bytes {offset}-{offset + len(data) - 1}/{size}" if data else f"bytes */{size}"}
+
+                try:
+                    status, response_headers, body = await self.send("chunk", "PUT", uri, data, headers)
+                except TRANSIENT_ERRORS as e:
+                    status, response_headers, body = 0, {}, repr(e).encode("utf-8")
+                del data # < Not kept while waiting for the buffer again
+
+            if status in (200, 201):
+                store.discard(key)
+                listener.file_progress(filepath, size, size)
+                return json.loads(body)
+
+            if status == 308:
+                committed: str | None = response_headers.get("Range")
+                offset = int(committed.rpartition("-")[2]) + 1 if committed else 0
+                attempt = 0
+                store.save(key, {"uri": uri, "offset": offset, "filepath": filepath})
+                listener.file_progress(filepath, offset, size)
+                continue
+
+            if status in EXPIRED_STATUSES:
+                logging.info(f"Upload session for {filepath} has expired, restarting from byte 0")
+                store.discard(key)
+                uri = None
+                continue
+
+            if status == 401:
+                await self.authorization(force = True)
+            elif (status and status not in RETRY_STATUSES and not is_rate_limited(status, body)) or attempt >= self.limiter.retries:
+                raise DriveRequestError(status, body)
+            else:
+                await self.pause(self.limiter.backoff(attempt, is_rate_limited(status, body)), f"status {status}")
+                attempt += 1
+            offset = None
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def read_chunk(filepath: str, offset: int, size: int) -> bytes:
+    """Read up to size bytes of filepath from offset"""
+    with open(filepath, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+def read_file(filepath: str) -> bytes:
+    """Read the whole of filepath"""
+    with open(filepath, "rb") as f:
+        return f.read()
+
+async def upload_file_async(drive: AsyncDrive, filepath: str, folder: Awaitable[str], options: UploadOptions, listener: UploadListener) -> str:
+    """Upload filepath into the folder whose ID folder resolves to, once that folder exists"""
+
+    folder_id: str = await folder
+    listener.check_cancelled()
+
+    mimetype: str = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+    metadata: dict = {'name': os.path.basename(filepath), 'parents': [folder_id]}
+    size: int = os.path.getsize(filepath)
+    listener.file_started(filepath, size)
+
+    try:
+        with tracing.span("upload_file_async", "task", overlapping = True, target = filepath, bytes = size):
+            if size >= options.resumable_threshold:
+                store: SessionStore = SessionStore(None) # < Every run uploads into a new dated subfolder, so a saved session could never be resumed
+                file: dict = await drive.upload_resumable(filepath, metadata, mimetype, size, options.chunk_size, store, folder_id, listener)
+            else:
+                async with drive.buffers["small"]: # < Not read until a slot frees up, rather than waiting for one in memory
+                    file = await drive.upload_multipart(metadata, await asyncio.to_thread(read_file, filepath), mimetype)
+                listener.file_progress(filepath, size, size)
+    except Exception as e:
+        listener.file_failed(filepath, e)
+        raise
+
+    listener.file_done(filepath, file['id'])
+    return file['id']
+
+async def create_folder_async(drive: AsyncDrive, folder_name: str, parent: Awaitable[str], listener: UploadListener) -> str:
+    """Create a folder inside the folder whose ID parent resolves to, once that folder exists"""
+    parent_folder_id: str = await parent
+    listener.check_cancelled()
+    return await drive.create_folder(folder_name, parent_folder_id)
+
+async def upload_mixed_async(credentials: any, filepaths: list[str], folderpaths: list[str], folder_id: str = None, options: UploadOptions = None, listener: UploadListener = None, root_url: str = ROOT_URL) -> str:
+    """Create a dated subfolder within folder_id and upload filepaths and folderpaths into it, as upload_mixed does,
+    from a single thread running an asyncio event loop, returning the ID of the dated subfolder
+
+    Every folder and file is its own task, started as soon as the scan finds it and waiting only on the task creating
+    its parent folder, with at most options.queue_size tasks unfinished at once. Requests in flight are bounded per
+    request class by options.async_limits rather than by a number of worker threads, and folders are scanned with the
+    same ignore rules as the threaded engine. Errors are collected and the first is raised once every task is done"""
+
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+    limits: dict[str, int] = {**DEFAULT_LIMITS, **options.async_limits}
+    connector: aiohttp.TCPConnector = aiohttp.TCPConnector(limit = sum(limits.values()))
+    timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total = None, sock_connect = 30, sock_read = 120)
+
+    async with aiohttp.ClientSession(connector = connector, timeout = timeout) as session:
+
+        drive: AsyncDrive = AsyncDrive(session, credentials, options.rate_limiter, limits, root_url)
+        slots: asyncio.Semaphore = asyncio.Semaphore(max(1, options.queue_size))
+        tasks: set[asyncio.Task] = set()
+        errors: list[BaseException] = []
+
+        def finished(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            slots.release()
+            if not task.cancelled() and task.exception() is not None:
+                if not errors:
+                    logging.info(f"An error occurred in an upload task: {task.exception()!r}")
+                errors.append(task.exception())
+
+        async def start(coroutine: Awaitable) -> asyncio.Task:
+            await slots.acquire()
+            task: asyncio.Task = asyncio.create_task(coroutine)
+            tasks.add(task)
+            task.add_done_callback(finished)
+            return task
+
+        subfolder_id: str = await drive.create_folder(get_dated_folder_name(), folder_id)
+        subfolder: asyncio.Future = asyncio.get_running_loop().create_future()
+        subfolder.set_result(subfolder_id)
+
+        try:
+
+            for filepath in filepaths:
+                await start(upload_file_async(drive, filepath, subfolder, options, listener))
+
+            folders: dict[str, Awaitable[str]] = {}
+            for local_folder_path in folderpaths:
+                logging.info(f"Uploading folder: {local_folder_path}")
+                folders[local_folder_path] = await start(create_folder_async(drive, os.path.basename(local_folder_path), subfolder, listener))
+
+            entries = walk(folderpaths, options.ignore_rules, options.ignore_files)
+            while batch := await asyncio.to_thread(lambda: list(itertools.islice(entries, WALK_BATCH))):
+                listener.check_cancelled()
+                for parent_path, entry in batch:
+                    if entry.is_dir():
+                        folders[entry.path] = await start(create_folder_async(drive, entry.name, folders[parent_path], listener))
+                    else:
+                        await start(upload_file_async(drive, entry.path, folders[parent_path], options, listener))
+
+            while tasks:
+                await asyncio.wait(set(tasks))
+
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions = True)
+            raise
+
+    if errors:
+        raise errors[0]
+
+    logging.info(f"Asyncio engine uploaded into subfolder {subfolder_id}")
+    return subfolder_id
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -3,103 +3,232 @@
 # < Imports
 # < ======================================================================================================
 
+import os
 import json
 import logging
 import logging.handlers
+import threading
+from datetime import datetime, timezone
+from functools import cache
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.http import build_http
+from google_auth_httplib2 import AuthorizedHttp
+from ratelimit import RateLimitedHttp, RateLimiter
+from transport import ConnectionPool
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+REFRESH_MARGIN: float = 300.0 # < Seconds before expiry to refresh, ahead of the 3m45s at which google-auth treats a token as expired
+RETRY_INTERVAL: float = 60.0
+
+# < ======================================================================================================
+# < Exceptions
+# < ======================================================================================================
+
+class AuthenticationError(Exception):
+    """Raised when no valid Google credentials can be loaded, refreshed or signed in for"""
 
 # < ======================================================================================================
 # < Functions
 # < ======================================================================================================
 
+@cache
+def discovery_document() -> dict | None:
+    """Get the parsed Drive v3 discovery document bundled with googleapiclient, parsed once per process"""
+    document: str | None = discovery_cache.get_static_doc('drive', 'v3')
+    return json.loads(document) if document is not None else None
+
+def build_drive_service(credentials: Credentials, limiter: RateLimiter = None, pool: ConnectionPool = None, root_url: str = None) -> any:
+    """Build a Drive service from the bundled discovery document, without fetching it over the network
+
+    Requests are sent through the shared keep-alive connections of pool if one is given, or a private httplib2 transport.
+    root_url points every request, uploads and batches included, somewhere other than Google, such as a fakedrive.FakeDrive"""
+    http: any = pool.http(credentials) if pool is not None else AuthorizedHttp(credentials, http = build_http()) # < Which leaves 308 to resumable uploads rather than following it
+    if limiter is not None:
+        http = RateLimitedHttp(http, limiter)
+    document: dict | None = discovery_document()
+    if document is not None and root_url is not None:
+        document = {**document, "rootUrl": root_url}
+    if document is None:
+        return build('drive', 'v3', http = http, static_discovery = False)
+    return build_from_document(document, http = http)
+
 def generate_credentials(client_secret_path: str, scopes: list[str]) -> Credentials:
     """Function to sign in to Google and return OAuth 2.0 credentials"""  
+    from google_auth_oauthlib.flow import InstalledAppFlow # < Only needed to sign in, and slow to import
     flow: InstalledAppFlow = InstalledAppFlow.from_client_secrets_file(client_secret_path, scopes)
     credentials: Credentials = flow.run_local_server(port = 8080)
     return credentials
 
 def save_credentials(credentials: Credentials, token_path: str) -> None:
-    """Save Credentials object to a a json file"""
-    with open(token_path, "w") as f:
+    """Save Credentials object to a a json file, atomically so a crash mid-write never leaves a corrupt token"""
+    temporary_path: str = f"{token_path}.tmp"
+    with open(temporary_path, "w") as f:
         f.write(credentials.to_json())
+    os.replace(temporary_path, token_path)
 
-def load_credentials(token_path: str) -> Credentials:
+def load_credentials(token_path: str) -> "SharedCredentials":
     """Load credentials object from the token json file"""
     with open(token_path, "r") as f:
         token: dict = json.load(f)
-    credentials: Credentials = Credentials.from_authorized_user_info(token)
+    credentials: SharedCredentials = SharedCredentials.from_authorized_user_info(token)
     return credentials
 
-def get_drive_service(token_path: str, client_secret_path: str, scopes: list[str]) -> any:
-    """Get an authenticated Google Drive service instance using client_secrets and or token.json"""
+def get_credentials(token_path: str, client_secret_path: str, scopes: list[str], sign_in: bool = True) -> "SharedCredentials":
+    """Get valid credentials from token.json, refreshing them if expired or signing in with client_secrets if that fails
+
+    Raises AuthenticationError if no valid credentials can be had, or if signing in is needed but sign_in is False,
+    as when nobody is there to use the browser. New credentials are saved to token_path"""
 
-    credentials: any = None
+    credentials: SharedCredentials | None = None
 
     try:
         logging.info("Attempting to load credentials")
-        credentials: Credentials = load_credentials(token_path)  
+        credentials = load_credentials(token_path)
     except Exception as e:
         logging.info(f"An error occurred attempting to load credentials from {token_path}: {e}. Skipping to authentication")
     else:
         logging.info(f"Credentials loaded from {token_path}")
 
+    if credentials is not None and credentials.valid:
+        return credentials
+
+    if credentials is not None and credentials.expired and credentials.refresh_token:
+        from google.auth.transport.requests import Request # < Only needed to refresh, and slow to import
+        try:
+            logging.info("Attempting to refresh credentials")
+            credentials.refresh(Request())
+        except Exception as e:
+            logging.info(f"An error occurred processing credential refresh: {e}. Skipping to authentication")
+        else:
+            logging.info("Credentials refreshed successfully")
+
+    if (credentials is None or not credentials.valid) and not sign_in:
+        raise AuthenticationError(f"No valid credentials in {token_path} and signing in is disabled")
+
     if credentials is None or not credentials.valid:
+        try:
+            logging.info("No valid credentials available. Attempting Google OAuth Sign In to generate credentials.")
+            credentials = SharedCredentials.from_authorized_user_info(json.loads(generate_credentials(client_secret_path, scopes).to_json()))
+        except Exception as e:
+            raise AuthenticationError(f"Could not sign in to Google: {e}") from e
+        logging.info("Credentials successfully generated")
+
+    try:
+        save_credentials(credentials, token_path)
+    except OSError as e:
+        logging.warning(f"An error occurred attempting to save credentials to {token_path}, they will be used unsaved: {e}")
+    else:
+        logging.info(f"Credentials saved successfully to {token_path}")
 
-        if credentials and credentials.expired and credentials.refresh_token:
+    return credentials
 
-            request: Request = Request()
+def get_drive_service(token_path: str, client_secret_path: str, scopes: list[str], limiter: RateLimiter = None, pool: ConnectionPool = None) -> any:
+    """Get an authenticated Google Drive service instance using client_secrets and or token.json
 
-            try:
-                logging.info("Attempting to refresh credentials")
-                credentials.refresh(request)
-            except Exception as e:
-                logging.info(f"An error occurred processing credential refresh: {e}")
-                quit()
-            else:
-                logging.info(f"Credentials refreshed successfully")
-
-                try:
-                    logging.info(f"Attempting to save credentials to {token_path}")
-                    save_credentials(credentials, token_path)
-                except Exception as e:
-                    logging.info(f"An error occurred attempting to save credentials: {e}")
-                    quit()
-                else:
-                    logging.info(f"Credentials saved successfully to {token_path}")
+    If limiter is given every request the service makes is throttled and retried through it, and if pool is given
+    requests reuse its keep-alive connections. Raises AuthenticationError if signing in fails, uploads building many
+    services should share one CredentialManager instead"""
+    credentials: SharedCredentials = get_credentials(token_path, client_secret_path, scopes)
+    logging.info("Credentials checks passed. Attempting to build Google Drive Resource Object")
+    return build_drive_service(credentials, limiter, pool)
 
-        else:
+# < ======================================================================================================
+# < Shared Credentials Class
+# < ======================================================================================================
 
-            try: 
-                logging.info(f"No valid credentials available. Attempting Google OAuth Sign In to generate credentials.")
-                credentials: Credentials = generate_credentials(client_secret_path, scopes)
-            except Exception as e:
-                logging.info(f"An error occurred attempting to generate credentials: {e}")
-                quit()
-            else:
-                logging.info(f"Credentials successfully generated")
-
-                try:
-                    logging.info(f"Attempting to save credentials to {token_path}")
-                    save_credentials(credentials, token_path)
-                except Exception as e:
-                    logging.info(f"An error occurred attempting to save credentials: {e}")
-                    quit()
-                else:
-                    logging.info(f"Credentials saved successfully to {token_path}")
+class SharedCredentials(Credentials):
 
-    else:
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialise OAuth 2.0 user credentials that every worker thread can share
+
+        Only one thread refreshes at a time, and a thread that waited on another's refresh uses the new token
+        rather than refreshing again, so a token expiring under many workers costs a single refresh"""
+        super().__init__(*args, **kwargs)
+        self.refresh_lock: threading.Lock = threading.Lock()
+
+    def refresh(self, request: any) -> None:
+        """Refresh the access token, unless another thread replaced it while this one waited"""
+        token: str | None = self.token
+        with self.refresh_lock:
+            if self.token != token and self.valid:
+                return
+            super().refresh(request)
+
+# < ======================================================================================================
+# < Credential Manager Class
+# < ======================================================================================================
+
+class CredentialManager:
+
+    def __init__(self, token_path: str, client_secret_path: str, scopes: list[str], margin: float = REFRESH_MARGIN, sign_in: bool = True) -> None:
+        """Initialise a holder of the one set of credentials shared by every Drive service built for uploads
+
+        Credentials are loaded, refreshed or signed in for on first use, after which a daemon thread refreshes them
+        margin seconds before they expire and saves them to token_path, so requests in a long upload never pause
+        for a refresh or fail on an expired token. A failed background refresh is retried every RETRY_INTERVAL.
+        With sign_in False, credentials that cannot be loaded or refreshed raise AuthenticationError instead of opening a browser"""
+        self.token_path: str = token_path
+        self.client_secret_path: str = client_secret_path
+        self.scopes: list[str] = scopes
+        self.margin: float = margin
+        self.sign_in: bool = sign_in
+        self.lock: threading.Lock = threading.Lock()
+        self.credentials: SharedCredentials | None = None
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def get(self) -> SharedCredentials:
+        """Get the shared credentials, signing in on first use and starting the background refresh"""
+        with self.lock:
+            if self.credentials is None:
+                self.credentials = get_credentials(self.token_path, self.client_secret_path, self.scopes, self.sign_in)
+                self.thread = threading.Thread(target = self.run, name = "token-refresh", daemon = True)
+                self.thread.start()
+            return self.credentials
+
+    def service(self, limiter: RateLimiter = None, pool: ConnectionPool = None) -> any:
+        """Build a Drive service on the shared credentials, see build_drive_service"""
+        return build_drive_service(self.get(), limiter, pool)
+
+    def seconds_left(self) -> float | None:
+        """Get the seconds until the access token expires, or None if it does not"""
+        if self.credentials.expiry is None:
+            return None
+        return (self.credentials.expiry - datetime.now(timezone.utc).replace(tzinfo = None)).total_seconds() # < Expiry is naive UTC
+
+    def refresh(self) -> None:
+        """Refresh the credentials now and save them"""
+        from google.auth.transport.requests import Request
+        self.credentials.refresh(Request())
+        logging.info(f"Credentials refreshed in the background, valid until {self.credentials.expiry} UTC")
         try:
-            logging.info(f"Credentials checks passed. Attempting to build Google Drive Resource Object")
-            output: any = build('drive', 'v3', credentials = credentials)
-        except Exception as e:
-            logging.info(f"An error occurred attempting to build Resource object: {e}")
-            quit()
-        else:
-            logging.info("Returning Google Drive Resource object")
-            return output
+            save_credentials(self.credentials, self.token_path)
+        except OSError as e:
+            logging.warning(f"An error occurred attempting to save refreshed credentials to {self.token_path}: {e}")
+
+    def run(self) -> None:
+        """Refresh the credentials ahead of each expiry until stopped"""
+        while not self.stopped.is_set():
+            seconds_left: float | None = self.seconds_left()
+            if seconds_left is None:
+                logging.info("Credentials do not expire, no background refresh needed")
+                return
+            if self.stopped.wait(max(1.0, seconds_left - self.margin)):
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.warning(f"Background credential refresh failed, retrying in {RETRY_INTERVAL:.0f}s: {e}")
+                self.stopped.wait(RETRY_INTERVAL)
+
+    def stop(self) -> None:
+        """Stop refreshing in the background"""
+        self.stopped.set()
 
 # < ======================================================================================================
 # < Execution
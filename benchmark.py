@@ -0,0 +1,249 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from fakedrive import FakeDrive, FakeDriveConfig
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+KB: int = 1024
+MB: int = 1024 * 1024
+ROOT_FOLDER_ID: str = "root"
+
+# < Each workload is a list of (folder count, depth, files per folder, file size), scaled by --scale
+WORKLOADS: dict[str, list[tuple[int, int, int, int]]] = {
+    "tiny": [(20, 1, 50, 1 * KB)],
+    "deep": [(60, 12, 4, 4 * KB)],
+    "huge": [(1, 1, 3, 48 * MB)],
+    "mixed": [(10, 2, 40, 2 * KB), (5, 1, 10, 1 * MB), (1, 1, 2, 24 * MB)]
+}
+
+COMPARED: tuple[str, ...] = ("files_per_second", "mb_per_second", "server_p50_ms", "server_p99_ms", "peak_rss_mb")
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def generate_workload(name: str, directory: str, scale: float = 1.0) -> tuple[int, int]:
+    """Write the files of a workload under directory, returning the number of files and bytes written
+
+    Folders are nested depth deep in chains, so a deep workload is a handful of long paths rather than a wide tree"""
+
+    files: int = 0
+    total: int = 0
+    block: bytes = os.urandom(MB)
+
+    for group, (folder_count, depth, files_per_folder, size) in enumerate(WORKLOADS[name]):
+        if size >= MB:
+            size = max(1, int(size * scale))
+        else:
+            folder_count = max(1, int(folder_count * scale))
+        for chain in range(max(1, folder_count // depth)):
+            path: str = directory
+            for level in range(depth):
+                path = os.path.join(path, f"g{group}c{chain}d{level}")
+                os.makedirs(path, exist_ok = True)
+                for index in range(files_per_folder):
+                    with open(os.path.join(path, f"f{index}.bin"), "wb") as f:
+                        remaining: int = size
+                        while remaining > 0:
+                            f.write(block[:min(remaining, MB)])
+                            remaining -= MB
+                    files += 1
+                    total += size
+
+    return files, total
+
+def peak_rss_mb() -> float:
+    """Get the peak resident set size of this process in MB"""
+    try:
+        import resource
+    except ImportError:
+        import ctypes
+        from ctypes import wintypes
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [(field, ctypes.c_size_t) for field in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        counters: Counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / MB
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == "darwin" else peak / KB # < Bytes on macOS, kilobytes elsewhere
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Get the value below which fraction of values fall, by nearest rank"""
+    if not values:
+        return 0.0
+    ordered: list[float] = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def run_upload(root_url: str, data_directory: str, work_directory: str, settings: dict) -> dict:
+    """Upload data_directory to the fake Drive at root_url with options built from settings, in a fresh process
+
+    Run through a spawned ProcessPoolExecutor so peak RSS covers only this upload. Returns the wall time and peak RSS"""
+
+    logging.basicConfig(level = logging.WARNING)
+    import tracing
+    from google.oauth2.credentials import Credentials
+    from authenticator import build_drive_service
+    from uploader import UploadOptions, upload_mixed
+
+    options: UploadOptions = UploadOptions.from_settings({
+        **settings,
+        "SYNC_MODE": False,
+        "SESSION_DIR": os.path.join(work_directory, "sessions"),
+        "MANIFEST_PATH": os.path.join(work_directory, "manifest.json"),
+        "FOLDER_INDEX_PATH": os.path.join(work_directory, "folders.db"),
+        "HASH_CACHE_PATH": os.path.join(work_directory, "hashes.db"),
+        "JOURNAL_PATH": ""
+    })
+    credentials: Credentials = Credentials(token = "benchmark") # < Never expires, so nothing is refreshed against Google
+    service_factory = lambda: build_drive_service(credentials, options.rate_limiter, options.connection_pool, root_url)
+
+    try:
+        started: float = time.perf_counter()
+        upload_mixed(service_factory(), [], [data_directory], ROOT_FOLDER_ID, options, service_factory, credentials = credentials, root_url = root_url)
+        seconds: float = time.perf_counter() - started
+    finally:
+        options.close() # < The hash cache's process pool would otherwise keep this process from exiting
+
+    return {"seconds": seconds, "peak_rss_mb": peak_rss_mb(), "trace": tracing.summary() if options.trace_path else None}
+
+def run_workload(name: str, config: FakeDriveConfig, settings: dict, scale: float = 1.0, trace_directory: str = None) -> dict:
+    """Generate a workload, upload it to a new FakeDrive and measure the upload, tracing it into trace_directory if given"""
+
+    if trace_directory:
+        settings = {**settings, "TRACE_PATH": os.path.join(os.path.abspath(trace_directory), f"{name}.trace.json")}
+
+    with tempfile.TemporaryDirectory(prefix = f"benchmark-{name}-") as directory:
+
+        data_directory: str = os.path.join(directory, name)
+        os.makedirs(data_directory)
+        files, total = generate_workload(name, data_directory, scale)
+        drive: FakeDrive = FakeDrive(config)
+        root_url: str = drive.start()
+
+        try:
+            with ProcessPoolExecutor(1, mp_context = multiprocessing.get_context("spawn")) as executor:
+                measured: dict = executor.submit(run_upload, root_url, data_directory, directory, settings).result()
+        finally:
+            drive.stop()
+
+    stored: int = sum(1 for file in drive.files.values() if "md5Checksum" in file)
+    seconds: float = measured["seconds"]
+
+    return {
+        "workload": name,
+        "files": files,
+        "bytes": total,
+        "stored": stored,
+        "seconds": round(seconds, 3),
+        "files_per_second": round(files / seconds, 2),
+        "mb_per_second": round(total / MB / seconds, 2),
+        "requests": drive.counts["requests"],
+        "server_p50_ms": round(percentile(drive.latencies, 0.5) * 1000, 2),
+        "server_p99_ms": round(percentile(drive.latencies, 0.99) * 1000, 2),
+        "errors": drive.counts["errors"],
+        "throttled": drive.counts["throttled"],
+        "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+        "trace": measured["trace"]
+    }
+
+def git_commit() -> str | None:
+    """Get the commit the benchmark is running on, if this is a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list[dict], previous: list[dict]) -> list[str]:
+    """Get lines giving the change in each compared measure from a previous run, per workload in both runs"""
+    lines: list[str] = []
+    before: dict[str, dict] = {result["workload"]: result for result in previous}
+    for result in results:
+        old: dict | None = before.get(result["workload"])
+        if old is None:
+            continue
+        changes: list[str] = [f"{key} {old[key]} -> {result[key]} ({(result[key] - old[key]) / old[key] * 100:+.1f}%)" for key in COMPARED if old.get(key)]
+        lines.append(f"{result['workload']}: " + ", ".join(changes))
+    return lines
+
+def main() -> None:
+    """Run the benchmark from the command line"""
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description = "Benchmark uploads against a local fake Drive server")
+    parser.add_argument("workloads", nargs = "*", help = f"workloads to run out of {', '.join(WORKLOADS)}, all of them by default")
+    parser.add_argument("--scale", type = float, default = 1.0, help = "multiply the file counts of small files and the sizes of large ones")
+    parser.add_argument("--latency", type = float, default = 0.02, help = "seconds the server waits before answering each request")
+    parser.add_argument("--bandwidth", type = float, default = 0, help = "MB/s the server reads request bodies at across all connections, 0 for no cap")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "chance of each request failing with a 503")
+    parser.add_argument("--throttle-rate", type = float, default = 0.0, help = "chance of each request failing with a 429 or 403 rate limit error")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed for the injected failures")
+    parser.add_argument("--workers", type = int, help = "override UPLOAD_WORKERS")
+    parser.add_argument("--engine", choices = ("threads", "asyncio"), help = "override UPLOAD_ENGINE")
+    parser.add_argument("--transport", choices = ("httplib2", "pooled"), help = "override TRANSPORT")
+    parser.add_argument("--requests-per-second", type = float, help = "override REQUESTS_PER_SECOND, raise it to measure the uploader rather than the quota")
+    parser.add_argument("--settings", default = "settings.json", help = "settings the upload options are built from")
+    parser.add_argument("--trace", help = "trace each workload into a Chrome trace in this folder and print its summary")
+    parser.add_argument("--output", help = "write the results to this JSON file")
+    parser.add_argument("--compare", help = "JSON file from an earlier run to compare the results with")
+    args: argparse.Namespace = parser.parse_args()
+    unknown: list[str] = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workload(s) {', '.join(unknown)}, choose from {', '.join(WORKLOADS)}")
+
+    with open(args.settings, "r") as f:
+        settings: dict = json.load(f)
+    overrides: dict[str, any] = {"UPLOAD_WORKERS": args.workers, "UPLOAD_ENGINE": args.engine, "TRANSPORT": args.transport, "REQUESTS_PER_SECOND": args.requests_per_second}
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    if args.requests_per_second is not None:
+        settings["REQUEST_BURST"] = max(settings.get("REQUEST_BURST", 0), int(args.requests_per_second * 2))
+
+    config: FakeDriveConfig = FakeDriveConfig(args.latency, int(args.bandwidth * MB), args.error_rate, args.throttle_rate, args.seed)
+    results: list[dict] = []
+
+    if args.trace:
+        os.makedirs(args.trace, exist_ok = True)
+
+    for name in args.workloads or WORKLOADS:
+        result: dict = run_workload(name, config, settings, args.scale, args.trace)
+        results.append(result)
+        print(f"{name:>6}: {result['files']} files, {result['bytes'] / MB:.1f} MB in {result['seconds']}s, {result['files_per_second']} files/s, {result['mb_per_second']} MB/s, server p50 {result['server_p50_ms']}ms, server p99 {result['server_p99_ms']}ms, {result['requests']} requests, peak RSS {result['peak_rss_mb']} MB")
+        if result["trace"]:
+            print(result["trace"])
+        if result["stored"] != result["files"]:
+            print(f"{name:>6}: only {result['stored']} of {result['files']} files reached the server")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            previous: dict = json.load(f)
+        print(f"Compared with {previous.get('commit')} from {previous.get('date')}:")
+        for line in compare(results, previous["results"]):
+            print(f"  {line}")
+
+    if args.output:
+        report: dict = {"commit": git_commit(), "date": datetime.now().isoformat(timespec = "seconds"), "server": vars(config), "settings": settings, "scale": args.scale, "results": results}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 4)
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    main()
+else:
+    logging.info(f"Module '{__name__}' running")
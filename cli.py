@@ -0,0 +1,236 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import startup
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+from typing import IO, Iterator
+from engine import UploadCancelled, UploadListener
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+MB: int = 1024 * 1024
+READ_SIZE: int = 64 * 1024
+EXIT_FAILED: int = 1
+EXIT_CANCELLED: int = 130 # < As a shell reports a process stopped by Ctrl+C
+
+# < ======================================================================================================
+# < Event Listener Class
+# < ======================================================================================================
+
+class EventListener(UploadListener):
+
+    def __init__(self, stream: IO[str], interval: float = 5.0) -> None:
+        """Initialise a listener writing upload events to stream as newline-delimited JSON, one object per line
+
+        Every object has an "event" name and a "time". Each finished file gives a file_done or file_failed event,
+        and a progress event of running totals and throughput is written every interval seconds by a daemon thread"""
+        self.stream: IO[str] = stream
+        self.interval: float = interval
+        self.lock: threading.Lock = threading.Lock()
+        self.cancelled: threading.Event = threading.Event()
+        self.stopped: threading.Event = threading.Event()
+        self.started: float = time.monotonic()
+        self.in_flight: dict[str, list[int]] = {} # < Filepath to [size, bytes sent so far] for files being uploaded
+        self.files_done: int = 0
+        self.files_failed: int = 0
+        self.bytes_sent: int = 0
+        self.thread: threading.Thread = threading.Thread(target = self.run, name = "progress-events", daemon = True)
+
+    def write(self, event: str, fields: dict) -> None:
+        """Write one event, the caller must hold the lock so lines from different threads never interleave"""
+        self.stream.write(json.dumps({"event": event, "time": round(time.time(), 3), **fields}) + "\n")
+        self.stream.flush()
+
+    def emit(self, event: str, **fields) -> None:
+        """Write one event with the given fields"""
+        with self.lock:
+            self.write(event, fields)
+
+    def file_started(self, filepath: str, size: int) -> None:
+        with self.lock:
+            self.in_flight[filepath] = [size, 0]
+
+    def file_progress(self, filepath: str, bytes_sent: int, total: int) -> None:
+        startup.mark("first upload progress")
+        with self.lock:
+            state: list[int] | None = self.in_flight.get(filepath)
+            if state is not None:
+                self.bytes_sent += max(0, bytes_sent - state[1]) # < A retry starting over sends its bytes again
+                state[1] = bytes_sent
+
+    def file_done(self, filepath: str, file_id: str) -> None:
+        startup.mark("first upload progress")
+        with self.lock:
+            size, sent = self.in_flight.pop(filepath, (0, 0))
+            self.bytes_sent += max(0, size - sent)
+            self.files_done += 1
+            self.write("file_done", {"path": filepath, "id": file_id, "size": size})
+
+    def file_failed(self, filepath: str, error: BaseException) -> None:
+        with self.lock:
+            self.in_flight.pop(filepath, None)
+            if not isinstance(error, UploadCancelled):
+                self.files_failed += 1
+                self.write("file_failed", {"path": filepath, "error": repr(error)})
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled.is_set()
+
+    def totals(self) -> dict:
+        """Get the running totals and the average throughput since the listener was created"""
+        elapsed: float = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "elapsed": round(elapsed, 3),
+            "files_done": self.files_done,
+            "files_failed": self.files_failed,
+            "files_in_flight": len(self.in_flight),
+            "bytes_sent": self.bytes_sent,
+            "files_per_second": round(self.files_done / elapsed, 2),
+            "mb_per_second": round(self.bytes_sent / MB / elapsed, 3)
+        }
+
+    def run(self) -> None:
+        """Write a progress event every interval seconds until stopped"""
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                self.write("progress", self.totals())
+
+    def start(self) -> None:
+        """Start writing progress events"""
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop writing progress events"""
+        self.stopped.set()
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def read_paths(stream: IO[bytes], separator: bytes = b"\n") -> Iterator[str]:
+    """Yield each non-empty path in a binary stream as an absolute path, as soon as it arrives and without ever holding a list
+
+    Blocks are taken with read1 where the stream has it, which returns whatever is available rather than waiting for
+    a full block, so paths piped in slowly start uploading straight away. Paths are decoded as the filesystem encodes them"""
+    read: any = getattr(stream, "read1", stream.read)
+    remainder: bytes = b""
+    while True:
+        block: bytes = read(READ_SIZE)
+        if not block:
+            break
+        *paths, remainder = (remainder + block).split(separator)
+        for path in paths:
+            path = path.rstrip(b"\r") if separator == b"\n" else path
+            if path:
+                yield os.path.abspath(os.fsdecode(path))
+    remainder = remainder.rstrip(b"\r\n")
+    if remainder:
+        yield os.path.abspath(os.fsdecode(remainder))
+
+def input_paths(paths: list[str], list_path: str | None, separator: bytes) -> Iterator[str]:
+    """Yield the paths given as arguments, then those listed in list_path, where '-' stands for stdin as it does in either
+
+    With neither, paths are read from stdin"""
+    if not paths and list_path is None:
+        list_path = "-"
+    for path in paths:
+        if path == "-":
+            yield from read_paths(sys.stdin.buffer, separator)
+        else:
+            yield os.path.abspath(path)
+    if list_path == "-":
+        yield from read_paths(sys.stdin.buffer, separator)
+    elif list_path is not None:
+        with open(list_path, "rb") as f:
+            yield from read_paths(f, separator)
+
+def main() -> int:
+    """Upload the paths streamed in from the command line without a display, returning the exit code"""
+
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description = "Upload files and folders to Google Drive without the window, writing progress to stdout as newline-delimited JSON")
+    parser.add_argument("paths", nargs = "*", help = "files and folders to upload, '-' to read paths from stdin, which is also the default when no paths or --from are given")
+    parser.add_argument("-f", "--from", dest = "list_path", help = "read paths to upload from this file, one per line, '-' for stdin")
+    parser.add_argument("-0", "--null", action = "store_true", help = "paths read from stdin or --from are separated by NUL characters, as find -print0 writes them")
+    parser.add_argument("--folder-id", action = "append", help = "upload into this Drive folder instead of FOLDER_ID, give it more than once to copy the upload into each")
+    parser.add_argument("--settings", default = "settings.json", help = "settings the upload options are built from")
+    parser.add_argument("--events", default = "-", help = "append the JSON events to this file rather than stdout")
+    parser.add_argument("--interval", type = float, default = 5.0, help = "seconds between progress events")
+    parser.add_argument("--sign-in", action = "store_true", help = "open a browser to sign in to Google if token.json is missing or cannot be refreshed, rather than failing")
+    parser.add_argument("--verbose", action = "store_true", help = "log everything the upload does to stderr")
+    parser.add_argument("--startup-report", action = "store_true", help = "write how long after startup each milestone was reached as a startup event before the final one")
+    args: argparse.Namespace = parser.parse_args()
+    startup.mark("arguments parsed")
+
+    logging.basicConfig(level = logging.INFO if args.verbose else logging.WARNING, stream = sys.stderr, force = True)
+
+    from authenticator import CredentialManager
+    from uploader import UploadOptions, upload_stream
+
+    with open(args.settings, "r") as f:
+        settings: dict = json.load(f)
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    credential_manager: CredentialManager = CredentialManager(settings["TOKEN_PATH"], settings["CLIENT_SECRET_PATH"], settings["SCOPES"], sign_in = args.sign_in)
+    folder_id: str | list[str] | None = args.folder_id or settings.get("FOLDER_ID")
+
+    stream: IO[str] = sys.stdout if args.events == "-" else open(args.events, "a", encoding = "utf-8")
+    listener: EventListener = EventListener(stream, args.interval)
+
+    def cancel(signal_number: int, frame: any) -> None:
+        # < The first signal lets uploads in flight finish, a second one interrupts whatever is running
+        listener.cancelled.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    signal.signal(signal.SIGINT, cancel)
+    signal.signal(signal.SIGTERM, cancel)
+
+    listener.emit("started", folder_id = folder_id, workers = options.workers)
+    listener.start()
+    result: dict = {}
+    code: int = 0
+
+    try:
+        drive_service: any = credential_manager.service(options.rate_limiter, options.connection_pool)
+        startup.mark("drive client ready")
+        service_factory = lambda: credential_manager.service(options.rate_limiter, options.connection_pool)
+        startup.mark("upload started")
+        startup.check_budget("upload started", settings.get("STARTUP_BUDGET_MS", 1000))
+        result["subfolder_id"] = upload_stream(drive_service, input_paths(args.paths, args.list_path, b"\0" if args.null else b"\n"), folder_id, options, service_factory, listener)
+    except (UploadCancelled, KeyboardInterrupt):
+        event, code = "cancelled", EXIT_CANCELLED
+    except Exception as e:
+        logging.info(f"An error occurred during upload: {e!r}")
+        event, code = "failed", EXIT_FAILED
+        result["error"] = repr(e)
+    else:
+        event, code = "finished", EXIT_FAILED if listener.files_failed else 0
+    finally:
+        listener.stop()
+        credential_manager.stop()
+        options.close()
+
+    if args.startup_report:
+        listener.emit("startup", marks = {label: round(seconds * 1000) for label, seconds in startup.marks.items()})
+    listener.emit(event, **listener.totals(), **result)
+    if stream is not sys.stdout:
+        stream.close()
+    return code
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    sys.exit(main())
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,170 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import time
+import logging
+import threading
+import tracing
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from scheduling import SchedulingPolicy
+
+# < ======================================================================================================
+# < Exceptions
+# < ======================================================================================================
+
+class UploadCancelled(Exception):
+    """Raised inside upload work once the listener reports the upload has been cancelled"""
+
+# < ======================================================================================================
+# < Upload Listener Class
+# < ======================================================================================================
+
+class UploadListener:
+    """Receives upload events, may be called from any worker thread, override the methods of interest"""
+
+    def file_started(self, filepath: str, size: int) -> None:
+        """Called when a file upload begins"""
+
+    def file_progress(self, filepath: str, bytes_sent: int, total: int) -> None:
+        """Called as bytes of a file are acknowledged by Drive"""
+
+    def file_done(self, filepath: str, file_id: str) -> None:
+        """Called when a file upload completes"""
+
+    def file_failed(self, filepath: str, error: BaseException) -> None:
+        """Called when a file upload raises an error"""
+
+    def is_cancelled(self) -> bool:
+        """Polled before each file, folder and resumable chunk, return True to stop the upload with UploadCancelled"""
+        return False
+
+    def check_cancelled(self) -> None:
+        """Raise UploadCancelled if the upload has been cancelled"""
+        if self.is_cancelled():
+            raise UploadCancelled()
+
+# < ======================================================================================================
+# < Upload Engine Class
+# < ======================================================================================================
+
+class UploadEngine:
+
+    def __init__(self, service_factory: Callable[[], any], workers: int = 1, queue_size: int = 0, policy: SchedulingPolicy = None) -> None:
+        """Initialise a pool of upload workers, each owning its own Drive service built by service_factory
+
+        At most queue_size tasks may be queued or running at once, further calls to submit block until a slot frees up,
+        which keeps memory bounded when a large tree is scanned faster than it uploads, 0 means workers * 64.
+        Whenever a worker comes free, policy picks which queued task it runs, first in first out by default"""
+        self.service_factory: Callable[[], any] = service_factory
+        self.workers: int = max(1, int(workers))
+        self.queue_size: int = max(self.workers, int(queue_size) or self.workers * 64)
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers = self.workers, thread_name_prefix = "upload")
+        self.slots: threading.Semaphore = threading.Semaphore(self.queue_size)
+        self.condition: threading.Condition = threading.Condition()
+        self.outstanding: int = 0
+        self.error: BaseException | None = None
+        self.local: threading.local = threading.local()
+        self.policy: SchedulingPolicy = policy if policy is not None else SchedulingPolicy() # < An empty policy is falsy
+        logging.info(f"Upload engine started with {self.workers} worker(s) and a queue of {self.queue_size}")
+
+    def __enter__(self) -> "UploadEngine":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.join()
+        else:
+            self.shutdown(cancel = True)
+
+    def service(self) -> any:
+        """Get the Drive service belonging to the calling thread, building it on first use"""
+        service = getattr(self.local, "service", None)
+        if service is None:
+            logging.info(f"Building Drive service for {threading.current_thread().name}")
+            service = self.service_factory()
+            self.local.service = service
+        return service
+
+    def run(self, function: Callable, *args, **kwargs) -> any:
+        """Run function on the calling thread with that thread's Drive service passed as drive_service"""
+        return function(*args, drive_service = self.service(), **kwargs)
+
+    def submit(self, function: Callable, *args, size: int = 0, **kwargs) -> Future:
+        """Queue function to run on a worker thread with that worker's Drive service passed as drive_service
+
+        size is roughly how many bytes the task will send, which the scheduling policy may order tasks by"""
+        waiting: float = time.perf_counter()
+        self.slots.acquire()
+        tracing.wait("queue full", "queue", waiting)
+        future: Future = Future()
+        with self.condition:
+            self.outstanding += 1
+            self.policy.push((function, args, kwargs, future, time.perf_counter()), size)
+        try:
+            runner: Future = self.executor.submit(self.run_next)
+        except BaseException:
+            self.task_done(None)
+            raise
+        runner.add_done_callback(self.task_done)
+        return future
+
+    def run_next(self) -> any:
+        """Run whichever queued task the policy picks, there is always one as every submit queues one runner"""
+        with self.condition:
+            (function, args, kwargs, future, queued), size = self.policy.pop()
+        tracing.wait("queued", "queue", queued, size = size)
+        try:
+            if not future.set_running_or_notify_cancel():
+                return None
+            try:
+                with tracing.span(function.__name__, "task", target = str(args[0]) if args else "", bytes = size):
+                    result: any = self.run(function, *args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            future.set_result(result)
+            return result
+        finally:
+            with self.condition:
+                self.policy.done(size)
+
+    def task_done(self, future: Future | None) -> None:
+        """Free the queue slot held by a finished task and remember the first error raised by any task"""
+        self.slots.release()
+        exception: BaseException | None = None
+        if future is not None and not future.cancelled():
+            exception = future.exception()
+        with self.condition:
+            self.outstanding -= 1
+            if exception is not None and self.error is None:
+                self.error = exception
+                logging.info(f"An error occurred in an upload worker: {exception!r}")
+            self.condition.notify_all()
+
+    def join(self) -> None:
+        """Wait for all queued work to finish, raising the first error encountered"""
+        with self.condition:
+            while self.outstanding:
+                self.condition.wait()
+        self.shutdown()
+        if self.error is not None:
+            raise self.error
+
+    def shutdown(self, cancel: bool = False) -> None:
+        """Stop the worker pool, optionally dropping work that has not started"""
+        self.executor.shutdown(wait = True, cancel_futures = cancel)
+        with self.condition:
+            while self.policy:
+                (function, args, kwargs, future, queued), size = self.policy.pop()
+                future.cancel()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
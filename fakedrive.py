@@ -0,0 +1,309 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from ratelimit import BandwidthLimiter
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+FOLDER_MIMETYPE: str = 'application/vnd.google-apps.folder'
+READ_BLOCK: int = 64 * 1024
+RATE_LIMIT_BODY: bytes = json.dumps({"error": {"code": 403, "message": "User rate limit exceeded", "errors": [{"reason": "userRateLimitExceeded"}]}}).encode("utf-8")
+TOO_MANY_REQUESTS_BODY: bytes = json.dumps({"error": {"code": 429, "message": "Too many requests", "errors": [{"reason": "rateLimitExceeded"}]}}).encode("utf-8")
+SERVER_ERROR_BODY: bytes = json.dumps({"error": {"code": 503, "message": "Service unavailable", "errors": [{"reason": "backendError"}]}}).encode("utf-8")
+
+# < ======================================================================================================
+# < Fake Drive Config Class
+# < ======================================================================================================
+
+@dataclass
+class FakeDriveConfig:
+    """Faults and limits a FakeDrive injects, rates are the chance of each request, or call inside a batch, failing
+    with a 503 for error_rate, or a 429 or 403 rate limit error for throttle_rate"""
+    latency: float = 0.0
+    bandwidth: int = 0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    seed: int | None = None
+
+# < ======================================================================================================
+# < Fake Drive Class
+# < ======================================================================================================
+
+class FakeDrive:
+
+    def __init__(self, config: FakeDriveConfig = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        """Initialise a local stand-in for the Drive v3 endpoints the uploaders use, served on host and port
+
+        Supports files create, get, list, copy and generateIds, multipart, media and resumable uploads and updates,
+        and batch requests, keeping only the metadata, size and md5 of each file. Every request waits config.latency
+        seconds, request bodies are read no faster than config.bandwidth bytes per second across all connections,
+        and requests fail with a 503 or a quota error at config.error_rate and config.throttle_rate"""
+        self.config: FakeDriveConfig = config or FakeDriveConfig()
+        self.random: random.Random = random.Random(self.config.seed)
+        self.bandwidth: BandwidthLimiter | None = BandwidthLimiter(self.config.bandwidth) if self.config.bandwidth > 0 else None
+        self.lock: threading.Lock = threading.Lock()
+        self.files: dict[str, dict] = {'root': {'id': 'root', 'name': 'My Drive', 'mimeType': FOLDER_MIMETYPE, 'parents': []}}
+        self.sessions: dict[str, dict] = {}
+        self.latencies: list[float] = []
+        self.counts: dict[str, int] = {"requests": 0, "errors": 0, "throttled": 0, "bytes": 0}
+        self.server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """Root URL to use in place of https://www.googleapis.com/"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> str:
+        """Serve on a background thread and return the root URL"""
+        self.thread = threading.Thread(target = self.server.serve_forever, name = "fakedrive", daemon = True)
+        self.thread.start()
+        logging.info(f"Fake Drive serving at {self.url}")
+        return self.url
+
+    def stop(self) -> None:
+        """Stop serving"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self) -> None:
+        """Clear recorded latencies and counts, keeping the files"""
+        with self.lock:
+            self.latencies = []
+            self.counts = dict.fromkeys(self.counts, 0)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counts[name] += amount
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex[:24]
+
+    def fault(self) -> tuple[int, dict, bytes] | None:
+        """Pick an injected failure for one request or batch call, or None to let it through"""
+        roll: float = self.random.random()
+        if roll < self.config.throttle_rate:
+            self.count("throttled")
+            if roll < self.config.throttle_rate / 2: # < Drive throttles with either, so both are injected
+                return 429, {"Content-Type": "application/json"}, TOO_MANY_REQUESTS_BODY
+            return 403, {"Content-Type": "application/json"}, RATE_LIMIT_BODY
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            self.count("errors")
+            return 503, {"Content-Type": "application/json"}, SERVER_ERROR_BODY
+        return None
+
+    def respond(self, data: dict, status: int = 200) -> tuple[int, dict, bytes]:
+        return status, {"Content-Type": "application/json; charset=UTF-8"}, json.dumps(data).encode("utf-8")
+
+    def store(self, metadata: dict, size: int, md5: str, file_id: str = None) -> dict:
+        """Create a file, or replace the content of file_id, and return its metadata"""
+        with self.lock:
+            if file_id is None:
+                file_id = metadata.get('id') or self.new_id()
+                if file_id in self.files:
+                    return {"error": {"code": 409, "message": "A file already exists with the provided ID"}}
+                missing: str | None = next((parent_id for parent_id in metadata.get('parents', []) if parent_id not in self.files), None)
+                if missing is not None:
+                    return {"error": {"code": 404, "message": f"File not found: {missing}"}}
+                self.files[file_id] = {'mimeType': 'application/octet-stream', 'parents': ['root'], **metadata, 'id': file_id}
+            elif file_id not in self.files:
+                return {"error": {"code": 404, "message": f"File not found: {file_id}"}}
+            else:
+                self.files[file_id].update({key: value for key, value in metadata.items() if key != 'id'})
+            if self.files[file_id]['mimeType'] != FOLDER_MIMETYPE:
+                self.files[file_id].update(size = str(size), md5Checksum = md5)
+            return dict(self.files[file_id])
+
+    def stored(self, file: dict) -> tuple[int, dict, bytes]:
+        """Respond with the result of store"""
+        if "error" in file:
+            return self.respond(file, file["error"]["code"])
+        return self.respond(file)
+
+    def handle(self, method: str, target: str, headers: dict[str, str], body: bytes) -> tuple[int, dict, bytes]:
+        """Serve one Drive call, returning its status, headers and body"""
+
+        path, _, query_string = target.partition("?")
+        query: dict[str, str] = {key: values[0] for key, values in parse_qs(query_string).items()}
+        path = "/" + path.strip("/")
+        upload_type: str | None = query.get("uploadType")
+
+        if path.startswith("/upload/drive/v3/files"):
+            file_id: str | None = path[len("/upload/drive/v3/files/"):] or None
+            if "upload_id" in query:
+                return self.resumable_chunk(query["upload_id"], headers, body)
+            if upload_type == "resumable":
+                session_id: str = self.new_id()
+                with self.lock:
+                    self.sessions[session_id] = {'metadata': json.loads(body or b"{}"), 'file_id': file_id, 'received': 0, 'md5': hashlib.md5(), 'total': int(headers.get("x-upload-content-length", -1))}
+                location: str = f"{self.url}upload/drive/v3/files{'/' + file_id if file_id else ''}?uploadType=resumable&upload_id={session_id}"
+                return 200, {"Location": location, "Content-Length": "0"}, b""
+            if upload_type == "multipart":
+                metadata, content = self.split_multipart(headers.get("content-type", ""), body)
+                return self.stored(self.store(metadata, len(content), hashlib.md5(content).hexdigest(), file_id))
+            return self.stored(self.store({}, len(body), hashlib.md5(body).hexdigest(), file_id))
+
+        if path == "/drive/v3/files" and method == "POST":
+            return self.stored(self.store(json.loads(body or b"{}"), 0, hashlib.md5(b"").hexdigest()))
+
+        if path == "/drive/v3/files" and method == "GET":
+            return self.respond({'files': self.list(query.get('q', ''))})
+
+        if path == "/drive/v3/files/generateIds":
+            return self.respond({'kind': 'drive#generatedIds', 'space': 'drive', 'ids': [self.new_id() for _ in range(int(query.get('count', 10)))]})
+
+        match = re.fullmatch(r"/drive/v3/files/([^/]+)(/copy)?", path)
+        if match is not None:
+            with self.lock:
+                file: dict | None = self.files.get(match.group(1))
+            if file is None:
+                return self.respond({"error": {"code": 404, "message": f"File not found: {match.group(1)}"}}, 404)
+            if match.group(2) and method == "POST":
+                metadata: dict = {key: value for key, value in file.items() if key not in ('id', 'size', 'md5Checksum')}
+                return self.stored(self.store({**metadata, **json.loads(body or b"{}")}, int(file.get('size', 0)), file.get('md5Checksum')))
+            return self.respond(file)
+
+        return self.respond({"error": {"code": 404, "message": f"Unknown endpoint {method} {path}"}}, 404)
+
+    def resumable_chunk(self, session_id: str, headers: dict[str, str], body: bytes) -> tuple[int, dict, bytes]:
+        """Take one chunk of a resumable upload, or answer a status query, replying 308 until the last byte arrives"""
+
+        with self.lock:
+            session: dict | None = self.sessions.get(session_id)
+        if session is None:
+            return self.respond({"error": {"code": 404, "message": "Upload session not found"}}, 404)
+
+        content_range: str = headers.get("content-range", "")
+        match = re.fullmatch(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", content_range.strip())
+        if match is not None and match.group(3) != "*":
+            session['total'] = int(match.group(3))
+        if match is not None and match.group(1) is not None:
+            start: int = int(match.group(1))
+            with self.lock:
+                skip: int = session['received'] - start # < Bytes of a resent chunk that were already committed
+                if 0 <= skip < len(body):
+                    session['md5'].update(body[skip:])
+                    session['received'] += len(body) - skip
+
+        if session['received'] >= session['total'] >= 0:
+            with self.lock:
+                self.sessions.pop(session_id, None)
+            return self.stored(self.store(session['metadata'], session['received'], session['md5'].hexdigest(), session['file_id']))
+
+        range_header: dict = {"Range": f"bytes=0-{session['received'] - 1}"} if session['received'] else {}
+        return 308, {**range_header, "Content-Length": "0"}, b""
+
+    def list(self, q: str) -> list[dict]:
+        """Match files against the parts of a files().list query the uploaders use"""
+        parents: set[str] = set(re.findall(r"'([^']+)' in parents", q))
+        name: re.Match | None = re.search(r"name = '((?:[^'\\]|\\.)*)'", q)
+        folders_only: bool = f"mimeType = '{FOLDER_MIMETYPE}'" in q
+        with self.lock:
+            return [dict(file) for file in self.files.values() if file['id'] != 'root'
+                    and (not parents or parents & set(file.get('parents', [])))
+                    and (name is None or file['name'] == re.sub(r"\\(.)", r"\1", name.group(1)))
+                    and (not folders_only or file['mimeType'] == FOLDER_MIMETYPE)]
+
+    @staticmethod
+    def split_multipart(content_type: str, body: bytes) -> tuple[dict, bytes]:
+        """Split a multipart/related upload body into its metadata and content"""
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+        metadata, content = message.get_payload()
+        return json.loads(metadata.get_payload(decode = True)), content.get_payload(decode = True)
+
+    def batch(self, content_type: str, body: bytes) -> tuple[int, dict, bytes]:
+        """Serve every call inside a multipart/mixed batch request, injecting faults per call"""
+
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+        boundary: str = uuid.uuid4().hex
+        output: list[bytes] = []
+
+        for part in message.get_payload():
+            content_id: str = part["Content-ID"].strip("<>")
+            payload: bytes = part.get_payload(decode = True) or part.get_payload().encode("utf-8")
+            head, _, inner_body = payload.replace(b"\r\n", b"\n").partition(b"\n\n")
+            request_line, *header_lines = head.decode("utf-8").split("\n")
+            method, target = request_line.split(" ")[:2]
+            inner_headers: dict[str, str] = {line.partition(":")[0].strip().lower(): line.partition(":")[2].strip() for line in header_lines if ":" in line}
+            status, headers, content = self.fault() or self.handle(method, urlsplit(target).path + "?" + urlsplit(target).query, inner_headers, inner_body)
+            reason: str = {200: "OK", 403: "Forbidden", 404: "Not Found", 409: "Conflict", 429: "Too Many Requests", 503: "Service Unavailable"}.get(status, "Error")
+            output.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\nHTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=UTF-8\r\nContent-Length: {len(content)}\r\n\r\n".encode("utf-8") + content + b"\r\n")
+
+        return 200, {"Content-Type": f"multipart/mixed; boundary={boundary}"}, b"".join(output) + f"--{boundary}--\r\n".encode("utf-8")
+
+    def handler(self) -> type[BaseHTTPRequestHandler]:
+        """Get a request handler class bound to this fake"""
+
+        drive: FakeDrive = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1" # < Keeps connections alive between requests, as Drive does
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+            def read_body(self) -> bytes:
+                length: int = int(self.headers.get("Content-Length", 0))
+                blocks: list[bytes] = []
+                while length > 0:
+                    block: bytes = self.rfile.read(min(READ_BLOCK, length))
+                    if not block:
+                        break
+                    if drive.bandwidth is not None:
+                        drive.bandwidth.consume(len(block))
+                    blocks.append(block)
+                    length -= len(block)
+                return b"".join(blocks)
+
+            def serve(self) -> None:
+                started: float = time.perf_counter()
+                body: bytes = self.read_body()
+                if drive.config.latency > 0:
+                    time.sleep(drive.config.latency)
+                headers: dict[str, str] = {key.lower(): value for key, value in self.headers.items()}
+                if self.path.startswith("/batch/"):
+                    status, response_headers, content = drive.batch(headers.get("content-type", ""), body)
+                else:
+                    status, response_headers, content = drive.fault() or drive.handle(self.command, self.path, headers, body)
+                self.send_response(status)
+                for key, value in response_headers.items():
+                    if key.lower() != "content-length":
+                        self.send_header(key, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                with drive.lock:
+                    drive.latencies.append(time.perf_counter() - started)
+                    drive.counts["requests"] += 1
+                    drive.counts["bytes"] += len(body)
+
+            do_GET = do_POST = do_PUT = do_PATCH = serve
+
+        return Handler
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,100 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import logging
+from folderindex import list_tree
+from folders import BATCH_LIMIT, FOLDER_MIMETYPE, FolderBatcher, retry_batch
+from ratelimit import RateLimiter
+from uploader import create_folder
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def copy_files(drive_service: any, copies: list[tuple[str, dict]], limiter: RateLimiter = None) -> dict[str, str]:
+    """Copy Drive files server-side, given as (source_id, file_metadata) pairs, in batch requests of up to BATCH_LIMIT
+
+    Calls failing inside a batch are retried as folders.retry_batch decides, returns each source ID mapped to the ID of its copy"""
+
+    output: dict[str, str] = {}
+    requests: int = 0
+
+    for start in range(0, len(copies), BATCH_LIMIT):
+
+        remaining: dict[str, tuple[str, dict]] = {str(start + offset): copy for offset, copy in enumerate(copies[start:start + BATCH_LIMIT])}
+        errors: dict[str, Exception] = {}
+        attempt: int = 0
+
+        while remaining:
+
+            errors = {}
+
+            def callback(request_id: str, response: dict, exception: Exception) -> None:
+                if exception is None:
+                    output[remaining[request_id][0]] = response['id']
+                else:
+                    errors[request_id] = exception
+
+            batch = drive_service.new_batch_http_request(callback = callback)
+            for request_id, (source_id, file_metadata) in remaining.items():
+                batch.add(drive_service.files().copy(fileId = source_id, body = file_metadata, fields = 'id'), request_id = request_id)
+            batch.execute()
+            requests += 1
+
+            remaining = {request_id: remaining[request_id] for request_id in errors}
+
+            if remaining and not retry_batch(limiter, next(iter(errors.values())), attempt):
+                break
+            attempt += 1
+
+        if errors:
+            raise next(iter(errors.values()))
+
+    logging.info(f"Copied {len(output)} files server-side using {requests} batch request(s)")
+    return output
+
+def mirror_tree(drive_service: any, source_id: str, destination_id: str, limiter: RateLimiter = None, mirror_id: str = None) -> str:
+    """Copy the folder source_id, and everything below it, into a new folder of the same name in destination_id without
+    sending any file content
+
+    Drive cannot copy folders, so the tree is listed a level at a time, its folders are created in batch requests
+    and its files copied with files().copy in batch requests. The mirror is always a new folder, as the dated
+    subfolder it copies is, so it never merges into an earlier upload's folder of the same name. Given the mirror_id
+    of an earlier mirror that failed part way, that folder is completed instead, copying only what is missing.
+    Returns the ID of the mirrored folder"""
+
+    name: str = drive_service.files().get(fileId = source_id, fields = 'name').execute()['name']
+    root_id: str = mirror_id or create_folder(name, drive_service, destination_id)
+    existing: dict[str, dict] = list_tree(drive_service, root_id) if mirror_id is not None else {}
+    batcher: FolderBatcher = FolderBatcher(drive_service, limiter = limiter)
+    folder_ids: dict[str, str] = {"": root_id}
+    copies: list[tuple[str, dict]] = []
+
+    for relative_path, file in list_tree(drive_service, source_id).items():
+        parent_id: str | None = folder_ids.get(relative_path.rpartition("/")[0])
+        if parent_id is None:
+            continue # < Parent is a file at the destination, nothing below it can be placed
+        folder: bool = file['mimeType'] == FOLDER_MIMETYPE
+        if relative_path in existing:
+            if folder and existing[relative_path]['mimeType'] == FOLDER_MIMETYPE:
+                folder_ids[relative_path] = existing[relative_path]['id']
+        elif folder:
+            folder_ids[relative_path] = batcher.add(file['name'], parent_id)
+        else:
+            copies.append((file['id'], {'name': file['name'], 'parents': [parent_id]}))
+
+    batcher.flush()
+    copy_files(drive_service, copies, limiter)
+
+    logging.info(f"Mirrored {name} into {destination_id}, {len(copies)} files copied and {len(existing)} entries already there")
+    return root_id
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,166 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import sqlite3
+import logging
+import threading
+from typing import Iterator
+from folders import FOLDER_MIMETYPE, FolderBatcher
+from uploader import create_folder
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+INDEX_FIELDS: str = 'nextPageToken, files(id, name, parents, mimeType)'
+PAGE_SIZE: int = 1000
+PARENTS_PER_QUERY: int = 50 # < Parents OR'd into one files().list query, keeping the query string well under Drive's limit
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS folders (
+    root_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    folder_id TEXT NOT NULL,
+    PRIMARY KEY (root_id, path)
+);
+"""
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def list_children(drive_service: any, parent_ids: list[str], fields: str = INDEX_FIELDS, folders_only: bool = False) -> Iterator[dict]:
+    """Yield everything directly inside any of parent_ids, asking for up to PARENTS_PER_QUERY parents per paginated query
+
+    fields must include parents so each result can be placed under the right parent"""
+    for start in range(0, len(parent_ids), PARENTS_PER_QUERY):
+        parents: str = " or ".join(f"'{parent_id}' in parents" for parent_id in parent_ids[start:start + PARENTS_PER_QUERY])
+        query: str = f"({parents}) and trashed = false"
+        if folders_only:
+            query += f" and mimeType = '{FOLDER_MIMETYPE}'"
+        page_token: str | None = None
+        while True:
+            response: dict = drive_service.files().list(q = query, fields = fields, pageSize = PAGE_SIZE, pageToken = page_token).execute()
+            yield from response.get('files', [])
+            page_token = response.get('nextPageToken')
+            if page_token is None:
+                break
+
+def list_tree(drive_service: any, folder_id: str, fields: str = INDEX_FIELDS, folders_only: bool = False) -> dict[str, dict]:
+    """Map the relative path of everything below folder_id to its Drive metadata, listing a whole level of the tree at a time
+
+    Where two entries share a path the first listed is kept, so a deep tree costs about one query per level per
+    PARENTS_PER_QUERY folders rather than one query per folder"""
+
+    output: dict[str, dict] = {}
+    prefixes: dict[str, str] = {folder_id: ""}
+    level: list[str] = [folder_id]
+
+    while level:
+        next_level: list[str] = []
+        for file in list_children(drive_service, level, fields, folders_only):
+            parent_id: str | None = next((parent_id for parent_id in file.get('parents', []) if parent_id in prefixes), None)
+            if parent_id is None:
+                continue
+            relative_path: str = prefixes[parent_id] + file['name']
+            if relative_path in output:
+                logging.info(f"Duplicate remote entry {relative_path}, keeping the first one listed")
+                continue
+            output[relative_path] = file
+            if file['mimeType'] == FOLDER_MIMETYPE and file['id'] not in prefixes:
+                prefixes[file['id']] = relative_path + "/"
+                next_level.append(file['id'])
+        level = next_level
+
+    logging.info(f"Listed {len(output)} remote entries below {folder_id}")
+    return output
+
+# < ======================================================================================================
+# < Folder Index Class
+# < ======================================================================================================
+
+class FolderIndex:
+
+    def __init__(self, path: str, root_id: str = None) -> None:
+        """Open the persistent index at path mapping remote folder paths below root_id, such as 'a/b/c', to Drive IDs
+
+        Resolving a folder is then a dictionary lookup instead of one files().list round trip per path component,
+        the index is filled by refresh, or by whatever listing the caller already made, and by folders created
+        through resolve, and is only written to disk by save"""
+        self.path: str = path
+        self.root_id: str = root_id or 'root'
+        self.lock: threading.Lock = threading.Lock()
+        self.connection: sqlite3.Connection = sqlite3.connect(path, check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+        self.folders: dict[str, str] = dict(self.connection.execute("SELECT path, folder_id FROM folders WHERE root_id = ?", (self.root_id,)))
+
+    def lookup(self, relative_path: str) -> str | None:
+        """Get the ID of the folder at relative_path, the root itself for an empty path"""
+        if not relative_path:
+            return self.root_id
+        with self.lock:
+            return self.folders.get(relative_path)
+
+    def record(self, relative_path: str, folder_id: str) -> None:
+        """Record the ID of the folder at relative_path"""
+        with self.lock:
+            self.folders[relative_path] = folder_id
+            self.connection.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", (self.root_id, relative_path, folder_id))
+
+    def replace(self, prefix: str, folders: dict[str, str]) -> None:
+        """Replace every entry below prefix, given as 'a/b' or '' for the whole index, with folders listed relative to it"""
+        start: str = f"{prefix}/" if prefix else ""
+        with self.lock:
+            self.folders = {path: folder_id for path, folder_id in self.folders.items() if not path.startswith(start)}
+            self.folders.update((start + path, folder_id) for path, folder_id in folders.items())
+            self.connection.execute("DELETE FROM folders WHERE root_id = ? AND substr(path, 1, ?) = ?", (self.root_id, len(start), start))
+            self.connection.executemany("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", ((self.root_id, start + path, folder_id) for path, folder_id in folders.items()))
+
+    def refresh(self, drive_service: any, prefix: str = "") -> None:
+        """Rebuild the entries below prefix from a bulk listing of the remote folders there"""
+        folder_id: str | None = self.lookup(prefix)
+        if folder_id is None:
+            return
+        tree: dict[str, dict] = list_tree(drive_service, folder_id, folders_only = True)
+        self.replace(prefix, {path: file['id'] for path, file in tree.items()})
+        logging.info(f"Indexed {len(tree)} remote folders below '{prefix or self.root_id}'")
+
+    def resolve(self, relative_path: str, drive_service: any, batcher: FolderBatcher = None) -> str:
+        """Get the ID of the folder at relative_path, creating it and any missing parents, on batcher if one is given
+
+        A folder queued on batcher is only written to disk once the batch creating it succeeds"""
+        folder_id: str | None = self.lookup(relative_path)
+        if folder_id is not None:
+            return folder_id
+        parent_path, _, folder_name = relative_path.rpartition("/")
+        parent_folder_id: str = self.resolve(parent_path, drive_service, batcher)
+        if batcher is None:
+            folder_id = create_folder(folder_name, drive_service, parent_folder_id)
+            self.record(relative_path, folder_id)
+        else:
+            folder_id = batcher.add(folder_name, parent_folder_id)
+            with self.lock:
+                self.folders[relative_path] = folder_id
+            batcher.when_created(folder_id, lambda: self.record(relative_path, folder_id))
+        return folder_id
+
+    def save(self) -> None:
+        """Commit recorded entries to disk"""
+        with self.lock:
+            self.connection.commit()
+
+    def close(self) -> None:
+        """Commit recorded entries and close the index"""
+        self.save()
+        self.connection.close()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,136 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import logging
+from typing import Callable
+from googleapiclient.errors import HttpError
+from ratelimit import RateLimiter
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+FOLDER_MIMETYPE: str = 'application/vnd.google-apps.folder'
+BATCH_LIMIT: int = 100 # < Drive rejects batch requests holding more than 100 calls
+GENERATE_IDS_LIMIT: int = 1000 # < Most IDs a single files().generateIds call will return
+ATTEMPTS: int = 3 # < Tries per batch call when there is no limiter to decide
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def retry_batch(limiter: RateLimiter | None, error: Exception, attempt: int) -> bool:
+    """Back off and return True if calls that failed inside a batch with error should be sent again
+
+    The limiter decides, with the same MAX_RETRIES budget and backoff as a single request, and without one each call
+    is tried ATTEMPTS times"""
+    if limiter is not None:
+        return limiter.retry(error, attempt)
+    return attempt + 1 < ATTEMPTS
+
+# < ======================================================================================================
+# < Folder Batcher Class
+# < ======================================================================================================
+
+class FolderBatcher:
+
+    def __init__(self, drive_service: any, batch_size: int = BATCH_LIMIT, max_waiting: int = 10000, limiter: RateLimiter = None) -> None:
+        """Initialise a batcher that creates Drive folders in batch requests using pre-generated IDs
+
+        Folders must be added parents first, ideally breadth first, the pending batch is sent when it is full,
+        when a folder is added whose parent is still waiting in it, as batch calls may run in any order,
+        or when more than max_waiting callbacks are held back waiting for pending folders, calls failing inside a
+        batch are retried as retry_batch decides"""
+        self.drive_service: any = drive_service
+        self.batch_size: int = max(1, min(batch_size, BATCH_LIMIT))
+        self.max_waiting: int = max(1, max_waiting)
+        self.reserved_ids: list[str] = []
+        self.pending: dict[str, dict] = {}
+        self.created: set[str] = set()
+        self.waiting: dict[str, list[Callable[[], None]]] = {}
+        self.waiting_count: int = 0
+        self.requests: int = 0
+        self.limiter: RateLimiter | None = limiter
+
+    def reserve_id(self) -> str:
+        """Take a pre-generated file ID, fetching a block of them from Drive when none are left"""
+        if not self.reserved_ids:
+            response: dict = self.drive_service.files().generateIds(count = GENERATE_IDS_LIMIT, space = 'drive', type = 'files').execute()
+            self.requests += 1
+            self.reserved_ids = response['ids']
+        return self.reserved_ids.pop()
+
+    def add(self, folder_name: str, parent_folder_id: str = None, identifier: str = None) -> str:
+        """Queue a folder for creation and return the ID it will have once created, a reserved ID if none is given"""
+        if parent_folder_id in self.pending or len(self.pending) >= self.batch_size:
+            self.flush()
+        identifier = identifier or self.reserve_id()
+        file_metadata: dict = {'id': identifier, 'name': folder_name, 'mimeType': FOLDER_MIMETYPE}
+        if parent_folder_id is not None:
+            file_metadata['parents'] = [parent_folder_id]
+        self.pending[identifier] = file_metadata
+        return identifier
+
+    def when_created(self, folder_id: str, callback: Callable[[], None]) -> None:
+        """Run callback once folder_id exists on Drive, immediately if it already does"""
+        if folder_id in self.pending:
+            self.waiting.setdefault(folder_id, []).append(callback)
+            self.waiting_count += 1
+            if self.waiting_count >= self.max_waiting:
+                self.flush()
+        else:
+            callback()
+
+    def flush(self) -> None:
+        """Send every pending folder create in one batch request, retrying failed calls"""
+
+        remaining: dict[str, dict] = self.pending
+        errors: dict[str, Exception] = {}
+        attempt: int = 0
+
+        while remaining:
+
+            errors = {}
+
+            def callback(request_id: str, response: dict, exception: Exception) -> None:
+                if exception is None or (isinstance(exception, HttpError) and exception.resp.status == 409):
+                    # < 409 means a previous attempt did create this ID, so the folder already exists
+                    self.created.add(request_id)
+                else:
+                    errors[request_id] = exception
+
+            batch = self.drive_service.new_batch_http_request(callback = callback)
+            for identifier, file_metadata in remaining.items():
+                batch.add(self.drive_service.files().create(body = file_metadata, fields = 'id'), request_id = identifier)
+            batch.execute()
+            self.requests += 1
+
+            logging.info(f"Created {len(remaining) - len(errors)} of {len(remaining)} folders in batch request (attempt {attempt + 1})")
+            remaining = {identifier: remaining[identifier] for identifier in errors}
+
+            if remaining and not retry_batch(self.limiter, next(iter(errors.values())), attempt):
+                break
+            attempt += 1
+
+        self.pending = {}
+
+        if errors:
+            identifier, error = next(iter(errors.items()))
+            raise error
+
+        for identifier in list(self.waiting):
+            if identifier in self.created:
+                callbacks: list[Callable[[], None]] = self.waiting.pop(identifier)
+                self.waiting_count -= len(callbacks)
+                for callback in callbacks:
+                    callback()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
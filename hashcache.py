@@ -0,0 +1,157 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import mmap
+import sqlite3
+import hashlib
+import logging
+import threading
+import tracing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS hashes (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    md5 TEXT NOT NULL,
+    PRIMARY KEY (device, inode, size, mtime)
+);
+CREATE TABLE IF NOT EXISTS remote (
+    md5 TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL
+);
+"""
+
+MMAP_THRESHOLD: int = 64 * 1024 * 1024 # < Files from this size up are hashed through a memory map rather than read in blocks
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def file_md5(filepath: str, block_size: int = 1024 * 1024) -> str:
+    """Get the md5 hex digest of a local file, memory mapping files of at least MMAP_THRESHOLD bytes"""
+    digest = hashlib.md5()
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+                digest.update(mapped) # < One call over the whole file, hashlib releases the GIL while it runs
+        else:
+            while block := f.read(block_size):
+                digest.update(block)
+    return digest.hexdigest()
+
+# < ======================================================================================================
+# < Hash Cache Class
+# < ======================================================================================================
+
+class HashCache:
+
+    def __init__(self, path: str, workers: int = 2, processes: int = 0) -> None:
+        """Open the SQLite cache at path, holding local md5s and the Drive file already holding each md5
+
+        Local md5s are keyed by (device, inode, size, mtime) so an unchanged file is never read twice, and files can be
+        hashed ahead of time on a pool of worker threads so hashing overlaps with uploads rather than delaying them.
+        With processes above 0 the hashing itself runs in a pool of that many processes, keeping it entirely off the
+        interpreter running the uploads"""
+        self.path: str = path
+        self.lock: threading.Lock = threading.Lock()
+        self.connection: sqlite3.Connection = sqlite3.connect(path, check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers = max(1, workers), thread_name_prefix = "hash")
+        self.futures: dict[str, tuple[tuple[int, int, int, int], Future]] = {} # < Filepath to its cache key when queued and the hash in flight
+        self.processes: ProcessPoolExecutor | None = ProcessPoolExecutor(max_workers = processes) if processes > 0 else None
+
+    @staticmethod
+    def key(stat: os.stat_result) -> tuple[int, int, int, int]:
+        """Get the cache key for a file from its stat result"""
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def cached_md5(self, stat: os.stat_result) -> str | None:
+        """Get the cached md5 for a file if its stat result is unchanged since it was hashed"""
+        with self.lock:
+            row = self.connection.execute("SELECT md5 FROM hashes WHERE device = ? AND inode = ? AND size = ? AND mtime = ?", self.key(stat)).fetchone()
+        return row[0] if row else None
+
+    def compute(self, filepath: str) -> str:
+        """Get the md5 of filepath from the cache, hashing and storing it on a miss"""
+        stat: os.stat_result = os.stat(filepath)
+        md5: str | None = self.cached_md5(stat)
+        if md5 is None:
+            with tracing.span("md5", "hash", path = filepath, bytes = stat.st_size):
+                md5 = file_md5(filepath) if self.processes is None else self.processes.submit(file_md5, filepath).result()
+            with self.lock, self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)", (*self.key(stat), md5))
+        return md5
+
+    def prefetch(self, filepath: str) -> None:
+        """Start hashing filepath in the background so md5 finds it ready
+
+        The hash is only held until it finishes, as it is in the cache from then on, so a prefetched file that is
+        never asked for costs nothing afterwards"""
+        try:
+            key: tuple[int, int, int, int] = self.key(os.stat(filepath))
+        except OSError:
+            return
+        with self.lock:
+            if filepath in self.futures:
+                return
+            future: Future = self.executor.submit(self.compute, filepath)
+            self.futures[filepath] = (key, future)
+        future.add_done_callback(lambda future: self.forget(filepath, future))
+
+    def forget(self, filepath: str, future: Future) -> None:
+        """Drop a finished prefetch of filepath, unless it has already been replaced"""
+        with self.lock:
+            if filepath in self.futures and self.futures[filepath][1] is future:
+                del self.futures[filepath]
+
+    def md5(self, filepath: str) -> str:
+        """Get the md5 of filepath, waiting for a prefetch of it if one is running for the file as it is now"""
+        stat: os.stat_result = os.stat(filepath)
+        with self.lock:
+            key, future = self.futures.get(filepath, (None, None))
+        if future is not None and key == self.key(stat):
+            return future.result()
+        return self.compute(filepath)
+
+    def find_remote(self, md5: str) -> str | None:
+        """Get the ID of a Drive file known to have this md5"""
+        with self.lock:
+            row = self.connection.execute("SELECT file_id FROM remote WHERE md5 = ?", (md5,)).fetchone()
+        return row[0] if row else None
+
+    def record_remote(self, md5: str, file_id: str) -> None:
+        """Remember that file_id on Drive has this md5"""
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO remote VALUES (?, ?)", (md5, file_id))
+
+    def forget_remote(self, md5: str) -> None:
+        """Forget the Drive file recorded for this md5, used once it can no longer be copied"""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM remote WHERE md5 = ?", (md5,))
+
+    def close(self) -> None:
+        """Stop the hashing pools, dropping hashes not yet started, and close the cache"""
+        self.executor.shutdown(cancel_futures = True)
+        if self.processes is not None:
+            self.processes.shutdown(cancel_futures = True)
+        self.connection.close()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,270 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import re
+import logging
+from typing import Iterable
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+WILDCARDS: str = "*?[\\"
+WILDCARD_SPLIT: str = r"[*?\[\\]"
+
+# < ======================================================================================================
+# < Ignore Rules Class
+# < ======================================================================================================
+
+class IgnoreRules:
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        """Compile gitignore-style patterns so any path can be checked against all of them at once
+
+        Supports comments, negation with !, directory-only rules ending in /, anchored rules containing a /, and the
+        * ? [] and ** wildcards, later rules override earlier ones and matching is case-insensitive as on Windows.
+        Plain names go in a dictionary and wildcard rules in a GlobIndex, so the cost of a check depends on the
+        length of the path rather than on how many patterns there are"""
+
+        self.negated: list[bool] = []
+
+        names: dict[bool, dict[str, int]] = {False: {}, True: {}}
+        name_globs: dict[bool, list[tuple[int, str]]] = {False: [], True: []}
+        path_globs: dict[bool, list[tuple[int, str]]] = {False: [], True: []}
+
+        for line in patterns:
+
+            rule: tuple[str, bool, bool, bool] | None = self.parse(line)
+            if rule is None:
+                continue
+            pattern, negated, directory_only, anchored = rule
+
+            index: int = len(self.negated)
+            self.negated.append(negated)
+
+            # < Rules for files also apply to directories, directory-only rules never apply to files
+            kinds: tuple[bool, ...] = (True,) if directory_only else (False, True)
+
+            for is_dir in kinds:
+                if anchored:
+                    path_globs[is_dir].append((index, pattern))
+                elif not any(character in pattern for character in WILDCARDS):
+                    names[is_dir][pattern.lower()] = index
+                else:
+                    name_globs[is_dir].append((index, pattern))
+
+        self.names: dict[bool, dict[str, int]] = names
+        self.name_globs: dict[bool, GlobIndex] = {is_dir: GlobIndex(rules) for is_dir, rules in name_globs.items()}
+        self.path_globs: dict[bool, GlobIndex] = {is_dir: GlobIndex(rules) for is_dir, rules in path_globs.items()}
+
+    def __bool__(self) -> bool:
+        return bool(self.negated)
+
+    @staticmethod
+    def parse(line: str) -> tuple[str, bool, bool, bool] | None:
+        """Parse one gitignore line into (pattern, negated, directory_only, anchored), or None for blanks and comments"""
+        line = line.rstrip("\n\r")
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if not line or line.startswith("#"):
+            return None
+        negated: bool = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\!") or line.startswith("\\#"):
+            line = line[1:]
+        directory_only: bool = line.endswith("/")
+        line = line.rstrip("/")
+        anchored: bool = "/" in line
+        line = line.lstrip("/")
+        if line.startswith("**/") and "/" not in line[3:]:
+            # < **/name matches name at any depth, which is exactly what an unanchored name does
+            line, anchored = line[3:], False
+        if not line:
+            return None
+        return line, negated, directory_only, anchored
+
+    @classmethod
+    def from_file(cls, filepath: str) -> "IgnoreRules":
+        """Compile the rules in a gitignore-style file"""
+        with open(filepath, "r", encoding = "utf-8", errors = "replace") as f:
+            return cls(f.readlines())
+
+    def decide(self, relative_path: str, name: str, is_dir: bool) -> bool | None:
+        """Get True if the path is ignored, False if a negated rule re-includes it, or None if no rule matches"""
+
+        best: int = max(
+            self.names[is_dir].get(name.lower(), -1),
+            self.name_globs[is_dir].best(name),
+            self.path_globs[is_dir].best(relative_path)
+        )
+
+        if best < 0:
+            return None
+        return not self.negated[best]
+
+# < ======================================================================================================
+# < Glob Index Class
+# < ======================================================================================================
+
+class GlobIndex:
+
+    def __init__(self, rules: list[tuple[int, str]]) -> None:
+        """Index wildcard rules, given as (priority, pattern), by the literal text they start or end with
+
+        A check only runs the rules whose literal prefix or suffix the target actually has, each bucket of rules
+        folded into a single regex with the highest priority first, so unrelated patterns cost one dictionary lookup
+        per distinct prefix or suffix length rather than one regex test each"""
+
+        buckets: dict[str, dict[str, list[tuple[int, str]]]] = {"prefix": {}, "suffix": {}}
+        generic: list[tuple[int, str]] = []
+
+        for index, pattern in rules:
+            prefix: str = re.split(WILDCARD_SPLIT, pattern, maxsplit = 1)[0]
+            suffix: str = re.split(WILDCARD_SPLIT, pattern)[-1]
+            if suffix != pattern and ("]" in suffix or pattern[-len(suffix) - 1] in "[\\"):
+                suffix = "" # < Text after a [ or \ is bracket contents or escaped, not literal text every match ends with
+            if prefix:
+                buckets["prefix"].setdefault(prefix.lower(), []).append((index, pattern))
+            elif suffix:
+                buckets["suffix"].setdefault(suffix.lower(), []).append((index, pattern))
+            else:
+                generic.append((index, pattern))
+
+        self.prefixes: dict[str, tuple[re.Pattern, list[int]]] = {key: compile_rules(bucket) for key, bucket in buckets["prefix"].items()}
+        self.suffixes: dict[str, tuple[re.Pattern, list[int]]] = {key: compile_rules(bucket) for key, bucket in buckets["suffix"].items()}
+        self.prefix_lengths: list[int] = sorted({len(key) for key in self.prefixes})
+        self.suffix_lengths: list[int] = sorted({len(key) for key in self.suffixes})
+        self.generic: tuple[re.Pattern, list[int]] | None = compile_rules(generic) if generic else None
+
+    def best(self, target: str) -> int:
+        """Get the highest priority of the rules matching target, or -1 if none do"""
+
+        best: int = -1
+        lowered: str = target.lower()
+        candidates: list[tuple[re.Pattern, list[int]]] = []
+
+        for length in self.prefix_lengths:
+            if length > len(lowered):
+                break
+            compiled = self.prefixes.get(lowered[:length])
+            if compiled is not None:
+                candidates.append(compiled)
+
+        for length in self.suffix_lengths:
+            if length > len(lowered):
+                break
+            compiled = self.suffixes.get(lowered[-length:])
+            if compiled is not None:
+                candidates.append(compiled)
+
+        if self.generic is not None:
+            candidates.append(self.generic)
+
+        for regex, indexes in candidates:
+            match: re.Match | None = regex.fullmatch(target)
+            if match is not None:
+                best = max(best, indexes[match.lastindex - 1])
+
+        return best
+
+# < ======================================================================================================
+# < Ignore Matcher Class
+# < ======================================================================================================
+
+class IgnoreMatcher:
+
+    def __init__(self, rules: IgnoreRules, base: str, parent: "IgnoreMatcher" = None) -> None:
+        """Initialise a matcher applying rules to paths below base, deferring to parent when no rule decides"""
+        self.rules: IgnoreRules = rules
+        self.base: str = base
+        self.prefix_length: int = len(os.path.join(base, ""))
+        self.parent: IgnoreMatcher | None = parent
+
+    def is_ignored(self, path: str, name: str, is_dir: bool) -> bool:
+        """Check whether a path below base should be skipped, rules in deeper ignore files take precedence"""
+        matcher: IgnoreMatcher | None = self
+        while matcher is not None:
+            relative_path: str = path[matcher.prefix_length:].replace(os.sep, "/")
+            decision: bool | None = matcher.rules.decide(relative_path, name, is_dir)
+            if decision is not None:
+                return decision
+            matcher = matcher.parent
+        return False
+
+    def child(self, directory: str, ignore_filepaths: list[str]) -> "IgnoreMatcher":
+        """Get the matcher for the contents of directory, adding the rules of any ignore files found inside it"""
+        matcher: IgnoreMatcher = self
+        for filepath in ignore_filepaths:
+            try:
+                rules: IgnoreRules = IgnoreRules.from_file(filepath)
+            except OSError as e:
+                logging.info(f"An error occurred reading ignore file {filepath}: {e}. Skipping it")
+                continue
+            if rules:
+                matcher = IgnoreMatcher(rules, directory, matcher)
+        return matcher
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def translate(pattern: str) -> str:
+    """Translate a gitignore glob into an equivalent regex, where only ** may cross a /"""
+
+    output: list[str] = []
+    index: int = 0
+    length: int = len(pattern)
+
+    while index < length:
+
+        character: str = pattern[index]
+
+        if pattern.startswith("**/", index) and (index == 0 or pattern[index - 1] == "/"):
+            output.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index) and index + 2 == length and (index == 0 or pattern[index - 1] == "/"):
+            output.append(".*")
+            index += 2
+        elif character == "*":
+            output.append("[^/]*")
+            index += 1
+        elif character == "?":
+            output.append("[^/]")
+            index += 1
+        elif character == "[":
+            end: int = pattern.find("]", index + 2)
+            if end == -1:
+                output.append(re.escape(character))
+                index += 1
+                continue
+            content: str = pattern[index + 1:end].replace("\\", "\\\\")
+            if content[0] in "!^":
+                content = "^" + content[1:]
+            output.append(f"[{content}]")
+            index = end + 1
+        elif character == "\\" and index + 1 < length:
+            output.append(re.escape(pattern[index + 1]))
+            index += 2
+        else:
+            output.append(re.escape(character))
+            index += 1
+
+    return "".join(output)
+
+def compile_rules(rules: list[tuple[int, str]]) -> tuple[re.Pattern, list[int]]:
+    """Fold glob rules into one regex with a group per rule, highest index first, returning it with the index of each group"""
+    ordered: list[tuple[int, str]] = sorted(rules, reverse = True)
+    regex: re.Pattern = re.compile("|".join(f"({translate(pattern)})" for _, pattern in ordered), re.IGNORECASE | re.DOTALL)
+    return regex, [index for index, _ in ordered]
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,249 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from engine import UploadListener
+from folders import FolderBatcher
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+PENDING: str = "pending"
+IN_FLIGHT: str = "in-flight"
+DONE: str = "done"
+FAILED: str = "failed"
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    subfolder_id TEXT NOT NULL,
+    created REAL NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, finished);
+CREATE TABLE IF NOT EXISTS folders (
+    job_id INTEGER NOT NULL,
+    local_path TEXT NOT NULL,
+    folder_id TEXT NOT NULL,
+    created INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, local_path)
+);
+CREATE TABLE IF NOT EXISTS files (
+    job_id INTEGER NOT NULL,
+    local_path TEXT NOT NULL,
+    state TEXT NOT NULL,
+    file_id TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, local_path)
+);
+CREATE TABLE IF NOT EXISTS archives (
+    job_id INTEGER NOT NULL,
+    local_path TEXT NOT NULL,
+    members TEXT NOT NULL,
+    PRIMARY KEY (job_id, local_path)
+);
+"""
+
+# < ======================================================================================================
+# < Journal Class
+# < ======================================================================================================
+
+class Journal:
+
+    def __init__(self, path: str = None, key: str = "", batch_size: int = 500, flush_interval: float = 1.0) -> None:
+        """Open the job journal at path and pick up the unfinished job recorded under key, if there is one
+
+        Every planned folder and file is recorded with its Drive ID and state, so a job that dies part way through can
+        be run again and only redo unfinished work inside the remote folders it already created. Writes are buffered
+        and committed in one transaction per batch_size records or flush_interval seconds, whichever comes first, to
+        a SQLite database in WAL mode, so journalling never holds up the uploads. A daemon thread commits the buffer
+        once it is flush_interval seconds old even if nothing else is written, such as during one long resumable upload,
+        so a file recorded done is never lost to a crash long after. Without a path nothing is recorded"""
+
+        self.path: str | None = path
+        self.key: str = key
+        self.batch_size: int = max(1, batch_size)
+        self.flush_interval: float = flush_interval
+        self.lock: threading.Lock = threading.Lock()
+        self.buffer: list[tuple[str, tuple]] = []
+        self.flushed: float = time.monotonic()
+        self.job_id: int | None = None
+        self.subfolder_id: str | None = None
+        self.folders: dict[str, tuple[str, bool]] = {}
+        self.done: set[str] = set()
+        self.file_ids: dict[str, str] = {}
+        self.archives: dict[str, list[str]] = {}
+        self.connection: sqlite3.Connection | None = None
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+        if path is None:
+            return
+
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.thread = threading.Thread(target = self.run, name = "journal-flush", daemon = True)
+        self.thread.start()
+
+        row = self.connection.execute("SELECT job_id, subfolder_id FROM jobs WHERE key = ? AND finished = 0 ORDER BY job_id DESC LIMIT 1", (key,)).fetchone()
+        if row is None:
+            return
+
+        self.job_id, self.subfolder_id = row
+        for local_path, folder_id, created in self.connection.execute("SELECT local_path, folder_id, created FROM folders WHERE job_id = ?", (self.job_id,)):
+            self.folders[local_path] = (folder_id, bool(created))
+        self.file_ids = dict(self.connection.execute("SELECT local_path, file_id FROM files WHERE job_id = ? AND state = ?", (self.job_id, DONE)))
+        self.done = set(self.file_ids)
+        for local_path, members in self.connection.execute("SELECT local_path, members FROM archives WHERE job_id = ?", (self.job_id,)):
+            self.archives[local_path] = json.loads(members)
+        logging.info(f"Resuming journalled job {self.job_id} with {len(self.done)} files and {len(self.folders)} folders already recorded")
+
+    @staticmethod
+    def job_key(*parts: any) -> str:
+        """Get a key identifying a job from what it uploads and where, so running the same job again finds it"""
+        return hashlib.sha1(json.dumps(parts, sort_keys = True, default = str).encode("utf-8")).hexdigest()
+
+    @property
+    def resumed(self) -> bool:
+        """Whether an unfinished job was found to pick up"""
+        return self.subfolder_id is not None
+
+    def start(self, subfolder_id: str) -> None:
+        """Record a new job uploading into subfolder_id, nothing is recorded when resuming one"""
+        if self.connection is None or self.job_id is not None:
+            return
+        with self.lock, self.connection:
+            cursor: sqlite3.Cursor = self.connection.execute("INSERT INTO jobs (key, subfolder_id, created) VALUES (?, ?, ?)", (self.key, subfolder_id, time.time()))
+        self.job_id, self.subfolder_id = cursor.lastrowid, subfolder_id
+
+    def write(self, sql: str, parameters: tuple) -> None:
+        """Buffer a write, committing the buffer once it is full or old enough"""
+        if self.connection is None:
+            return
+        with self.lock:
+            self.buffer.append((sql, parameters))
+            if len(self.buffer) < self.batch_size and time.monotonic() - self.flushed < self.flush_interval:
+                return
+            self.commit()
+
+    def commit(self) -> None:
+        """Write out the buffer in one transaction, the lock must be held"""
+        if self.buffer:
+            with self.connection:
+                for sql, parameters in self.buffer:
+                    self.connection.execute(sql, parameters)
+            self.buffer = []
+        self.flushed = time.monotonic()
+
+    def flush(self) -> None:
+        """Commit every buffered write"""
+        with self.lock:
+            if self.connection is not None:
+                self.commit()
+
+    def run(self) -> None:
+        """Commit the buffer every flush_interval seconds while anything is waiting in it, until closed"""
+        while not self.stopped.wait(self.flush_interval):
+            with self.lock:
+                if self.connection is not None and self.buffer:
+                    self.commit()
+
+    def add_folder(self, batcher: FolderBatcher, local_path: str, parent_folder_id: str = None) -> str:
+        """Queue local_path for creation on batcher unless this job already created it, returning its Drive ID
+
+        A folder recorded but never confirmed is queued again under the same ID, which Drive either creates or
+        rejects with the 409 the batcher takes to mean it already exists"""
+        saved: tuple[str, bool] | None = self.folders.get(local_path)
+        if saved is not None and saved[1]:
+            return saved[0]
+        identifier: str = batcher.add(os.path.basename(local_path), parent_folder_id, saved[0] if saved is not None else None)
+        if saved is None:
+            self.folders[local_path] = (identifier, False)
+            self.write("INSERT OR REPLACE INTO folders (job_id, local_path, folder_id) VALUES (?, ?, ?)", (self.job_id, local_path, identifier))
+        batcher.when_created(identifier, lambda: self.write("UPDATE folders SET created = 1 WHERE job_id = ? AND local_path = ?", (self.job_id, local_path)))
+        return identifier
+
+    def is_done(self, filepath: str) -> bool:
+        """Check whether this job already uploaded filepath"""
+        return filepath in self.done
+
+    def file_id(self, filepath: str) -> str | None:
+        """Get the Drive ID of a file this job already uploaded"""
+        return self.file_ids.get(filepath)
+
+    def record_archive(self, archive_path: str, arcnames: list[str]) -> None:
+        """Record the files planned into an archive, so a resumed job knows what each finished archive holds"""
+        self.archives[archive_path] = arcnames
+        self.write("INSERT OR REPLACE INTO archives (job_id, local_path, members) VALUES (?, ?, ?)", (self.job_id, archive_path, json.dumps(arcnames)))
+
+    def record(self, filepath: str, state: str, file_id: str = None, error: str = None) -> None:
+        """Record the state of a file in this job"""
+        self.write("INSERT OR REPLACE INTO files (job_id, local_path, state, file_id, error) VALUES (?, ?, ?, ?, ?)", (self.job_id, filepath, state, file_id, error))
+
+    def finish(self) -> None:
+        """Mark the job complete, so running it again starts a new one"""
+        if self.connection is None or self.job_id is None:
+            return
+        with self.lock, self.connection:
+            self.commit()
+            self.connection.execute("UPDATE jobs SET finished = 1 WHERE job_id = ?", (self.job_id,))
+
+    def close(self) -> None:
+        """Commit every buffered write and close the database"""
+        if self.connection is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            self.commit()
+            self.connection.close()
+            self.connection = None
+
+# < ======================================================================================================
+# < Journal Listener Class
+# < ======================================================================================================
+
+class JournalListener(UploadListener):
+
+    def __init__(self, journal: Journal, listener: UploadListener = None) -> None:
+        """Record file states in journal as uploads report them, passing every event on to listener"""
+        self.journal: Journal = journal
+        self.listener: UploadListener = listener or UploadListener()
+
+    def file_started(self, filepath: str, size: int) -> None:
+        self.journal.record(filepath, IN_FLIGHT)
+        self.listener.file_started(filepath, size)
+
+    def file_progress(self, filepath: str, bytes_sent: int, total: int) -> None:
+        self.listener.file_progress(filepath, bytes_sent, total)
+
+    def file_done(self, filepath: str, file_id: str) -> None:
+        self.journal.record(filepath, DONE, file_id)
+        self.listener.file_done(filepath, file_id)
+
+    def file_failed(self, filepath: str, error: BaseException) -> None:
+        self.journal.record(filepath, FAILED, error = repr(error))
+        self.listener.file_failed(filepath, error)
+
+    def is_cancelled(self) -> bool:
+        return self.listener.is_cancelled()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -3,13 +3,21 @@
 # < Imports
 # < ======================================================================================================
 
+import startup
 import sys
 import os
 import json
+import stat
+import time
+import queue
 import logging
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import *
-from PyQt5.QtWidgets import *
+import threading
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QDragEnterEvent, QDropEvent, QIcon, QKeySequence, QPainter, QPen, QPixmap
+from PyQt5.QtWidgets import (
+    QAbstractItemView, QAction, QApplication, QFileDialog, QGraphicsOpacityEffect, QHeaderView, QInputDialog, QLabel,
+    QMainWindow, QMessageBox, QPushButton, QShortcut, QStyle, QTableView, QTableWidget, QVBoxLayout, QWidget
+)
 
 # < ======================================================================================================
 # < Constants
@@ -18,11 +26,12 @@ from PyQt5.QtWidgets import *
 with open("settings.json", 'r') as f:
     SETTINGS: dict = json.load(f)
     
-FOLDER_ID: str = SETTINGS["FOLDER_ID"]
 TOKEN_PATH: str = SETTINGS["TOKEN_PATH"]
 CLIENT_SECRET_PATH: str = SETTINGS["CLIENT_SECRET_PATH"]
 SCOPES: list[str] = SETTINGS["SCOPES"]
 IGNORED_PATTERNS: list[str] = SETTINGS["IGNORED_PATTERNS"]
+STARTUP_BUDGET_MS: float = SETTINGS.get("STARTUP_BUDGET_MS", 1000)
+MB: int = 1024 * 1024
 
 # < ======================================================================================================
 # < Tools
@@ -109,6 +118,21 @@ class tools:
         current_time: str = datetime.now().strftime("%H:%M:%S")
         return f"[{current_date} | {current_time}]"
     
+    @staticmethod
+    def format_bytes(size: float) -> str:
+        """Format a byte count as a short human readable string"""
+        for unit in ("B", "KB", "MB", "GB"):
+            if size < 1024:
+                return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+            size /= 1024
+        return f"{size:.1f} TB"
+
+    @staticmethod
+    def format_duration(seconds: float) -> str:
+        """Format a number of seconds as H:MM:SS"""
+        seconds = int(seconds)
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
     @staticmethod
     def clear_table(table: QTableWidget) -> None:
         """Clear data and rows from a QTableWidget"""
@@ -138,15 +162,281 @@ class tools:
         """Logs text, mainly used as a test function to check if a PyQt action is called correctly"""
         logging.info("tools.test function called")
 
+# < ======================================================================================================
+# < Upload Worker Class
+# < ======================================================================================================
+
+class UploadWorker(QObject):
+
+    file_progress = pyqtSignal(str, object, object)
+    file_done = pyqtSignal(str, str)
+    file_failed = pyqtSignal(str, str)
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, filepaths: list[str], folderpaths: list[str], packed_folderpaths: list[str], folder_ids: list[str], drive_service: any = None, options: any = None, credential_manager: any = None) -> None:
+        """Initialise a worker that runs the upload pipeline when moved to a QThread and started, uploading into folder_ids
+
+        drive_service, options and credential_manager are those of a previous upload to reuse, they are created on first
+        use otherwise. Every Drive service the upload builds shares the credentials of credential_manager"""
+        super().__init__()
+        self.filepaths: list[str] = filepaths
+        self.folderpaths: list[str] = folderpaths
+        self.packed_folderpaths: list[str] = packed_folderpaths
+        self.folder_ids: list[str] = folder_ids
+        self.drive_service: any = drive_service
+        self.options: any = options
+        self.credential_manager: any = credential_manager
+        self.cancel_event: threading.Event = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask the running upload to stop, safe to call from any thread"""
+        logging.info("Upload cancellation requested")
+        self.cancel_event.set()
+
+    def run(self) -> None:
+        """Run the upload, reporting through signals instead of touching any widgets"""
+
+        from authenticator import CredentialManager
+        from engine import UploadCancelled, UploadListener
+        from uploader import UploadOptions, upload_mixed
+
+        worker = self
+
+        class SignalListener(UploadListener):
+
+            def file_progress(self, filepath: str, bytes_sent: int, total: int) -> None:
+                startup.mark("first upload progress")
+                worker.file_progress.emit(filepath, bytes_sent, total)
+
+            def file_done(self, filepath: str, file_id: str) -> None:
+                worker.file_done.emit(filepath, file_id)
+
+            def file_failed(self, filepath: str, error: BaseException) -> None:
+                if not isinstance(error, UploadCancelled):
+                    worker.file_failed.emit(filepath, repr(error))
+
+            def is_cancelled(self) -> bool:
+                return worker.cancel_event.is_set()
+
+        try:
+            startup.mark("upload started")
+            if self.options is None:
+                self.options = UploadOptions.from_settings(SETTINGS)
+            options = self.options
+            if self.credential_manager is None:
+                self.credential_manager = CredentialManager(TOKEN_PATH, CLIENT_SECRET_PATH, SCOPES)
+            credential_manager = self.credential_manager
+            if self.drive_service is None:
+                self.drive_service = credential_manager.service(options.rate_limiter, options.connection_pool)
+            startup.mark("drive client ready")
+            service_factory = lambda: credential_manager.service(options.rate_limiter, options.connection_pool)
+            upload_mixed(self.drive_service, self.filepaths, self.folderpaths, self.folder_ids, options, service_factory, SignalListener(), self.packed_folderpaths, credential_manager.get())
+        except UploadCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            logging.info(f"An error occurred during upload: {e!r}")
+            self.failed.emit(repr(e))
+        else:
+            self.finished.emit()
+        finally:
+            if self.options is not None:
+                self.options.close() # < Kept for the next upload, which opens the hash cache again if it needs it
+
+# < ======================================================================================================
+# < File Table Model Class
+# < ======================================================================================================
+
+class FileTableModel(QAbstractTableModel):
+
+    HEADERS: list[str] = ["Filename", "Path", "Type", "Progress"]
+    KINDS: list[str] = ["File", "Folder", "Packed Folder"]
+
+    def __init__(self, parent: QObject = None) -> None:
+        """Initialise an empty model of the files and folders queued for upload
+
+        Rows are held in one array per column rather than one object per cell, filenames are derived from paths when
+        drawn, and an index of normalised paths makes checking a dropped path for a duplicate O(1), so views over
+        hundreds of thousands of rows stay responsive"""
+        super().__init__(parent)
+        self.paths: list[str] = []
+        self.kinds: bytearray = bytearray()
+        self.progress: list[str] = []
+        self.index_of: dict[str, int] = {}
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.paths)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> str | None:
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if column == 0:
+            return os.path.basename(self.paths[row])
+        if column == 1:
+            return self.paths[row]
+        if column == 2:
+            return self.KINDS[self.kinds[row]]
+        return self.progress[row]
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> str | None:
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def add(self, items: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """Append (path, kind) items whose path is not already listed, in one insert, returning the items added"""
+        new_items: list[tuple[str, str]] = []
+        seen: set[str] = set()
+        for path, kind in items:
+            key: str = os.path.normpath(path)
+            if key not in self.index_of and key not in seen:
+                seen.add(key)
+                new_items.append((path, kind))
+        if not new_items:
+            return []
+        start: int = len(self.paths)
+        self.beginInsertRows(QModelIndex(), start, start + len(new_items) - 1)
+        for row, (path, kind) in enumerate(new_items, start):
+            self.paths.append(path)
+            self.kinds.append(self.KINDS.index(kind))
+            self.progress.append("")
+            self.index_of[os.path.normpath(path)] = row
+        self.endInsertRows()
+        return new_items
+
+    def row(self, path: str) -> int | None:
+        """Get the row listing path, if any"""
+        return self.index_of.get(os.path.normpath(path))
+
+    def clear(self) -> None:
+        """Remove every row"""
+        self.beginResetModel()
+        self.paths, self.kinds, self.progress, self.index_of = [], bytearray(), [], {}
+        self.endResetModel()
+
+    def rows(self) -> list[list[str]]:
+        """Get every row as [filename, path, type, progress]"""
+        return [[os.path.basename(path), path, self.KINDS[kind], progress] for path, kind, progress in zip(self.paths, self.kinds, self.progress)]
+
+    def kind(self, row: int) -> str:
+        """Get the type of a row"""
+        return self.KINDS[self.kinds[row]]
+
+    def set_kind(self, row: int, kind: str) -> None:
+        """Change the type of a row"""
+        self.kinds[row] = self.KINDS.index(kind)
+        index: QModelIndex = self.index(row, 2)
+        self.dataChanged.emit(index, index)
+
+    def set_progress(self, row: int, text: str) -> None:
+        """Change the progress text of a row"""
+        self.progress[row] = text
+        index: QModelIndex = self.index(row, 3)
+        self.dataChanged.emit(index, index)
+
+    def reset_progress(self, text: str) -> None:
+        """Set the progress text of every row at once"""
+        if not self.paths:
+            return
+        self.progress = [text] * len(self.paths)
+        self.dataChanged.emit(self.index(0, 3), self.index(len(self.paths) - 1, 3))
+
+# < ======================================================================================================
+# < Folder Scanner Class
+# < ======================================================================================================
+
+class FolderScanner(QObject):
+
+    progress = pyqtSignal(str, object, object, object, bool)
+    inspected = pyqtSignal(object, bool)
+
+    def __init__(self, parent: QObject = None) -> None:
+        """Initialise a scanner that counts the files, bytes and ignored entries of folders on a background thread
+
+        progress is emitted with (path, files, bytes, ignored, finished) as totals come in, directories are cached
+        by modification time for the whole session, so scanning a folder again is close to instant. Dropped paths
+        are sorted into files and folders on a second thread, so they are not held up behind a long scan"""
+        super().__init__(parent)
+        self.queue: queue.Queue = queue.Queue()
+        self.cache: dict = {}
+        self.thread: threading.Thread | None = None
+        self.inspect_queue: queue.Queue = queue.Queue()
+        self.inspect_thread: threading.Thread | None = None
+
+    def scan(self, path: str) -> None:
+        """Queue a folder to be scanned, starting the scanning thread on first use"""
+        self.queue.put(path)
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run, name = "folder-scan", daemon = True)
+            self.thread.start()
+
+    def run(self) -> None:
+        """Scan queued folders one at a time, using the same ignore rules as the uploader"""
+
+        from uploader import UploadOptions
+        from walker import scan
+
+        options = UploadOptions.from_settings(SETTINGS)
+
+        while True:
+            path: str = self.queue.get()
+            try:
+                files, size, ignored = scan(path, options.ignore_rules, options.ignore_files, self.cache, lambda files, size, ignored: self.progress.emit(path, files, size, ignored, False))
+            except OSError as e:
+                logging.info(f"An error occurred scanning {path}: {e}")
+                continue
+            self.progress.emit(path, files, size, ignored, True)
+
+    def inspect(self, paths: list[str], packed: bool = False) -> None:
+        """Queue paths to be stat'ed, inspected is then emitted with a (path, is folder, size) entry for each one readable"""
+        self.inspect_queue.put((paths, packed))
+        if self.inspect_thread is None:
+            self.inspect_thread = threading.Thread(target = self.run_inspect, name = "path-inspect", daemon = True)
+            self.inspect_thread.start()
+
+    def run_inspect(self) -> None:
+        """Stat queued paths, skipping any that have gone or cannot be read"""
+        while True:
+            paths, packed = self.inspect_queue.get()
+            entries: list[tuple[str, bool, int]] = []
+            for path in paths:
+                try:
+                    result: os.stat_result = os.stat(path)
+                except OSError as e:
+                    logging.info(f"Skipping {path} as it cannot be read: {e}")
+                    continue
+                entries.append((path, stat.S_ISDIR(result.st_mode), result.st_size))
+            self.inspected.emit(entries, packed)
+
 # < ======================================================================================================
 # < Table QWidget Class
 # < ======================================================================================================
 
 class Table(QWidget):
 
+    status_changed = pyqtSignal(str)
+
     def __init__(self):
         """Initialize the Table"""
         super().__init__()
+        self.upload_thread: QThread | None = None
+        self.upload_worker: UploadWorker | None = None
+        self.drive_service: any = None # < Kept from the first upload so later uploads skip authentication
+        self.upload_options: any = None
+        self.credential_manager: any = None # < Refreshes the token in the background once the first upload signs in
+        self.scan_totals: dict[str, tuple[int, int, int, bool]] = {}
+        self.file_sizes: dict[str, int] = {} # < Size of each file row when it was added, so starting an upload stats nothing
+        self.file_count: int = 0
+        self.file_bytes: int = 0
+        self.throughput: float = SETTINGS.get("ESTIMATED_THROUGHPUT_MBPS", 2) * MB
+        self.scanner = FolderScanner(self)
+        self.scanner.progress.connect(self.on_folder_scanned)
+        self.scanner.inspected.connect(self.on_paths_inspected)
         self.setup_ui()
 
     def setup_ui(self) -> None:
@@ -159,38 +449,54 @@ class Table(QWidget):
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
 
-        self.table = QTableWidget(0, 3)
-        self.table.setHorizontalHeaderLabels(["Filename", "Path", "Type"])
+        self.model = FileTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed) # < Skips measuring every row
         self.table.setColumnWidth(0, 200)
         self.table.setColumnWidth(1, 200)
         self.table.setColumnWidth(2, 200)
+        self.table.setColumnWidth(3, 200)
         self.layout.addWidget(self.table)
 
         self.upload_button = QPushButton("Upload")
-        self.upload_button.clicked.connect(self.upload)
+        self.upload_button.clicked.connect(self.toggle_upload)
         self.layout.addWidget(self.upload_button)
 
+        self.status_timer = QTimer(self)
+        self.status_timer.setInterval(500)
+        self.status_timer.timeout.connect(self.update_status)
+
+    def folder_ids(self) -> list[str]:
+        """Get the destination folder IDs from FOLDER_ID, which holds either one ID or a list of them"""
+        folder_id: str | list[str] = self.settings.get('FOLDER_ID')
+        return [folder_id] if isinstance(folder_id, str) else list(folder_id or [])
+
     def update_folder_id(self) -> None:
-        """Change FOLDER_ID in settings.json to the value of the resulting QInputDialog"""
+        """Change FOLDER_ID in settings.json to the IDs in the resulting QInputDialog, one per line
 
-        current_folder_id = self.settings.get('FOLDER_ID')
+        Files upload into the first folder and are copied server-side into the others"""
 
         dialog = QInputDialog(self)                 
         dialog.setInputMode(QInputDialog.TextInput)
-        dialog.setLabelText("Google Drive Folder ID")
-        dialog.setTextValue(current_folder_id)
-        dialog.setWindowTitle("Update Folder ID")
-        dialog.resize(500, 100)
+        dialog.setOption(QInputDialog.UsePlainTextEditForTextInput)
+        dialog.setLabelText("Google Drive Folder IDs, one per line")
+        dialog.setTextValue("\n".join(self.folder_ids()))
+        dialog.setWindowTitle("Update Folder IDs")
+        dialog.resize(500, 200)
         ok = dialog.exec()
-        value = dialog.textValue()
+        value = [line.strip() for line in dialog.textValue().splitlines() if line.strip()]
 
         if not ok:
             return
         elif not value:
-            QMessageBox.warning(self, "Input Error", "Valid text must be provided")
+            QMessageBox.warning(self, "Input Error", "At least one folder ID must be provided")
             return
         else:
-            self.change_setting("FOLDER_ID", value)
+            folder_id: str | list[str] = value[0] if len(value) == 1 else value # < A single ID stays a plain string
+            self.change_setting("FOLDER_ID", folder_id)
+            self.settings['FOLDER_ID'] = folder_id
 
     def change_setting(self, name: str, value: any, filepath: str = "settings.json") -> None:
         """Change a setting in the settings.json file"""
@@ -208,9 +514,13 @@ class Table(QWidget):
 
     def clear(self) -> None:
         """Clear all entries from the file table"""
+        if self.is_uploading():
+            QMessageBox.warning(self, "Upload Running", "The list cannot be cleared while an upload is running")
+            return
         if self.confirmation():
-            self.table.clearContents()
-            self.table.setRowCount(0)
+            self.model.clear()
+            self.scan_totals, self.file_sizes, self.file_count, self.file_bytes = {}, {}, 0, 0
+            self.status_changed.emit("")
 
     def confirmation(self) -> bool:
         """Show confirmation dialog before an action and return boolean"""
@@ -229,22 +539,29 @@ class Table(QWidget):
         
     def get_table_rows(self) -> list[list[str]]:
         """Get table data as a list of rows"""
-        output: list[list[str]] = []
-        for row_index in range(self.table.rowCount()):
-            row: list[str] = []
-            for column_index in range(self.table.columnCount()):
-                item = self.table.item(row_index, column_index)
-                text = item.text()
-                row.append(text)
-            output.append(row)
-        return output
+        return self.model.rows()
     
     # < ======================================================================================================
     # < Upload Method
     # < ======================================================================================================
         
+    def is_uploading(self) -> bool:
+        """Check whether an upload worker is currently running"""
+        return self.upload_worker is not None
+
+    def toggle_upload(self) -> None:
+        """Start an upload, or cancel the running one"""
+        if self.is_uploading():
+            self.cancel_upload()
+        else:
+            self.upload()
+
     def upload(self) -> None:
-        """Upload files to Google Drive"""
+        """Upload files to Google Drive on a background thread, reporting progress in the table"""
+
+        if self.is_uploading():
+            QMessageBox.warning(self, "Upload Error", "An upload is already running")
+            return
 
         rows: list[list[str]] = self.get_table_rows()
       
@@ -254,30 +571,209 @@ class Table(QWidget):
         
         filepaths: list[str] = [item[1] for item in rows if item[2] == 'File']
         folderpaths: list[str] = [item[1] for item in rows if item[2] == 'Folder']
+        packed_folderpaths: list[str] = [item[1] for item in rows if item[2] == 'Packed Folder']
+
+        self.reset_progress(rows)
+
+        self.upload_thread = QThread(self)
+        self.upload_worker = UploadWorker(filepaths, folderpaths, packed_folderpaths, self.folder_ids(), self.drive_service, self.upload_options, self.credential_manager)
+        self.upload_worker.moveToThread(self.upload_thread)
+        self.upload_thread.started.connect(self.upload_worker.run)
+        self.upload_worker.file_progress.connect(self.on_file_progress)
+        self.upload_worker.file_done.connect(self.on_file_done)
+        self.upload_worker.file_failed.connect(self.on_file_failed)
+        self.upload_worker.finished.connect(self.on_upload_finished)
+        self.upload_worker.failed.connect(self.on_upload_failed)
+        self.upload_worker.cancelled.connect(self.on_upload_cancelled)
+        self.upload_thread.start()
+
+        self.upload_button.setText("Cancel")
+        self.status_timer.start()
+        self.update_status()
+
+    def cancel_upload(self) -> None:
+        """Cancel the running upload, leaving the application open"""
+        if self.is_uploading():
+            self.upload_worker.cancel()
+            self.upload_button.setEnabled(False)
+            self.status_changed.emit("Cancelling upload...")
+
+    def stop_worker(self) -> None:
+        """Wait for the worker thread to exit and reset the upload controls"""
+        self.status_timer.stop()
+        self.update_status()
+        self.record_throughput()
+        self.upload_thread.quit()
+        self.upload_thread.wait()
+        self.drive_service = self.upload_worker.drive_service
+        self.upload_options = self.upload_worker.options
+        self.credential_manager = self.upload_worker.credential_manager
+        self.upload_worker.deleteLater()
+        self.upload_thread.deleteLater()
+        self.upload_worker = None
+        self.upload_thread = None
+        self.upload_button.setText("Upload")
+        self.upload_button.setEnabled(True)
+
+    def on_upload_finished(self) -> None:
+        """Handle a successful upload"""
+        self.stop_worker()
+        QMessageBox.information(self, "Success", "Upload completed successfully")
+        QApplication.quit()
 
-        from authenticator import get_drive_service
-        from uploader import upload_mixed
+    def on_upload_failed(self, error: str) -> None:
+        """Handle an upload that stopped with an error"""
+        self.stop_worker()
+        QMessageBox.warning(self, "Upload Error", f"An error occurred: {error}")
 
-        drive_service = get_drive_service(TOKEN_PATH, CLIENT_SECRET_PATH, SCOPES)
+    def on_upload_cancelled(self) -> None:
+        """Handle an upload stopped by the user"""
+        self.stop_worker()
+        self.status_changed.emit("Upload cancelled")
 
-        try:
-            upload_mixed(drive_service, filepaths, folderpaths, FOLDER_ID)
+    # < ======================================================================================================
+    # < Scan Methods
+    # < ======================================================================================================
 
-        except Exception as e:
-            QMessageBox.warning(self, "Upload Error", f"An error occurred: {repr(e)}")
+    def on_folder_scanned(self, path: str, files: int, size: int, ignored: int, finished: bool) -> None:
+        """Record scan totals for a folder row and show them until an upload starts"""
+        key: str = os.path.normpath(path)
+        if key not in self.scan_totals:
+            return # < Cleared from the list while it was being scanned
+        self.scan_totals[key] = (files, size, ignored, finished)
+        row: int | None = self.model.row(path)
+        if row is None or self.is_uploading():
             return
-        
-        QMessageBox.information(self, "Success", "Upload completed successfully")
-        QApplication.quit()
-        
+        text: str = f"{files:,} files, {tools.format_bytes(size)}"
+        if ignored:
+            text += f", {ignored:,} ignored"
+        if not finished:
+            text += " (scanning)"
+        self.model.set_progress(row, text)
+        self.show_estimate()
+
+    def scanned_size(self, path: str) -> int | None:
+        """Get the total bytes of a folder row, or None if its scan has not finished"""
+        files, size, ignored, finished = self.scan_totals.get(os.path.normpath(path), (0, 0, 0, False))
+        return size if finished else None
+
+    def show_estimate(self) -> None:
+        """Show the size of everything listed and how long it should take at the last measured throughput"""
+        if self.is_uploading():
+            return
+        files: int = self.file_count + sum(totals[0] for totals in self.scan_totals.values())
+        size: int = self.file_bytes + sum(totals[1] for totals in self.scan_totals.values())
+        message: str = f"{files:,} files, {tools.format_bytes(size)}, about {tools.format_duration(size / self.throughput)} at {tools.format_bytes(self.throughput)}/s"
+        if not all(totals[3] for totals in self.scan_totals.values()):
+            message += " (still scanning)"
+        self.status_changed.emit(message)
+
+    def record_throughput(self) -> None:
+        """Remember the throughput of an upload that ran long enough to be meaningful, for later estimates"""
+        elapsed: float = time.monotonic() - self.upload_started
+        if elapsed < 10 or self.bytes_sent < MB:
+            return
+        self.throughput = self.bytes_sent / elapsed
+        self.change_setting("ESTIMATED_THROUGHPUT_MBPS", round(self.throughput / MB, 2))
+
+    # < ======================================================================================================
+    # < Progress Methods
     # < ======================================================================================================
 
-    def open_folder_dialog(self) -> None:
-        """Open folder dialog to select folder and add to the table"""
+    def reset_progress(self, rows: list[list[str]]) -> None:
+        """Reset progress tracking for a new upload of the given table rows"""
+        self.row_for_path: dict[str, int] = {os.path.normpath(row[1]): index for index, row in enumerate(rows)}
+        self.row_totals: list[int | None] = [self.file_sizes.get(os.path.normpath(row[1])) if row[2] == 'File' else self.scanned_size(row[1]) for row in rows]
+        self.row_sent: list[int] = [0] * len(rows)
+        self.row_files: list[int] = [0] * len(rows)
+        self.row_failed: list[int] = [0] * len(rows)
+        self.file_sent: dict[str, int] = {}
+        self.bytes_sent: int = 0
+        self.upload_started: float = time.monotonic()
+        self.model.reset_progress("Waiting")
+
+    def row_for(self, filepath: str) -> int | None:
+        """Get the table row that filepath belongs to, either as a file row or inside a folder row"""
+        path: str = os.path.normpath(filepath)
+        while path not in self.row_for_path:
+            parent: str = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        return self.row_for_path[path]
+
+    def refresh_row(self, row: int) -> None:
+        """Redraw the progress cell of a row"""
+        total: int | None = self.row_totals[row]
+        if total:
+            text: str = f"{min(100, self.row_sent[row] * 100 // total)}%"
+        else:
+            text: str = f"{self.row_files[row]} files, {tools.format_bytes(self.row_sent[row])}"
+        if self.row_failed[row]:
+            text += f", {self.row_failed[row]} failed"
+        self.model.set_progress(row, text)
+
+    def on_file_progress(self, filepath: str, bytes_sent: int, total: int) -> None:
+        """Record bytes acknowledged for a file"""
+        delta: int = bytes_sent - self.file_sent.get(filepath, 0)
+        self.file_sent[filepath] = bytes_sent
+        self.bytes_sent += delta
+        row: int | None = self.row_for(filepath)
+        if row is not None:
+            self.row_sent[row] += delta
+            self.refresh_row(row)
+
+    def on_file_done(self, filepath: str, file_id: str) -> None:
+        """Record a completed file"""
+        self.file_sent.pop(filepath, None)
+        row: int | None = self.row_for(filepath)
+        if row is not None:
+            self.row_files[row] += 1
+            self.refresh_row(row)
+
+    def on_file_failed(self, filepath: str, error: str) -> None:
+        """Record a failed file"""
+        logging.info(f"Upload of {filepath} failed: {error}")
+        row: int | None = self.row_for(filepath)
+        if row is not None:
+            self.row_failed[row] += 1
+            self.refresh_row(row)
+
+    def update_status(self) -> None:
+        """Show overall throughput and, when every row has a known size, the estimated time remaining"""
+        if not self.is_uploading():
+            return
+        elapsed: float = max(time.monotonic() - self.upload_started, 1e-6)
+        rate: float = self.bytes_sent / elapsed
+        message: str = f"Uploaded {tools.format_bytes(self.bytes_sent)} at {tools.format_bytes(rate)}/s"
+        if rate > 0 and None not in self.row_totals:
+            remaining: int = max(0, sum(self.row_totals) - self.bytes_sent)
+            message += f", ETA {tools.format_duration(remaining / rate)}"
+        self.status_changed.emit(message)
+
+    # < ======================================================================================================
+
+    def open_folder_dialog(self, packed: bool = False) -> None:
+        """Open folder dialog to select folder and add to the table, optionally with small files packed into archives"""
 
         folder_path = QFileDialog.getExistingDirectory(self, "Select Folder")
         if folder_path:
-            self.add_files([folder_path])
+            self.add_files([folder_path], packed)
+
+    def open_packed_folder_dialog(self) -> None:
+        """Open folder dialog to select a folder whose small files will be packed into archives"""
+        self.open_folder_dialog(packed = True)
+
+    def toggle_packing(self) -> None:
+        """Switch the selected folder rows between uploading file by file and packing small files into archives"""
+        if self.is_uploading():
+            return
+        rows: set[int] = {index.row() for index in self.table.selectionModel().selectedIndexes()}
+        for row in rows:
+            if self.model.kind(row) == "Folder":
+                self.model.set_kind(row, "Packed Folder")
+            elif self.model.kind(row) == "Packed Folder":
+                self.model.set_kind(row, "Folder")
 
     def open_file_dialog(self) -> None:
         """Open file dialog to select files and add them to the table"""
@@ -286,30 +782,27 @@ class Table(QWidget):
         filenames, _ = output
         self.add_files(filenames)
 
-    def add_files(self, paths: list[str]) -> None:
-        """Add selected files or folders to the table, avoiding duplicates"""
-        existing_filenames = {self.table.item(row, 0).text() for row in range(self.table.rowCount())}
-        new_items = []
+    def add_files(self, paths: list[str], packed: bool = False) -> None:
+        """Add selected files or folders to the table once the scanner has told them apart, skipping paths already listed"""
+        self.scanner.inspect(paths, packed)
 
-        for path in paths:
-            if os.path.isdir(path):
-                new_items.append((os.path.basename(path), path, "Folder"))
-            else:
-                filename = os.path.basename(path)
-                if filename not in existing_filenames:
-                    new_items.append((filename, path, "File"))
-
-        if new_items:
-            current_row_count = self.table.rowCount()
-            self.table.setRowCount(current_row_count + len(new_items))
-            
-            for row, (filename, full_path, item_type) in enumerate(new_items):
-                self.table.setItem(current_row_count + row, 0, QTableWidgetItem(filename))
-                self.table.setItem(current_row_count + row, 1, QTableWidgetItem(full_path))
-                self.table.setItem(current_row_count + row, 2, QTableWidgetItem(item_type))
-
-            self.table.setColumnWidth(0, 200)
+    def on_paths_inspected(self, entries: list[tuple[str, bool, int]], packed: bool) -> None:
+        """Add inspected paths to the table, starting a scan of each new folder"""
+        folder_kind: str = "Packed Folder" if packed else "Folder"
+        sizes: dict[str, int] = {path: size for path, is_folder, size in entries}
+        added: list[tuple[str, str]] = self.model.add([(path, folder_kind if is_folder else "File") for path, is_folder, size in entries])
+        if added and self.model.rowCount() == len(added):
             self.table.resizeColumnToContents(1)
+        for path, kind in added:
+            if kind == "File":
+                self.file_sizes[os.path.normpath(path)] = sizes[path]
+                self.file_bytes += sizes[path]
+                self.file_count += 1
+            else:
+                self.scan_totals[os.path.normpath(path)] = (0, 0, 0, False)
+                self.scanner.scan(path)
+        if added:
+            self.show_estimate()
 
     def dragEnterEvent(self, event: QDragEnterEvent) -> None:
         """Handle drag enter event"""
@@ -390,6 +883,16 @@ class Window(QMainWindow):
         action.triggered.connect(self.table.open_folder_dialog)
         self.fileMenu.addAction(action)
 
+        action = QAction(icon, "Add Folder (&Packed)", self)
+        action.setStatusTip("Add a folder whose small files are uploaded packed into archives")
+        action.triggered.connect(self.table.open_packed_folder_dialog)
+        self.fileMenu.addAction(action)
+
+        action = QAction(icon, "&Toggle Packing", self)
+        action.setStatusTip("Switch the selected folders between file by file and packed uploads")
+        action.triggered.connect(self.table.toggle_packing)
+        self.fileMenu.addAction(action)
+
         self.fileMenu.addSeparator()
 
         action = QAction(icon, "&Upload", self)
@@ -399,6 +902,13 @@ class Window(QMainWindow):
 
         self.fileMenu.addSeparator()
 
+        action = QAction(icon, "&Cancel Upload", self)
+        action.setStatusTip("Stop the running upload without closing the application")
+        action.triggered.connect(self.table.cancel_upload)
+        self.fileMenu.addAction(action)
+
+        self.fileMenu.addSeparator()
+
         action = QAction(icon, "&Clear List", self)
         action.setStatusTip("Remove all files and folders from the list")
         action.triggered.connect(self.table.clear)
@@ -406,8 +916,8 @@ class Window(QMainWindow):
 
         self.fileMenu.addSeparator()
 
-        action = QAction(icon, "&Change Folder ID", self)
-        action.setStatusTip("Change the ID of the parent Google Drive folder")
+        action = QAction(icon, "&Change Folder IDs", self)
+        action.setStatusTip("Change the IDs of the Google Drive folders uploaded to, files upload to the first and are copied to the rest")
         action.triggered.connect(self.table.update_folder_id)
         self.fileMenu.addAction(action)
 
@@ -442,15 +952,36 @@ class Window(QMainWindow):
         message: str = "Drag and drop files or folders to add to list"
         self.statusBar().showMessage(message)
 
+        self.progress_label = QLabel()
+        self.statusBar().addPermanentWidget(self.progress_label)
+        self.table.status_changed.connect(self.progress_label.setText)
+
 # < ======================================================================================================
 # < Main Function
 # < ======================================================================================================
 
+def warm_up() -> None:
+    """Import the Google client modules and parse the discovery document in the background, ready for the first upload"""
+    try:
+        import uploader
+        from authenticator import discovery_document
+        discovery_document()
+    except Exception as e:
+        logging.info(f"An error occurred warming up the Google client: {e}")
+    else:
+        startup.mark("google client warmed up")
+
 def main():
-    """Main function"""
+    """Main function, run with --startup-report to print startup timings and exit once the window is up"""
+    startup.mark("qt imported")
     app = QApplication(sys.argv)
     window = Window()
     window.show()
+    startup.mark("window shown")
+    startup.check_budget("window shown", STARTUP_BUDGET_MS)
+    threading.Thread(target = warm_up, name = "warm-up", daemon = True).start()
+    if "--startup-report" in sys.argv:
+        QTimer.singleShot(0, lambda: (startup.mark("event loop running"), print(startup.report()), app.quit()))
     sys.exit(app.exec())
 
 # < ======================================================================================================
@@ -0,0 +1,284 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import json
+import logging
+import tarfile
+from typing import Callable
+from googleapiclient.http import MediaInMemoryUpload, MediaUpload
+from engine import UploadEngine, UploadListener
+from folders import FolderBatcher
+from journal import PENDING, Journal
+from resumable import round_chunk_size
+from uploader import UploadOptions, upload_file
+from walker import prefetch, walk
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+TAR_BLOCK: int = tarfile.BLOCKSIZE
+ARCHIVE_MIMETYPE: str = 'application/x-tar'
+INDEX_MIMETYPE: str = 'text/tab-separated-values'
+
+# < ======================================================================================================
+# < Archive Upload Class
+# < ======================================================================================================
+
+class ArchiveUpload(MediaUpload):
+
+    def __init__(self, members: list[tuple[str, str]], chunksize: int) -> None:
+        """Initialise a resumable upload whose content is a tar archive of members, given as (filepath, arcname)
+
+        The archive is generated as Drive asks for each chunk, so at most about one chunk plus one member is held in
+        memory and nothing is written to disk, bytes are dropped once a later chunk shows Drive has acknowledged them"""
+        self.members: list[tuple[str, str]] = members
+        self.next_member: int = 0
+        self._chunksize: int = round_chunk_size(chunksize)
+        self.buffer: bytearray = bytearray()
+        self.base: int = 0
+        self.finished: bool = False
+        self.archived: list[str] = []
+        self.tar: tarfile.TarFile = tarfile.open(fileobj = self, mode = 'w|', format = tarfile.PAX_FORMAT)
+
+    @classmethod
+    def from_json(cls, s: str) -> "ArchiveUpload":
+        """Rebuild an upload serialised by to_json, which generates the archive again from its first byte"""
+        data: dict = json.loads(s)
+        return cls([tuple(member) for member in data["members"]], data["chunksize"])
+
+    def write(self, data: bytes) -> int:
+        """Receive archive bytes from tarfile"""
+        self.buffer += data
+        return len(data)
+
+    def release(self, offset: int) -> None:
+        """Drop the generated bytes before offset"""
+        offset = min(offset, self.base + len(self.buffer))
+        if offset > self.base:
+            del self.buffer[:offset - self.base]
+            self.base = offset
+
+    def fill(self, end: int, start: int = 0) -> None:
+        """Generate archive bytes until the buffer reaches offset end or the archive is complete, dropping those before start"""
+        while self.base + len(self.buffer) < end and not self.finished:
+            self.release(start)
+            if self.next_member < len(self.members):
+                filepath, arcname = self.members[self.next_member]
+                self.next_member += 1
+                try:
+                    with open(filepath, 'rb') as f:
+                        self.tar.addfile(self.tar.gettarinfo(arcname = arcname, fileobj = f), f)
+                except OSError as e:
+                    logging.info(f"An error occurred adding {filepath} to archive: {e}. Skipping it")
+                    continue
+                self.archived.append(arcname)
+            else:
+                self.tar.close()
+                self.finished = True
+                if (self.base + len(self.buffer)) % self._chunksize == 0:
+                    # < A final chunk must be short for the upload to finish, zero blocks after the end of a tar are ignored
+                    self.buffer += bytes(TAR_BLOCK)
+
+    def chunksize(self) -> int:
+        return self._chunksize
+
+    def mimetype(self) -> str:
+        return ARCHIVE_MIMETYPE
+
+    def size(self) -> None:
+        return None # < Unknown until generated, the upload finishes on the first short chunk
+
+    def resumable(self) -> bool:
+        return True
+
+    def has_stream(self) -> bool:
+        return False
+
+    def getbytes(self, begin: int, length: int) -> bytes:
+        """Get archive bytes from offset begin, generating one byte ahead so a full final chunk is never returned"""
+        if begin < self.base:
+            raise ValueError(f"Archive bytes from {begin} were requested after being released at {self.base}")
+        self.fill(begin + length + 1, begin)
+        self.release(begin)
+        return bytes(self.buffer[:length])
+
+    def to_json(self) -> str:
+        """Serialise the upload as its members and chunk size, from_json generates the same archive from them while the
+        files are unchanged. googleapiclient's MediaUpload.new_from_json only rebuilds its own classes, so restore it with
+        ArchiveUpload.from_json"""
+        return json.dumps({"_class": type(self).__name__, "_module": type(self).__module__, "members": self.members, "chunksize": self._chunksize})
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def archive_size(size: int) -> int:
+    """Estimate the bytes a file of the given size takes up inside a tar archive"""
+    return TAR_BLOCK + -(-size // TAR_BLOCK) * TAR_BLOCK
+
+def upload_archive(members: list[tuple[str, str]], archive_path: str, drive_service: any, folder_id: str, estimated_size: int, options: UploadOptions = None, listener: UploadListener = None) -> str:
+    """Stream members into a tar archive uploaded to folder_id, archive_path names it and is what the listener sees"""
+
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+    listener.check_cancelled()
+
+    logging.info(f"Uploading archive of {len(members)} files: {archive_path}")
+
+    media: ArchiveUpload = ArchiveUpload(members, options.chunk_size)
+    file_metadata: dict = {'name': os.path.basename(archive_path), 'parents': [folder_id]}
+    request = drive_service.files().create(body = file_metadata, media_body = media, fields = 'id')
+    listener.file_started(archive_path, estimated_size)
+
+    try:
+        response: dict | None = None
+        attempt: int = 0
+        while response is None:
+            try:
+                status, response = request.next_chunk()
+            except Exception as e:
+                if not options.rate_limiter.retry(e, attempt):
+                    raise
+                attempt += 1
+                request._in_error_state = True # < Resumes from the last byte Drive committed, which the archive still holds
+                continue
+            attempt = 0
+            listener.file_progress(archive_path, min(request.resumable_progress, estimated_size), estimated_size)
+            if response is None:
+                listener.check_cancelled()
+    except Exception as e:
+        listener.file_failed(archive_path, e)
+        raise
+
+    listener.file_progress(archive_path, estimated_size, estimated_size)
+    listener.file_done(archive_path, response['id'])
+    logging.info(f"Uploaded archive {archive_path} holding {len(media.archived)} of {len(members)} files")
+    return response['id']
+
+def upload_index(lines: list[str], index_path: str, drive_service: any, folder_id: str, listener: UploadListener = None, file_id: str = None) -> str:
+    """Upload the index recording which archive holds each packed file, replacing the content of file_id if given"""
+    listener = listener or UploadListener()
+    content: bytes = "".join(lines).encode('utf-8')
+    media: MediaInMemoryUpload = MediaInMemoryUpload(content, mimetype = INDEX_MIMETYPE)
+    listener.file_started(index_path, len(content))
+    if file_id is not None:
+        file: dict = drive_service.files().update(fileId = file_id, media_body = media, fields = 'id').execute()
+    else:
+        file_metadata: dict = {'name': os.path.basename(index_path), 'parents': [folder_id]}
+        file: dict = drive_service.files().create(body = file_metadata, media_body = media, fields = 'id').execute()
+    listener.file_progress(index_path, len(content), len(content))
+    listener.file_done(index_path, file['id'])
+    return file['id']
+
+def upload_packed_folders(local_folder_paths: list[str], drive_service: any, folder_id: str = None, engine: UploadEngine = None, options: UploadOptions = None, listener: UploadListener = None, journal: Journal = None) -> None:
+    """Upload given folders with files below options.pack_threshold packed into tar archives of about options.pack_target bytes
+
+    Each folder gets a remote folder holding its numbered archives and an index of 'path<TAB>archive' lines, larger
+    files are uploaded individually keeping their relative path, creating only the remote folders they need.
+    Entries are planned in sorted order and the files planned into each archive are journalled, so when a job resumes,
+    files inside an archive it already uploaded are skipped by name, whichever archive they were in, and everything
+    else is packed into new archives numbered after the earlier ones, with the index updated in place to cover both.
+    Large files and folders journal records as already uploaded are reused and skipped"""
+
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+    journal = journal or Journal()
+
+    def schedule(filepath: str, size: int, function: Callable, *args, redo: bool = False, **kwargs) -> None:
+        if journal.is_done(filepath) and not redo:
+            return
+        journal.record(filepath, PENDING)
+        if engine is not None:
+            engine.submit(function, *args, size = size, **kwargs)
+        else:
+            function(*args, drive_service = drive_service, **kwargs)
+
+    batcher: FolderBatcher = FolderBatcher(drive_service, max_waiting = options.queue_size, limiter = options.rate_limiter)
+
+    for local_folder_path in local_folder_paths:
+
+        logging.info(f"Uploading packed folder: {local_folder_path}")
+
+        folder_name: str = os.path.basename(local_folder_path)
+        root_id: str = journal.add_folder(batcher, local_folder_path, folder_id)
+        folder_ids: dict[str, str] = {local_folder_path: root_id}
+        index_lines: list[str] = []
+        members: list[tuple[str, str]] = []
+        pending_size: int = 0
+        archive_count: int = 0
+        planned: int = 0
+        archived: set[str] = set() # < Files a previous run of this job already uploaded inside one of its archives
+
+        archive_prefix: str = os.path.join(local_folder_path, f"{folder_name}.part")
+        for archive_path, arcnames in journal.archives.items():
+            if archive_path.startswith(archive_prefix):
+                archive_count += 1
+                if journal.is_done(archive_path):
+                    archived.update(arcnames)
+                    index_lines.extend(f"{arcname}\t{os.path.basename(archive_path)}\n" for arcname in arcnames)
+
+        def ensure_folder(local_path: str) -> str:
+            if local_path not in folder_ids:
+                parent_id: str = ensure_folder(os.path.dirname(local_path))
+                folder_ids[local_path] = journal.add_folder(batcher, local_path, parent_id)
+            return folder_ids[local_path]
+
+        def flush_archive() -> None:
+            nonlocal members, pending_size, archive_count, planned
+            if not members:
+                return
+            archive_count += 1
+            planned += 1
+            archive_name: str = f"{folder_name}.part{archive_count:04d}.tar"
+            index_lines.extend(f"{arcname}\t{archive_name}\n" for _, arcname in members)
+            archive_path: str = os.path.join(local_folder_path, archive_name)
+            journal.record_archive(archive_path, [arcname for _, arcname in members])
+            batcher.when_created(root_id, lambda members = members, archive_path = archive_path, estimated_size = pending_size: schedule(archive_path, estimated_size, upload_archive, members, archive_path, folder_id = root_id, estimated_size = estimated_size, options = options, listener = listener))
+            members, pending_size = [], 0
+
+        for parent_path, entry in prefetch(walk([local_folder_path], options.ignore_rules, options.ignore_files, ordered = True), options.queue_size):
+
+            listener.check_cancelled()
+
+            if entry.is_dir():
+                continue
+
+            size: int = entry.stat().st_size
+
+            if size < options.pack_threshold:
+                arcname: str = os.path.relpath(entry.path, local_folder_path).replace(os.sep, "/")
+                if arcname in archived:
+                    continue
+                members.append((entry.path, arcname))
+                pending_size += archive_size(size)
+                if pending_size >= options.pack_target:
+                    flush_archive()
+            else:
+                if journal.is_done(entry.path):
+                    continue
+                parent_folder_id: str = ensure_folder(parent_path)
+                options.prefetch_hash(entry.path)
+                batcher.when_created(parent_folder_id, lambda filepath = entry.path, size = size, parent_folder_id = parent_folder_id: schedule(filepath, size, upload_file, filepath, folder_id = parent_folder_id, options = options, listener = listener))
+
+        flush_archive()
+
+        index_path: str = os.path.join(local_folder_path, f"{folder_name}.index.tsv")
+        if index_lines and (planned or not journal.is_done(index_path)):
+            # < An index uploaded before the job was interrupted is brought up to date with the archives added since
+            batcher.when_created(root_id, lambda lines = index_lines, index_path = index_path, file_id = journal.file_id(index_path): schedule(index_path, 0, upload_index, lines, index_path, redo = True, folder_id = root_id, listener = listener, file_id = file_id))
+
+        logging.info(f"Planned {planned} archive(s) holding {len(index_lines) - len(archived)} packed files for {local_folder_path}, {len(archived)} already uploaded")
+
+    batcher.flush()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,276 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import time
+import random
+import logging
+import threading
+import tracing
+from googleapiclient.errors import HttpError
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+RETRY_STATUSES: tuple[int, ...] = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS: tuple[str, ...] = ("userRateLimitExceeded", "rateLimitExceeded")
+TRANSIENT_ERRORS: tuple[type[Exception], ...] = (ConnectionError, TimeoutError)
+BATCH_PART: str = "application/http" # < Content type of each call inside a batch request body
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def decode(content: bytes | str | None) -> str:
+    """Get response content as text for inspection"""
+    if isinstance(content, bytes):
+        return content.decode("utf-8", errors = "replace")
+    return content or ""
+
+def is_rate_limited(status: int, content: bytes | str | None) -> bool:
+    """Check whether a response means the per-user request quota has been exceeded"""
+    if status == 429:
+        return True
+    return status == 403 and any(reason in decode(content) for reason in RATE_LIMIT_REASONS)
+
+def is_retryable(status: int, content: bytes | str | None) -> bool:
+    """Check whether a response is a transient failure worth sending again after a backoff"""
+    return status in RETRY_STATUSES or is_rate_limited(status, content)
+
+def request_name(method: str, uri: str) -> str:
+    """Get a short name for a request to use in traces, such as 'POST upload', leaving out IDs and the query"""
+    path: str = uri.split("?")[0]
+    if "/batch/" in path:
+        return f"{method} batch"
+    if "/upload/" in path:
+        return f"{method} upload"
+    if path.endswith(("/copy", "/generateIds")):
+        return f"{method} {path.rsplit('/', 1)[-1]}"
+    return f"{method} files"
+
+def body_size(body: bytes | str | None, headers: dict | None) -> int:
+    """Get the number of bytes a request will send, from its content-length header for streamed bodies"""
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    for name, value in (headers or {}).items():
+        if name.lower() == "content-length":
+            return int(value)
+    return 0
+
+# < ======================================================================================================
+# < Rate Limiter Class
+# < ======================================================================================================
+
+class RateLimiter:
+
+    def __init__(self, rate: float = 20.0, burst: int = 40, max_concurrency: int = 8, retries: int = 8, base_delay: float = 1.0, max_delay: float = 64.0, bandwidth: "BandwidthLimiter" = None) -> None:
+        """Initialise a limiter shared by every Drive call in the process
+
+        A token bucket refilling at rate requests per second, holding at most burst, caps the request rate below the
+        per-user quota. The number of calls in flight is capped by a limit that grows by one per limit successful calls
+        and halves on every quota error (AIMD), and a quota error pauses every caller for an exponential backoff with
+        full jitter, so all workers settle at the highest rate Drive sustains rather than failing or hammering it.
+        Request bodies are also paced through bandwidth, if one is given"""
+        self.rate: float = max(0.001, rate)
+        self.burst: int = max(1, burst)
+        self.max_concurrency: int = max(1, max_concurrency)
+        self.retries: int = retries
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.condition: threading.Condition = threading.Condition()
+        self.tokens: float = float(self.burst)
+        self.updated: float = time.monotonic()
+        self.limit: float = float(self.max_concurrency)
+        self.in_flight: int = 0
+        self.paused_until: float = 0.0
+        self.throttled_count: int = 0
+        self.bandwidth: BandwidthLimiter | None = bandwidth
+
+    def refill(self, now: float) -> None:
+        """Add the tokens earned since the last refill"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cost: int = 1) -> None:
+        """Wait for a concurrency slot and cost tokens, blocking while a quota backoff is in effect
+
+        A cost above burst is let through once the bucket is full, leaving it in debt for the excess"""
+        with self.condition:
+            while True:
+                now: float = time.monotonic()
+                self.refill(now)
+                if now < self.paused_until:
+                    self.condition.wait(self.paused_until - now)
+                elif self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                elif self.tokens < min(cost, self.burst):
+                    self.condition.wait((min(cost, self.burst) - self.tokens) / self.rate)
+                else:
+                    self.tokens -= cost
+                    self.in_flight += 1
+                    return
+
+    def reserve(self, cost: int = 1) -> float:
+        """Take cost tokens without blocking, returning 0 once taken or else the seconds to wait before trying again
+
+        For callers that must not block a thread, such as the asyncio engine, which bound concurrency themselves"""
+        with self.condition:
+            now: float = time.monotonic()
+            self.refill(now)
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.tokens < min(cost, self.burst):
+                return (min(cost, self.burst) - self.tokens) / self.rate
+            self.tokens -= cost
+            return 0.0
+
+    def release(self, throttled: bool = False) -> None:
+        """Return a concurrency slot, shrinking the limit if the call hit the quota and growing it otherwise"""
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled_count += 1
+                self.limit = max(1.0, self.limit / 2)
+                logging.info(f"Drive quota exceeded, concurrent requests limited to {int(self.limit)}")
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def backoff(self, attempt: int, throttled: bool = False) -> float:
+        """Get a jittered exponential delay for a retry, pausing every caller for it when the quota was exceeded"""
+        delay: float = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if throttled:
+            with self.condition:
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def retry(self, error: Exception, attempt: int) -> bool:
+        """Sleep out the backoff and return True if a call that raised error should be made again"""
+
+        if attempt >= self.retries:
+            return False
+
+        if isinstance(error, HttpError):
+            if not is_retryable(error.resp.status, error.content):
+                return False
+            throttled: bool = is_rate_limited(error.resp.status, error.content)
+        elif isinstance(error, TRANSIENT_ERRORS):
+            throttled = False
+        else:
+            return False
+
+        delay: float = self.backoff(attempt, throttled)
+        logging.info(f"Retrying Drive call in {delay:.1f}s after attempt {attempt + 1} failed: {error}")
+        with tracing.span("backoff", "retry", attempt = attempt + 1, throttled = throttled, cause = str(error)[:200]):
+            time.sleep(delay)
+        return True
+
+# < ======================================================================================================
+# < Bandwidth Limiter Class
+# < ======================================================================================================
+
+class BandwidthLimiter:
+
+    def __init__(self, bytes_per_second: int, hours: tuple[int, int] | None = None) -> None:
+        """Initialise a cap of bytes_per_second on upload bandwidth shared by every worker, applying only between the
+        local hours given as (start, end), such as (9, 17), or always when hours is None
+
+        A token bucket holding one second of bandwidth is drawn on before each request is sent, a body larger than
+        that is let through and leaves the bucket in debt, so the average rate holds at any chunk size"""
+        self.bytes_per_second: float = max(1.0, float(bytes_per_second))
+        self.hours: tuple[int, int] | None = hours
+        self.lock: threading.Lock = threading.Lock()
+        self.tokens: float = self.bytes_per_second
+        self.updated: float = time.monotonic()
+
+    def active(self) -> bool:
+        """Check whether the cap applies at the current local time, hours may wrap past midnight such as (22, 6)"""
+        if self.hours is None:
+            return True
+        start, end = self.hours
+        hour: int = time.localtime().tm_hour
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def consume(self, size: int) -> None:
+        """Wait until size more bytes may be sent"""
+        if size <= 0 or not self.active():
+            return
+        with self.lock:
+            now: float = time.monotonic()
+            self.tokens = min(self.bytes_per_second, self.tokens + (now - self.updated) * self.bytes_per_second)
+            self.updated = now
+            self.tokens -= size
+            delay: float = -self.tokens / self.bytes_per_second
+        if delay > 0:
+            time.sleep(delay) # < Outside the lock, the next caller already sees the debt and waits behind this one
+
+# < ======================================================================================================
+# < Rate Limited Http Class
+# < ======================================================================================================
+
+class RateLimitedHttp:
+
+    def __init__(self, http: any, limiter: RateLimiter) -> None:
+        """Wrap an authorised http object so every request made through it passes through limiter
+
+        Requests whose body can be sent again are retried here on transient failures, chunks of a resumable upload
+        session are not, as the caller must first ask Drive how much of the chunk it committed"""
+        self.http: any = http
+        self.limiter: RateLimiter = limiter
+
+    def __getattr__(self, name: str) -> any:
+        return getattr(self.http, name) # < Keeps credentials, timeout and the like visible to googleapiclient
+
+    def request(self, uri: str, method: str = "GET", body: bytes | str | None = None, headers: dict | None = None, **kwargs) -> tuple:
+        """Send a request once the limiter allows it, counting each call inside a batch against the rate"""
+
+        batch: bool = "/batch/" in uri
+        cost: int = max(1, decode(body).count(BATCH_PART)) if batch else 1
+        replayable: bool = (body is None or isinstance(body, (bytes, str))) and "upload_id=" not in uri
+        attempt: int = 0
+
+        while True:
+
+            waiting: float = time.perf_counter()
+            if self.limiter.bandwidth is not None:
+                self.limiter.bandwidth.consume(body_size(body, headers))
+                tracing.wait("bandwidth cap", "bandwidth", waiting)
+                waiting = time.perf_counter()
+
+            self.limiter.acquire(cost)
+            tracing.wait("rate limit", "throttle", waiting, cost = cost)
+
+            try:
+                with tracing.span(request_name(method, uri), "request", bytes = body_size(body, headers), attempt = attempt + 1) as span:
+                    response, content = self.http.request(uri, method, body = body, headers = headers, **kwargs)
+                    span.set(status = response.status)
+            except TRANSIENT_ERRORS as e:
+                self.limiter.release()
+                if not replayable or not self.limiter.retry(e, attempt):
+                    raise
+                attempt += 1
+                continue
+
+            throttled: bool = is_rate_limited(response.status, content)
+            if batch and response.status == 200:
+                throttled = any(reason in decode(content) for reason in RATE_LIMIT_REASONS)
+            self.limiter.release(throttled)
+
+            if not replayable or not is_retryable(response.status, content) or attempt >= self.limiter.retries:
+                return response, content
+
+            delay: float = self.limiter.backoff(attempt, throttled)
+            logging.info(f"Retrying {method} request in {delay:.1f}s after status {response.status}")
+            with tracing.span("backoff", "retry", attempt = attempt + 1, throttled = throttled, cause = f"status {response.status}"):
+                time.sleep(delay)
+            attempt += 1
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
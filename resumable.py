@@ -0,0 +1,175 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import json
+import hashlib
+import logging
+import time
+import threading
+from typing import Callable
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+from ratelimit import RateLimiter
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+CHUNK_MULTIPLE: int = 256 * 1024 # < Drive requires every chunk but the last to be a multiple of 256 KiB
+EXPIRED_STATUSES: tuple[int, ...] = (404, 410) # < Statuses returned for a session URI Drive no longer knows
+SESSION_LIFETIME: float = 7 * 24 * 3600 # < Drive forgets a resumable session URI a week after it was created
+
+# < ======================================================================================================
+# < Session Store Class
+# < ======================================================================================================
+
+class SessionStore:
+
+    def __init__(self, directory: str | None) -> None:
+        """Initialise a store that keeps one json file per in-progress resumable upload inside directory
+
+        Sessions are keyed on the file and the folder or file ID it uploads into, so one is only resumed by a later
+        run uploading into the same folders. A store without a directory saves nothing, for uploads that never do"""
+        self.directory: str | None = directory
+        self.lock: threading.Lock = threading.Lock()
+
+    def key(self, filepath: str, target_id: str | None) -> str:
+        """Get a key identifying this exact version of filepath being uploaded into, or over, target_id"""
+        stat: os.stat_result = os.stat(filepath)
+        identity: str = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}|{target_id}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Get the path of the json file for a given key"""
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> dict | None:
+        """Load saved session state for key, or None if there is none"""
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key: str, state: dict) -> None:
+        """Atomically save session state for key so a crash never leaves a half-written file"""
+        if self.directory is None:
+            return
+        with self.lock:
+            os.makedirs(self.directory, exist_ok = True)
+        path: str = self.path(key)
+        temporary_path: str = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, path)
+
+    def discard(self, key: str) -> None:
+        """Remove saved session state for key"""
+        if self.directory is None:
+            return
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def prune(self, max_age: float = SESSION_LIFETIME) -> int:
+        """Remove saved sessions, and temporary files left by a crash mid-save, not written for max_age seconds,
+        returning how many were removed"""
+        if self.directory is None:
+            return 0
+        removed: int = 0
+        cutoff: float = time.time() - max_age
+        try:
+            with os.scandir(self.directory) as iterator:
+                entries: list[os.DirEntry] = [entry for entry in iterator if entry.name.endswith((".json", ".tmp"))]
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError as e:
+                logging.info(f"An error occurred removing expired upload session {entry.path}: {e}")
+        if removed:
+            logging.info(f"Removed {removed} expired upload session(s) from {self.directory}")
+        return removed
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def round_chunk_size(chunk_size: int) -> int:
+    """Round chunk_size down to a multiple of 256 KiB, with 256 KiB as the minimum"""
+    return max(CHUNK_MULTIPLE, chunk_size - chunk_size % CHUNK_MULTIPLE)
+
+def upload_file_resumable(filepath: str, drive_service: any, file_metadata: dict, mimetype: str | None, chunk_size: int, store: SessionStore, folder_id: str = None, progress_callback: Callable[[int, int], None] = None, file_id: str = None, limiter: RateLimiter = None, fields: str = 'id') -> dict:
+    """Upload filepath in chunks through a Drive resumable session, resuming a saved session for the same file if one exists
+
+    The upload creates a new file from file_metadata, or replaces the content of file_id in place when it is given.
+    A chunk failing with a transient error is retried through limiter, after asking Drive what it committed.
+    Returns the fields of the uploaded file asked for by fields"""
+
+    key: str = store.key(filepath, file_id or folder_id)
+    total: int = os.path.getsize(filepath)
+    state: dict | None = store.load(key)
+
+    while True:
+
+        media = MediaFileUpload(filepath, mimetype = mimetype, chunksize = round_chunk_size(chunk_size), resumable = True)
+        if file_id is None:
+            request = drive_service.files().create(body = file_metadata, media_body = media, fields = fields)
+        else:
+            request = drive_service.files().update(fileId = file_id, media_body = media, fields = fields)
+
+        if state is not None:
+            logging.info(f"Resuming upload of {filepath} from byte {state['offset']} of {total}")
+            request.resumable_uri = state["uri"]
+            request.resumable_progress = state["offset"]
+            request._in_error_state = True # < Makes the first chunk ask Drive for the last byte it actually committed
+
+        response: dict | None = None
+        attempt: int = 0
+
+        try:
+            while response is None:
+                try:
+                    status, response = request.next_chunk()
+                except Exception as e:
+                    if limiter is None or not limiter.retry(e, attempt):
+                        raise
+                    attempt += 1
+                    request._in_error_state = True
+                    continue
+                attempt = 0
+                if response is None:
+                    store.save(key, {"uri": request.resumable_uri, "offset": request.resumable_progress, "filepath": filepath})
+                    if progress_callback is not None:
+                        progress_callback(request.resumable_progress, total)
+        except HttpError as e:
+            if state is not None and e.resp.status in EXPIRED_STATUSES:
+                logging.info(f"Saved upload session for {filepath} has expired, restarting from byte 0")
+                store.discard(key)
+                state = None
+                continue
+            raise
+
+        store.discard(key)
+        if progress_callback is not None:
+            progress_callback(total, total)
+        return response
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
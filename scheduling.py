@@ -0,0 +1,120 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import heapq
+import logging
+import itertools
+from collections import deque
+
+# < ======================================================================================================
+# < Scheduling Policy Classes
+# < ======================================================================================================
+
+class SchedulingPolicy:
+    """Orders queued uploads for the UploadEngine, first in first out, subclasses override push and pop
+
+    Ordering is best effort, a policy only sees the uploads already queued, at most the engine's queue_size, as the
+    folder scan runs just ahead of the uploads, never the whole job. The engine only ever calls these methods while
+    holding its own lock"""
+
+    def __init__(self) -> None:
+        self.queue: deque[tuple[object, int]] = deque()
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def push(self, task: object, size: int) -> None:
+        """Queue a task that will send about size bytes"""
+        self.queue.append((task, size))
+
+    def pop(self) -> tuple[object, int]:
+        """Take the task to run next, with its size"""
+        return self.queue.popleft()
+
+    def done(self, size: int) -> None:
+        """Called when a task of the given size has finished"""
+
+class LargestFirst(SchedulingPolicy):
+    """Runs the largest queued upload next, so big files start early and the job ends as soon as possible"""
+
+    def __init__(self) -> None:
+        self.heap: list[tuple[int, int, object]] = []
+        self.counter: itertools.count = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, task: object, size: int) -> None:
+        heapq.heappush(self.heap, (-size, next(self.counter), task))
+
+    def pop(self) -> tuple[object, int]:
+        size, _, task = heapq.heappop(self.heap)
+        return task, -size
+
+class SmallestFirst(LargestFirst):
+    """Runs the smallest queued upload next, so the count of finished files climbs as fast as possible"""
+
+    def push(self, task: object, size: int) -> None:
+        heapq.heappush(self.heap, (size, next(self.counter), task))
+
+    def pop(self) -> tuple[object, int]:
+        size, _, task = heapq.heappop(self.heap)
+        return task, size
+
+class Interleaved(SchedulingPolicy):
+
+    def __init__(self, large_slots: int, threshold: int) -> None:
+        """Keep up to large_slots uploads of at least threshold bytes running, largest first, with small ones in order
+
+        Large uploads are limited by bandwidth and small ones by request latency, so running both kinds together
+        keeps the link busy while the file count still climbs, and no large file waits behind every small one"""
+        self.large: LargestFirst = LargestFirst()
+        self.small: SchedulingPolicy = SchedulingPolicy()
+        self.large_slots: int = max(1, large_slots)
+        self.threshold: int = threshold
+        self.large_running: int = 0
+
+    def __len__(self) -> int:
+        return len(self.large) + len(self.small)
+
+    def push(self, task: object, size: int) -> None:
+        (self.large if size >= self.threshold else self.small).push(task, size)
+
+    def pop(self) -> tuple[object, int]:
+        if self.large and (self.large_running < self.large_slots or not self.small):
+            self.large_running += 1
+            return self.large.pop()
+        return self.small.pop()
+
+    def done(self, size: int) -> None:
+        if size >= self.threshold:
+            self.large_running -= 1
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+POLICIES: tuple[str, ...] = ("fifo", "largest", "smallest", "interleaved")
+
+def make_policy(name: str, workers: int = 1, threshold: int = 0) -> SchedulingPolicy:
+    """Get the scheduling policy called name, one of POLICIES, interleaved gives half the workers to files of at least threshold bytes"""
+    name = (name or "fifo").lower()
+    if name == "largest":
+        return LargestFirst()
+    if name == "smallest":
+        return SmallestFirst()
+    if name == "interleaved":
+        return Interleaved(max(1, workers // 2), threshold)
+    if name != "fifo":
+        logging.info(f"Unknown scheduling policy '{name}', using fifo")
+    return SchedulingPolicy()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
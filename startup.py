@@ -0,0 +1,47 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import time
+import logging
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+START: float = time.perf_counter() # < Taken when this module is first imported, which should be as early as possible
+
+marks: dict[str, float] = {}
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def mark(label: str) -> float:
+    """Record the seconds since startup at which label was first reached, returning the recorded time"""
+    if label not in marks:
+        marks[label] = time.perf_counter() - START
+        logging.info(f"Startup: {label} after {marks[label] * 1000:.0f} ms")
+    return marks[label]
+
+def report() -> str:
+    """Get every recorded mark in the order reached, one 'label: milliseconds' line each"""
+    return "\n".join(f"{label}: {seconds * 1000:.0f} ms" for label, seconds in sorted(marks.items(), key = lambda item: item[1]))
+
+def check_budget(label: str, budget_ms: float) -> bool:
+    """Check label was reached within budget_ms of startup, logging a warning if it was not or was never reached"""
+    seconds: float | None = marks.get(label)
+    if seconds is None or seconds * 1000 > budget_ms:
+        reached: str = "never reached" if seconds is None else f"reached after {seconds * 1000:.0f} ms"
+        logging.warning(f"Startup budget of {budget_ms:.0f} ms for {label} exceeded, {reached}")
+        return False
+    return True
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,196 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import json
+import logging
+import threading
+from typing import Callable
+from engine import UploadEngine, UploadListener
+from folderindex import FolderIndex, list_tree
+from folders import FOLDER_MIMETYPE, FolderBatcher
+from uploader import UploadOptions, create_folder, upload_file
+from walker import prefetch, walk
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+LIST_FIELDS: str = 'nextPageToken, files(id, name, parents, mimeType, md5Checksum)'
+
+# < ======================================================================================================
+# < Manifest Class
+# < ======================================================================================================
+
+class Manifest:
+
+    def __init__(self, path: str, folder_id: str) -> None:
+        """Load the manifest at path, starting empty if it is missing or was written for a different remote folder"""
+        self.path: str = path
+        self.folder_id: str = folder_id
+        self.files: dict[str, dict] = {}
+        self.lock: threading.Lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                data: dict = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("folder_id") == folder_id:
+            self.files = data.get("files", {})
+        else:
+            logging.info(f"Manifest {path} belongs to a different remote folder, starting a new one")
+
+    def get(self, relative_path: str) -> dict | None:
+        """Get the entry for a remote relative path"""
+        with self.lock:
+            return self.files.get(relative_path)
+
+    def record(self, relative_path: str, filepath: str, stat: os.stat_result, md5: str | None, file_id: str) -> None:
+        """Record the local file state last known to match file_id on Drive"""
+        entry: dict = {"path": filepath, "size": stat.st_size, "mtime": stat.st_mtime_ns, "md5": md5, "id": file_id}
+        with self.lock:
+            self.files[relative_path] = entry
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk"""
+        with self.lock:
+            data: dict = {"folder_id": self.folder_id, "files": dict(self.files)}
+        temporary_path: str = f"{self.path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temporary_path, self.path)
+        logging.info(f"Manifest saved to {self.path} with {len(data['files'])} entries")
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def escape_query(value: str) -> str:
+    """Escape a value for use inside a quoted Drive query string"""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+def find_or_create_folder(folder_name: str, drive_service: any, parent_folder_id: str = None) -> str:
+    """Get the ID of the folder called folder_name inside parent_folder_id, creating it if it does not exist"""
+    query: str = f"name = '{escape_query(folder_name)}' and mimeType = '{FOLDER_MIMETYPE}' and trashed = false"
+    if parent_folder_id is not None:
+        query += f" and '{parent_folder_id}' in parents"
+    response: dict = drive_service.files().list(q = query, fields = 'files(id)', pageSize = 1).execute()
+    files: list[dict] = response.get('files', [])
+    if files:
+        return files[0]['id']
+    return create_folder(folder_name, drive_service, parent_folder_id)
+
+def is_unchanged(entry: dict | None, remote: dict, stat: os.stat_result) -> bool:
+    """Check whether a manifest entry shows the local file untouched since it last matched remote, without hashing it"""
+    return entry is not None and entry["id"] == remote['id'] and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns and entry["md5"] in (None, remote.get('md5Checksum'))
+
+def sync_file(filepath: str, relative_path: str, drive_service: any, folder_id: str, remote: dict | None, manifest: Manifest, options: UploadOptions = None, listener: UploadListener = None) -> str | None:
+    """Upload filepath if it is new or differs from its remote copy, returning the file ID or None if it was unchanged"""
+
+    options = options or UploadOptions()
+    stat: os.stat_result = os.stat(filepath)
+    entry: dict | None = manifest.get(relative_path)
+
+    if remote is None:
+        file_id: str = upload_file(filepath, drive_service, folder_id, options, listener)
+        manifest.record(relative_path, filepath, stat, None, file_id)
+        return file_id
+
+    remote_md5: str | None = remote.get('md5Checksum')
+
+    if is_unchanged(entry, remote, stat):
+        # < Local file is untouched since it was last synced and nobody has replaced the remote copy, no hashing needed
+        manifest.record(relative_path, filepath, stat, remote_md5, remote['id'])
+        return None
+
+    md5: str = options.hash_cache.md5(filepath)
+    if md5 == remote_md5:
+        manifest.record(relative_path, filepath, stat, md5, remote['id'])
+        return None
+
+    logging.info(f"Updating changed file in place: {filepath}")
+    file_id: str = upload_file(filepath, drive_service, folder_id, options, listener, remote['id'])
+    manifest.record(relative_path, filepath, stat, md5, file_id)
+    return file_id
+
+def sync_mixed(drive_service: any, filepaths: list[str], folderpaths: list[str], folder_id: str = None, options: UploadOptions = None, service_factory: Callable[[], any] = None, listener: UploadListener = None) -> None:
+    """Mirror the given local filepaths and folderpaths into a stable folder within folder_id, uploading only new or changed files
+
+    The stable folder is options.sync_folder_name, unchanged files are detected using the manifest at options.manifest_path
+    and the md5Checksum of each remote file, and changed files are replaced in place with files().update.
+    The remote folders listed and created are kept in the folder index at options.folder_index_path"""
+
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+
+    target_id: str = find_or_create_folder(options.sync_folder_name, drive_service, folder_id)
+    remote_tree: dict[str, dict] = list_tree(drive_service, target_id, LIST_FIELDS)
+    index: FolderIndex = FolderIndex(options.folder_index_path, folder_id)
+    index.record(options.sync_folder_name, target_id)
+    index.replace(options.sync_folder_name, {path: file['id'] for path, file in remote_tree.items() if file['mimeType'] == FOLDER_MIMETYPE})
+    manifest: Manifest = Manifest(options.manifest_path, target_id)
+    batcher: FolderBatcher = FolderBatcher(drive_service, max_waiting = options.queue_size, limiter = options.rate_limiter)
+    engine: UploadEngine | None = None if service_factory is None else UploadEngine(service_factory, options.workers, options.queue_size, options.make_policy())
+
+    def schedule(filepath: str, relative_path: str, parent_folder_id: str, size: int = 0) -> None:
+        remote: dict | None = remote_tree.get(relative_path)
+        if remote is not None and remote['mimeType'] == FOLDER_MIMETYPE:
+            logging.info(f"Skipping {filepath} as a remote folder exists at {relative_path}")
+        elif engine is not None:
+            try:
+                skipped: bool = remote is not None and is_unchanged(manifest.get(relative_path), remote, os.stat(filepath))
+            except OSError:
+                skipped = True # < Gone already, sync_file reports it
+            if not skipped:
+                options.prefetch_hash(filepath) # < Files sync_file will skip unhashed are not worth hashing
+            engine.submit(sync_file, filepath, relative_path, folder_id = parent_folder_id, remote = remote, manifest = manifest, options = options, listener = listener, size = size)
+        else:
+            sync_file(filepath, relative_path, drive_service, parent_folder_id, remote, manifest, options, listener)
+
+    def resolve_folder(relative_path: str) -> str:
+        return index.resolve(f"{options.sync_folder_name}/{relative_path}", drive_service, batcher)
+
+    try:
+
+        folders: dict[str, tuple[str, str]] = {}
+
+        for local_folder_path in folderpaths:
+            folder_name: str = os.path.basename(local_folder_path)
+            folders[local_folder_path] = (folder_name, resolve_folder(folder_name))
+
+        for filepath in filepaths:
+            schedule(filepath, os.path.basename(filepath), target_id)
+
+        for parent_path, entry in prefetch(walk(folderpaths, options.ignore_rules, options.ignore_files), options.queue_size):
+
+            listener.check_cancelled()
+            relative_folder, parent_folder_id = folders[parent_path]
+            relative_path: str = f"{relative_folder}/{entry.name}"
+
+            if entry.is_dir():
+                folders[entry.path] = (relative_path, resolve_folder(relative_path))
+            else:
+                batcher.when_created(parent_folder_id, lambda filepath = entry.path, relative_path = relative_path, parent_folder_id = parent_folder_id, size = entry.stat().st_size: schedule(filepath, relative_path, parent_folder_id, size))
+
+        batcher.flush()
+
+        if engine is not None:
+            engine.join()
+
+    finally:
+        if engine is not None:
+            engine.shutdown(cancel = True)
+        manifest.save()
+        index.close()
+
+    logging.info("sync_mixed ran without error")
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,36 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # < Modules live flat in the repository root
+
+from fakedrive import FakeDrive, FakeDriveConfig
+
+# < ======================================================================================================
+# < Fixtures
+# < ======================================================================================================
+
+@pytest.fixture
+def fake_drive() -> FakeDrive:
+    """A FakeDrive answering instantly, stopped once the test ends"""
+    drive: FakeDrive = FakeDrive(FakeDriveConfig(latency = 0.0))
+    drive.start()
+    yield drive
+    drive.stop()
+
+@pytest.fixture
+def settings(tmp_path) -> dict:
+    """Settings keeping every file an upload writes inside the test's temporary folder"""
+    return {
+        "SESSION_DIR": str(tmp_path / "sessions"),
+        "MANIFEST_PATH": str(tmp_path / "manifest.json"),
+        "FOLDER_INDEX_PATH": str(tmp_path / "folders.db"),
+        "HASH_CACHE_PATH": str(tmp_path / "hashes.db"),
+        "JOURNAL_PATH": "",
+        "REQUESTS_PER_SECOND": 1000,
+        "REQUEST_BURST": 1000
+    }
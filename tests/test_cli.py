@@ -0,0 +1,144 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import io
+import sys
+import json
+import signal
+import pytest
+import cli
+from datetime import datetime, timedelta, timezone
+from google.oauth2.credentials import Credentials
+from authenticator import CredentialManager, build_drive_service
+from engine import UploadCancelled
+
+# < ======================================================================================================
+# < Fixtures
+# < ======================================================================================================
+
+class SlowStream(io.RawIOBase):
+    """A binary stream handing out at most size bytes per read, as a pipe written to slowly does"""
+
+    def __init__(self, data: bytes, size: int) -> None:
+        self.data: bytes = data
+        self.size: int = size
+
+    def readable(self) -> bool:
+        return True
+
+    def read1(self, size: int = -1) -> bytes:
+        block, self.data = self.data[:self.size], self.data[self.size:]
+        return block
+
+@pytest.fixture
+def run_cli(fake_drive, settings, tmp_path, monkeypatch) -> callable:
+    """Run cli.main with the given arguments against fake_drive, returning its exit code and the events it wrote"""
+
+    expiry: datetime = datetime.now(timezone.utc).replace(tzinfo = None) + timedelta(hours = 1) # < Valid, so nothing is refreshed
+    (tmp_path / "token.json").write_text(Credentials(token = "test", refresh_token = "test", client_id = "test", client_secret = "test", expiry = expiry).to_json())
+    settings_path = tmp_path / "settings.json"
+    settings_path.write_text(json.dumps({**settings, "TOKEN_PATH": str(tmp_path / "token.json"), "CLIENT_SECRET_PATH": str(tmp_path / "client_secret.json"), "SCOPES": [], "FOLDER_ID": "root", "UPLOAD_WORKERS": 2}))
+    monkeypatch.setattr(CredentialManager, "service", lambda self, limiter = None, pool = None: build_drive_service(self.get(), limiter, pool, fake_drive.url))
+    handlers: dict = {number: signal.getsignal(number) for number in (signal.SIGINT, signal.SIGTERM)}
+    events_path = tmp_path / "events.ndjson"
+
+    def run(*arguments: str, stdin: bytes = b"") -> tuple[int, list[dict]]:
+        monkeypatch.setattr(sys, "argv", ["cli.py", "--settings", str(settings_path), "--events", str(events_path), *arguments])
+        monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(stdin)))
+        code: int = cli.main()
+        with open(events_path, "r") as f:
+            return code, [json.loads(line) for line in f]
+
+    yield run
+    for number, handler in handlers.items():
+        signal.signal(number, handler)
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+@pytest.mark.parametrize("data, separator, size", [
+    (b"a\nb/c\n\nd", b"\n", 1),
+    (b"a\r\nb/c\r\n\r\nd\r\n", b"\n", 3),
+    (b"a\0b/c\0\0d\0", b"\0", 2)
+])
+def test_read_paths(data: bytes, separator: bytes, size: int, tmp_path, monkeypatch) -> None:
+    """Paths split across reads are joined, blank lines skipped, and each one made absolute"""
+    monkeypatch.chdir(tmp_path)
+    assert list(cli.read_paths(SlowStream(data, size), separator)) == [str(tmp_path / "a"), str(tmp_path / "b" / "c"), str(tmp_path / "d")]
+
+def test_read_paths_yields_before_stream_ends() -> None:
+    """A path is yielded as soon as its line is complete, before the rest of the stream arrives"""
+    paths = cli.read_paths(SlowStream(b"/first\n/second\n", 7))
+    assert next(paths) == "/first"
+
+def test_input_paths_order(tmp_path, monkeypatch) -> None:
+    """Argument paths come first, then the --from list, and stdin is read only when asked for or nothing else is given"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "list.txt").write_bytes(b"listed\n")
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(b"piped\n")))
+    assert list(cli.input_paths(["given"], str(tmp_path / "list.txt"), b"\n")) == [str(tmp_path / "given"), str(tmp_path / "listed")]
+    assert list(cli.input_paths([], None, b"\n")) == [str(tmp_path / "piped")]
+
+def test_event_listener_writes_ndjson() -> None:
+    """Finished and failed files are written as events and counted, cancelled ones are not counted as failed"""
+    stream: io.StringIO = io.StringIO()
+    listener: cli.EventListener = cli.EventListener(stream)
+    listener.file_started("a", 100)
+    listener.file_progress("a", 40, 100)
+    listener.file_started("b", 50)
+    listener.file_done("a", "id-a")
+    listener.file_failed("b", OSError("gone"))
+    listener.file_started("c", 10)
+    listener.file_failed("c", UploadCancelled())
+
+    events: list[dict] = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(event["event"], event["path"]) for event in events] == [("file_done", "a"), ("file_failed", "b")]
+    assert (events[0]["id"], events[0]["size"]) == ("id-a", 100)
+    totals: dict = listener.totals()
+    assert (totals["files_done"], totals["files_failed"], totals["files_in_flight"], totals["bytes_sent"]) == (1, 1, 0, 100)
+
+def test_event_listener_progress_events() -> None:
+    """Progress events of running totals are written every interval until stopped"""
+    stream: io.StringIO = io.StringIO()
+    listener: cli.EventListener = cli.EventListener(stream, 0.01)
+    listener.start()
+    listener.stop()
+    listener.thread.join(1)
+    lines: list[dict] = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert all(line["event"] == "progress" and "files_per_second" in line for line in lines)
+
+def test_uploads_streamed_paths(run_cli, fake_drive, tmp_path) -> None:
+    """Files and folders named on stdin are uploaded into a new dated folder, a missing path fails without stopping the rest"""
+    folder = tmp_path / "folder"
+    folder.mkdir()
+    (folder / "b.txt").write_text("b")
+    (tmp_path / "a.txt").write_text("a")
+
+    code, events = run_cli("-", stdin = f"{tmp_path / 'a.txt'}\n{folder}\n{tmp_path / 'missing'}\n".encode())
+
+    assert code == cli.EXIT_FAILED
+    assert events[0]["event"] == "started" and events[-1]["event"] == "finished"
+    done: dict[str, str] = {event["path"]: event["id"] for event in events if event["event"] == "file_done"}
+    assert set(done) == {str(tmp_path / "a.txt"), str(folder / "b.txt")}
+    assert all(fake_drive.files[file_id]["size"] == "1" for file_id in done.values())
+    assert [event["path"] for event in events if event["event"] == "file_failed"] == [str(tmp_path / "missing")]
+    assert (events[-1]["files_done"], events[-1]["files_failed"]) == (2, 1)
+    assert fake_drive.files[events[-1]["subfolder_id"]]["parents"] == ["root"]
+
+def test_finished_upload_exits_cleanly(run_cli, tmp_path) -> None:
+    """An upload where every file succeeds exits with 0 and can report its startup marks"""
+    (tmp_path / "a.txt").write_text("a")
+    code, events = run_cli(str(tmp_path / "a.txt"), "--startup-report")
+    assert code == 0
+    assert [event["event"] for event in events[-2:]] == ["startup", "finished"]
+    assert "upload started" in events[-2]["marks"]
+
+def test_missing_token_fails_without_sign_in(run_cli, tmp_path) -> None:
+    """Without --sign-in, credentials that cannot be loaded end the run with a failed event rather than a browser"""
+    (tmp_path / "token.json").unlink()
+    (tmp_path / "a.txt").write_text("a")
+    code, events = run_cli(str(tmp_path / "a.txt"))
+    assert code == cli.EXIT_FAILED
+    assert events[-1]["event"] == "failed" and "error" in events[-1]
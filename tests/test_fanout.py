@@ -0,0 +1,49 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+from google.oauth2.credentials import Credentials
+from authenticator import build_drive_service
+from fanout import mirror_tree
+from folderindex import list_tree
+from uploader import UploadOptions, create_folder, upload_file
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def test_mirrors_of_same_named_folders_kept_apart(fake_drive, settings, tmp_path) -> None:
+    """Two uploads into folders of the same name are mirrored into two folders, not merged into one"""
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    drive_service: any = build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    destination_id: str = create_folder("mirror", drive_service, "root")
+    mirrors: list[str] = []
+
+    for name in ("a.txt", "b.txt"):
+        source_id: str = create_folder("2026-10-18", drive_service, "root")
+        subfolder_id: str = create_folder("sub", drive_service, source_id)
+        filepath = tmp_path / name
+        filepath.write_text(name)
+        upload_file(str(filepath), drive_service, subfolder_id, options)
+        mirrors.append(mirror_tree(drive_service, source_id, destination_id, options.rate_limiter))
+
+    assert mirrors[0] != mirrors[1]
+    assert sorted(list_tree(drive_service, mirrors[0])) == ["sub", "sub/a.txt"]
+    assert sorted(list_tree(drive_service, mirrors[1])) == ["sub", "sub/b.txt"]
+
+def test_mirror_id_completes_earlier_mirror(fake_drive, settings, tmp_path) -> None:
+    """Mirroring again into an earlier mirror copies only what it is missing"""
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    drive_service: any = build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    source_id: str = create_folder("upload", drive_service, "root")
+    destination_id: str = create_folder("mirror", drive_service, "root")
+    for name in ("a.txt", "b.txt"):
+        filepath = tmp_path / name
+        filepath.write_text(name)
+        upload_file(str(filepath), drive_service, source_id, options)
+    mirror_id: str = mirror_tree(drive_service, source_id, destination_id, options.rate_limiter)
+    copied: str = next(file["id"] for file in list_tree(drive_service, mirror_id).values() if file["name"] == "b.txt")
+    del fake_drive.files[copied]
+
+    assert mirror_tree(drive_service, source_id, destination_id, options.rate_limiter, mirror_id) == mirror_id
+    assert sorted(list_tree(drive_service, mirror_id)) == ["a.txt", "b.txt"]
@@ -0,0 +1,105 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import random
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+from authenticator import build_drive_service
+from folders import FOLDER_MIMETYPE, FolderBatcher
+from ratelimit import RateLimiter
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def make_service(fake_drive) -> any:
+    """A Drive service talking to fake_drive"""
+    limiter: RateLimiter = RateLimiter(rate = 1000, burst = 1000, retries = 2, base_delay = 0.001, max_delay = 0.001)
+    return build_drive_service(Credentials(token = "test"), limiter, None, fake_drive.url)
+
+def test_creates_tree_in_batches(fake_drive) -> None:
+    """Siblings share a batch, a folder whose parent is still pending sends the batch first"""
+    batcher: FolderBatcher = FolderBatcher(make_service(fake_drive))
+    top_id: str = batcher.add("top", "root")
+    child_ids: list[str] = [batcher.add(f"child{index}", top_id) for index in range(3)]
+    grandchild_id: str = batcher.add("grandchild", child_ids[0])
+    batcher.flush()
+
+    assert batcher.requests == 4 # < One generateIds call and three batches, one per level
+    assert fake_drive.files[top_id]["parents"] == ["root"]
+    assert all(fake_drive.files[child_id]["parents"] == [top_id] for child_id in child_ids)
+    assert fake_drive.files[grandchild_id]["parents"] == [child_ids[0]]
+    assert all(fake_drive.files[identifier]["mimeType"] == FOLDER_MIMETYPE for identifier in batcher.created)
+    assert batcher.created == {top_id, grandchild_id, *child_ids}
+
+def test_batch_size_splits_batches(fake_drive) -> None:
+    """A full batch is sent before the next folder is queued"""
+    batcher: FolderBatcher = FolderBatcher(make_service(fake_drive), batch_size = 2)
+    folder_ids: list[str] = [batcher.add(f"folder{index}", "root") for index in range(5)]
+    batcher.flush()
+
+    assert batcher.requests == 1 + 3
+    assert all(folder_id in fake_drive.files for folder_id in folder_ids)
+
+def test_when_created_waits_for_flush(fake_drive) -> None:
+    """Callbacks for pending folders run once their batch is sent, those for existing folders run at once"""
+    batcher: FolderBatcher = FolderBatcher(make_service(fake_drive))
+    called: list[str] = []
+    batcher.when_created("root", lambda: called.append("root"))
+    folder_id: str = batcher.add("folder", "root")
+    batcher.when_created(folder_id, lambda: called.append("folder"))
+    assert called == ["root"]
+
+    batcher.flush()
+    assert called == ["root", "folder"]
+    assert (batcher.waiting, batcher.waiting_count) == ({}, 0)
+
+def test_max_waiting_sends_batch(fake_drive) -> None:
+    """Holding back max_waiting callbacks sends the pending batch without waiting for it to fill"""
+    batcher: FolderBatcher = FolderBatcher(make_service(fake_drive), max_waiting = 2)
+    folder_id: str = batcher.add("folder", "root")
+    called: list[int] = []
+    batcher.when_created(folder_id, lambda: called.append(1))
+    assert called == [] and folder_id not in fake_drive.files
+    batcher.when_created(folder_id, lambda: called.append(2))
+    assert called == [1, 2] and folder_id in fake_drive.files
+
+def test_existing_id_counts_as_created(fake_drive) -> None:
+    """A 409 for an ID an earlier attempt already created is not an error"""
+    batcher: FolderBatcher = FolderBatcher(make_service(fake_drive))
+    folder_id: str = batcher.add("folder", "root")
+    batcher.flush()
+    called: list[str] = []
+
+    batcher.add("folder", "root", folder_id)
+    batcher.when_created(folder_id, lambda: called.append(folder_id))
+    batcher.flush()
+
+    assert called == [folder_id]
+    assert sum(1 for file in fake_drive.files.values() if file["name"] == "folder") == 1
+
+def test_failed_calls_retried(fake_drive) -> None:
+    """Calls failing inside a batch are sent again until they succeed"""
+    fake_drive.config.error_rate = 0.3
+    fake_drive.random = random.Random(0)
+    limiter: RateLimiter = RateLimiter(rate = 1000, burst = 1000, retries = 30, base_delay = 0.001, max_delay = 0.01)
+    batcher: FolderBatcher = FolderBatcher(build_drive_service(Credentials(token = "test"), limiter, None, fake_drive.url), limiter = limiter)
+    folder_ids: list[str] = [batcher.add(f"folder{index}", "root") for index in range(20)]
+    batcher.flush()
+
+    assert fake_drive.counts["errors"] > 0
+    assert batcher.created == set(folder_ids)
+    assert all(folder_id in fake_drive.files for folder_id in folder_ids)
+
+def test_failure_raised_once_attempts_run_out(fake_drive) -> None:
+    """Without a limiter each call is tried three times before its error is raised"""
+    batcher: FolderBatcher = FolderBatcher(make_service(fake_drive))
+    batcher.reserve_id() # < Fetch the IDs before every request starts failing
+    fake_drive.config.error_rate = 1.0
+    batcher.add("folder", "root")
+
+    with pytest.raises(HttpError):
+        batcher.flush()
+    assert batcher.pending == {}
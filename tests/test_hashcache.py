@@ -0,0 +1,40 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import time
+import hashlib
+from hashcache import HashCache
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def test_prefetch_dropped_once_finished(tmp_path) -> None:
+    """A prefetched hash nobody asks for is not kept once it has finished"""
+    filepath = tmp_path / "a.txt"
+    filepath.write_text("abc")
+    cache: HashCache = HashCache(str(tmp_path / "hashes.db"))
+    try:
+        cache.prefetch(str(filepath))
+        deadline: float = time.monotonic() + 5
+        while cache.futures and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cache.futures == {}
+    finally:
+        cache.close()
+
+def test_md5_of_file_changed_after_prefetch(tmp_path) -> None:
+    """md5 hashes a file again when it changed after its prefetch finished, rather than returning the old hash"""
+    filepath = tmp_path / "a.txt"
+    filepath.write_text("abc")
+    cache: HashCache = HashCache(str(tmp_path / "hashes.db"))
+    try:
+        cache.prefetch(str(filepath))
+        time.sleep(0.2) # < Lets the prefetch finish
+        filepath.write_text("changed")
+        os.utime(filepath, ns = (time.time_ns(), time.time_ns() + 10 ** 9))
+        assert cache.md5(str(filepath)) == hashlib.md5(b"changed").hexdigest()
+    finally:
+        cache.close()
@@ -0,0 +1,47 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import pytest
+from ignore import IgnoreRules
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+@pytest.mark.parametrize("pattern, name, ignored", [
+    ("*.py[cod]", "x.pyc", True),
+    ("*.py[cod]", "x.pyo", True),
+    ("*.py[cod]", "x.py", False),
+    ("*.[oa]", "x.o", True),
+    ("*.[oa]", "x.a", True),
+    ("*.[oa]", "x.so", False),
+    ("*.[!o]", "x.c", True),
+    ("*.[!o]", "x.o", False),
+    ("*\\?", "what?", True),
+    ("*\\?", "whats", False),
+    ("*\\.txt", "a.txt", True),
+    ("*\\.txt", "atxt", False),
+    ("*.log", "debug.LOG", True),
+    ("build*", "build-output", True),
+    ("thumbs.db", "Thumbs.db", True)
+])
+def test_name_patterns(pattern: str, name: str, ignored: bool) -> None:
+    """Wildcard, bracket and escaped patterns match file names as git does, ignoring case"""
+    assert IgnoreRules([pattern]).decide(name, name, False) is (True if ignored else None)
+
+def test_directory_only_and_negation() -> None:
+    """Directory-only rules skip files of the same name, and later negated rules re-include what earlier ones ignored"""
+    rules: IgnoreRules = IgnoreRules(["build/", "*.log", "!keep.log"])
+    assert rules.decide("build", "build", True) is True
+    assert rules.decide("build", "build", False) is None
+    assert rules.decide("debug.log", "debug.log", False) is True
+    assert rules.decide("keep.log", "keep.log", False) is False
+
+def test_anchored_and_double_star_patterns() -> None:
+    """Patterns containing a / only match from the base, and ** crosses directories"""
+    rules: IgnoreRules = IgnoreRules(["/docs/*.md", "logs/**", "**/cache"])
+    assert rules.decide("docs/a.md", "a.md", False) is True
+    assert rules.decide("src/docs/a.md", "a.md", False) is None
+    assert rules.decide("logs/a/b.txt", "b.txt", False) is True
+    assert rules.decide("a/b/cache", "cache", True) is True
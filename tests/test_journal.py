@@ -0,0 +1,41 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import time
+import sqlite3
+from journal import DONE, Journal
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def test_buffered_row_committed_after_flush_interval(tmp_path) -> None:
+    """A row is on disk once flush_interval has passed, even though nothing else was written after it"""
+    path: str = str(tmp_path / "journal.db")
+    journal: Journal = Journal(path, "job", flush_interval = 0.2)
+    journal.start("subfolder")
+    journal.record("/data/file.txt", DONE, "file-id")
+
+    time.sleep(0.6)
+    reader: sqlite3.Connection = sqlite3.connect(path)
+    try:
+        rows: list[tuple] = reader.execute("SELECT local_path, state, file_id FROM files").fetchall()
+    finally:
+        reader.close()
+    journal.close()
+
+    assert rows == [("/data/file.txt", DONE, "file-id")]
+
+def test_resumed_job_skips_files_recorded_done(tmp_path) -> None:
+    """Opening the journal again under the same key resumes the unfinished job and its done files"""
+    path: str = str(tmp_path / "journal.db")
+    journal: Journal = Journal(path, "job")
+    journal.start("subfolder")
+    journal.record("/data/file.txt", DONE, "file-id")
+    journal.close()
+
+    resumed: Journal = Journal(path, "job")
+    assert resumed.resumed and resumed.subfolder_id == "subfolder"
+    assert resumed.is_done("/data/file.txt")
+    resumed.close()
@@ -0,0 +1,89 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import io
+import tarfile
+import pytest
+from google.oauth2.credentials import Credentials
+from authenticator import build_drive_service
+from engine import UploadCancelled, UploadListener
+from journal import Journal, JournalListener
+from packer import ArchiveUpload, upload_packed_folders
+from uploader import UploadOptions
+
+# < ======================================================================================================
+# < Helpers
+# < ======================================================================================================
+
+def read_archive(media: ArchiveUpload, start: int = 0) -> bytes:
+    """Get every byte of an archive from start, a chunk at a time as the resumable upload asks for them"""
+    output: bytes = b""
+    while True:
+        chunk: bytes = media.getbytes(start + len(output), media.chunksize())
+        output += chunk
+        if len(chunk) < media.chunksize():
+            return output
+
+class CancelAfter(UploadListener):
+
+    def __init__(self, archives: int) -> None:
+        """Cancel the upload once the given number of archives are done"""
+        self.archives: int = archives
+
+    def file_done(self, filepath: str, file_id: str) -> None:
+        self.archives -= filepath.endswith(".tar")
+
+    def is_cancelled(self) -> bool:
+        return self.archives <= 0
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def test_archive_holds_members_and_survives_serialising(tmp_path) -> None:
+    """An archive holds each member under its arcname, and one rebuilt from to_json generates the same bytes"""
+    members: list[tuple[str, str]] = []
+    for index in range(5):
+        filepath = tmp_path / f"{index}.txt"
+        filepath.write_bytes(bytes([index]) * 100_000)
+        members.append((str(filepath), f"dir/{index}.txt"))
+
+    content: bytes = read_archive(ArchiveUpload(members, 256 * 1024))
+    restored: ArchiveUpload = ArchiveUpload.from_json(ArchiveUpload(members, 256 * 1024).to_json())
+
+    with tarfile.open(fileobj = io.BytesIO(content)) as tar:
+        assert {member.name: tar.extractfile(member).read() for member in tar} == {f"dir/{index}.txt": bytes([index]) * 100_000 for index in range(5)}
+    assert read_archive(restored, 256 * 1024) == content[256 * 1024:]
+
+def test_resumed_job_packs_every_file_once_folder_changed(fake_drive, settings, tmp_path) -> None:
+    """Files added before a resume, such as 00a.txt sorting among those already uploaded, are packed with the ones not
+    yet uploaded, none are lost or sent twice and the index is updated in place"""
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    options.pack_target = 4096
+    drive_service: any = build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    root = tmp_path / "data"
+    root.mkdir()
+    for index in range(10):
+        (root / f"{index:02d}.txt").write_bytes(b"x" * 1000)
+    path: str = str(tmp_path / "journal.db")
+
+    journal: Journal = Journal(path, "job")
+    journal.start("root")
+    with pytest.raises(UploadCancelled):
+        upload_packed_folders([str(root)], drive_service, "root", None, options, JournalListener(journal, CancelAfter(2)), journal)
+    journal.close()
+
+    for added in ("00a.txt", "zz.txt"): # < The second run finishes and uploads the index, the third updates it
+        (root / added).write_bytes(b"y" * 1000)
+        journal = Journal(path, "job")
+        upload_packed_folders([str(root)], drive_service, "root", None, options, JournalListener(journal), journal)
+        journal.close()
+
+    journal = Journal(path, "job")
+    packed: list[str] = [arcname for archive_path, arcnames in journal.archives.items() if journal.is_done(archive_path) for arcname in arcnames]
+    assert sorted(packed) == sorted(["00a.txt", "zz.txt"] + [f"{index:02d}.txt" for index in range(10)])
+    names: list[str] = [file["name"] for file in fake_drive.files.values()]
+    assert names.count("data.index.tsv") == 1
+    assert len(set(names)) == len(names)
+    journal.close()
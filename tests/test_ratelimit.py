@@ -0,0 +1,109 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import random
+import threading
+import pytest
+import httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+from authenticator import build_drive_service
+from ratelimit import RateLimiter, is_rate_limited, is_retryable
+from uploader import create_folder
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+@pytest.mark.parametrize("status, content, limited, retryable", [
+    (429, b"", True, True),
+    (403, b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}', True, True),
+    (403, '{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}', True, True),
+    (403, b'{"error": {"errors": [{"reason": "insufficientPermissions"}]}}', False, False),
+    (503, None, False, True),
+    (404, b"", False, False)
+])
+def test_classifies_responses(status: int, content: bytes | str | None, limited: bool, retryable: bool) -> None:
+    """Only 429s and 403s naming a rate limit are quota errors, those and 5xx responses are retried"""
+    assert is_rate_limited(status, content) is limited
+    assert is_retryable(status, content) is retryable
+
+def test_reserve_waits_for_tokens() -> None:
+    """reserve takes tokens while the bucket holds them, then gives the time until the next one"""
+    limiter: RateLimiter = RateLimiter(rate = 10, burst = 2)
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() == 0.0
+    assert 0.05 < limiter.reserve() <= 0.1
+
+def test_concurrency_halves_on_quota_errors_and_grows_back() -> None:
+    """A quota error halves the concurrency limit, successful calls grow it back by one per limit calls"""
+    limiter: RateLimiter = RateLimiter(rate = 1000, burst = 1000, max_concurrency = 8)
+    limiter.acquire()
+    limiter.release(throttled = True)
+    assert (limiter.limit, limiter.throttled_count) == (4.0, 1)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert 4.9 < limiter.limit < 5.0
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8.0
+
+def test_acquire_waits_for_a_slot() -> None:
+    """A call over the concurrency limit waits until another one releases its slot"""
+    limiter: RateLimiter = RateLimiter(rate = 1000, burst = 1000, max_concurrency = 1)
+    limiter.acquire()
+    acquired: threading.Event = threading.Event()
+    thread: threading.Thread = threading.Thread(target = lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
+
+def test_quota_error_pauses_every_caller() -> None:
+    """A backoff after a quota error makes reserve wait it out, one after another failure does not"""
+    limiter: RateLimiter = RateLimiter(rate = 1000, burst = 1000, base_delay = 1, max_delay = 1)
+    random.seed(0)
+    limiter.backoff(0)
+    assert limiter.reserve() == 0.0
+    delay: float = limiter.backoff(0, throttled = True)
+    assert 0 < limiter.reserve() <= delay
+
+def test_retry_only_transient_errors() -> None:
+    """retry gives up on errors that would fail again and once its attempts run out"""
+    limiter: RateLimiter = RateLimiter(retries = 2, base_delay = 0.001, max_delay = 0.001)
+    assert limiter.retry(HttpError(httplib2.Response({"status": 503}), b""), 0)
+    assert limiter.retry(ConnectionError(), 1)
+    assert not limiter.retry(ConnectionError(), 2)
+    assert not limiter.retry(HttpError(httplib2.Response({"status": 404}), b""), 0)
+    assert not limiter.retry(ValueError(), 0)
+
+def test_requests_retried_through_failures(fake_drive) -> None:
+    """Drive calls sent through the limiter succeed despite injected quota errors and 503s, counting each quota error"""
+    fake_drive.config.throttle_rate = 0.3
+    fake_drive.config.error_rate = 0.2
+    fake_drive.random = random.Random(0)
+    limiter: RateLimiter = RateLimiter(rate = 1000, burst = 1000, retries = 30, base_delay = 0.001, max_delay = 0.01)
+    drive_service: any = build_drive_service(Credentials(token = "test"), limiter, None, fake_drive.url)
+
+    folder_ids: list[str] = [create_folder(f"folder{index}", drive_service, "root") for index in range(10)]
+
+    assert all(folder_id in fake_drive.files for folder_id in folder_ids)
+    assert fake_drive.counts["throttled"] > 0 and fake_drive.counts["errors"] > 0
+    assert limiter.throttled_count == fake_drive.counts["throttled"]
+    assert limiter.in_flight == 0
+
+def test_requests_fail_once_retries_run_out(fake_drive) -> None:
+    """A call still failing after every retry raises the last error"""
+    fake_drive.config.error_rate = 1.0
+    limiter: RateLimiter = RateLimiter(rate = 1000, burst = 1000, retries = 2, base_delay = 0.001, max_delay = 0.001)
+    drive_service: any = build_drive_service(Credentials(token = "test"), limiter, None, fake_drive.url)
+
+    with pytest.raises(HttpError) as error:
+        create_folder("folder", drive_service, "root")
+
+    assert error.value.resp.status == 503
+    assert fake_drive.counts["requests"] == 3
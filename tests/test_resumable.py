@@ -0,0 +1,70 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import time
+import hashlib
+import logging
+import pytest
+from google.oauth2.credentials import Credentials
+from authenticator import build_drive_service
+from engine import UploadCancelled, UploadListener
+from resumable import SESSION_LIFETIME, SessionStore
+from uploader import UploadOptions, upload_mixed
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+class CancelAfterFirstChunk(UploadListener):
+    """Cancels the upload once the first chunk has been acknowledged"""
+
+    def __init__(self) -> None:
+        self.cancelled: bool = False
+
+    def file_progress(self, filepath: str, bytes_sent: int, total: int) -> None:
+        if 0 < bytes_sent < total:
+            self.cancelled = True
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled
+
+def test_interrupted_upload_resumes_with_journal(fake_drive, settings, tmp_path, caplog) -> None:
+    """An upload cancelled part way through resumes its saved session when the same journalled job runs again"""
+    settings = {**settings, "JOURNAL_PATH": str(tmp_path / "journal.db"), "RESUMABLE_THRESHOLD_MB": 1, "CHUNK_SIZE_MB": 1}
+    data: bytes = os.urandom(3 * 1024 * 1024)
+    filepath = tmp_path / "large.bin"
+    filepath.write_bytes(data)
+
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    drive_service: any = build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    with pytest.raises(UploadCancelled):
+        upload_mixed(drive_service, [str(filepath)], [], "root", options, listener = CancelAfterFirstChunk())
+    assert len(os.listdir(settings["SESSION_DIR"])) == 1
+
+    options = UploadOptions.from_settings(settings)
+    with caplog.at_level(logging.INFO):
+        upload_mixed(drive_service, [str(filepath)], [], "root", options)
+
+    assert "Resuming upload of" in caplog.text
+    assert os.listdir(settings["SESSION_DIR"]) == []
+    stored: list[dict] = [file for file in fake_drive.files.values() if file.get("name") == "large.bin"]
+    assert [file["md5Checksum"] for file in stored] == [hashlib.md5(data).hexdigest()]
+
+def test_sessions_not_saved_without_journal(settings) -> None:
+    """Without the journal each run uploads into a new subfolder, so nothing is saved that could never resume"""
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    options.session_store.save("key", {"uri": "https://example.invalid", "offset": 0})
+    assert not os.path.exists(settings["SESSION_DIR"])
+
+def test_prune_removes_expired_sessions(tmp_path) -> None:
+    """Sessions older than Drive keeps them are removed, recent ones are kept"""
+    store: SessionStore = SessionStore(str(tmp_path))
+    store.save("old", {"uri": "https://example.invalid/old", "offset": 0})
+    store.save("new", {"uri": "https://example.invalid/new", "offset": 0})
+    expired: float = time.time() - SESSION_LIFETIME - 60
+    os.utime(store.path("old"), (expired, expired))
+
+    assert store.prune() == 1
+    assert store.load("old") is None and store.load("new") is not None
@@ -0,0 +1,85 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import time
+import pytest
+from ratelimit import BandwidthLimiter
+from scheduling import Interleaved, LargestFirst, SchedulingPolicy, SmallestFirst, make_policy
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+SIZES: dict[str, int] = {"a": 30, "b": 10, "c": 50, "d": 10, "e": 20}
+
+def drain(policy: SchedulingPolicy) -> list[str]:
+    """Push every task of SIZES in order and pop them all, finishing each before the next"""
+    for task, size in SIZES.items():
+        policy.push(task, size)
+    order: list[str] = []
+    while policy:
+        task, size = policy.pop()
+        assert size == SIZES[task]
+        policy.done(size)
+        order.append(task)
+    return order
+
+@pytest.mark.parametrize("name, order", [
+    ("fifo", ["a", "b", "c", "d", "e"]),
+    ("largest", ["c", "a", "e", "b", "d"]),
+    ("smallest", ["b", "d", "e", "a", "c"]),
+    ("FIFO", ["a", "b", "c", "d", "e"]),
+    ("unknown", ["a", "b", "c", "d", "e"]),
+    (None, ["a", "b", "c", "d", "e"])
+])
+def test_policy_order(name: str, order: list[str]) -> None:
+    """Each policy pops tasks in its order, equal sizes in the order they were pushed, unknown names fall back to fifo"""
+    assert drain(make_policy(name)) == order
+
+def test_make_policy_types() -> None:
+    """make_policy builds the class for each name and gives interleaved half the workers for large files"""
+    assert type(make_policy("largest")) is LargestFirst
+    assert type(make_policy("smallest")) is SmallestFirst
+    policy: Interleaved = make_policy("interleaved", workers = 8, threshold = 25)
+    assert (policy.large_slots, policy.threshold) == (4, 25)
+    assert make_policy("interleaved", workers = 1).large_slots == 1
+
+def test_interleaved_limits_running_large_tasks() -> None:
+    """Interleaved runs large tasks largest first up to its slots, then small ones in order until a large one ends"""
+    policy: Interleaved = Interleaved(1, 25)
+    for task, size in SIZES.items():
+        policy.push(task, size)
+
+    assert policy.pop() == ("c", 50)
+    assert policy.pop() == ("b", 10) # < The one large slot is taken
+    assert policy.pop() == ("d", 10)
+    policy.done(50)
+    assert policy.pop() == ("a", 30)
+    assert policy.pop() == ("e", 20)
+    assert len(policy) == 0
+
+def test_interleaved_runs_large_tasks_when_no_small_ones_wait() -> None:
+    """Large tasks are not held back for slots when nothing small is queued"""
+    policy: Interleaved = Interleaved(1, 25)
+    policy.push("a", 30)
+    policy.push("c", 50)
+    assert [policy.pop()[0], policy.pop()[0]] == ["c", "a"]
+
+def test_bandwidth_limiter_paces_bytes() -> None:
+    """Bytes beyond the first second's allowance are sent no faster than the cap"""
+    limiter: BandwidthLimiter = BandwidthLimiter(1000)
+    started: float = time.monotonic()
+    for _ in range(3):
+        limiter.consume(500)
+    assert time.monotonic() - started >= 0.45
+
+def test_bandwidth_limiter_outside_hours() -> None:
+    """The cap does not apply outside its hours, which may wrap past midnight"""
+    hour: int = time.localtime().tm_hour
+    assert BandwidthLimiter(1, (hour, hour)).active() is False
+    assert BandwidthLimiter(1, (hour, (hour + 1) % 24)).active() is True
+    assert BandwidthLimiter(1, ((hour + 1) % 24, hour)).active() is False
+    started: float = time.monotonic()
+    BandwidthLimiter(1, (hour, hour)).consume(1000)
+    assert time.monotonic() - started < 0.1
@@ -0,0 +1,53 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import time
+import hashlib
+from google.oauth2.credentials import Credentials
+from authenticator import build_drive_service
+from sync import sync_mixed
+from uploader import UploadOptions
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def test_edited_file_uploaded_on_next_sync(fake_drive, settings, tmp_path) -> None:
+    """A file edited between syncs run with the same options is updated on Drive, whatever was hashed before"""
+    options: UploadOptions = UploadOptions.from_settings({**settings, "VERIFY_UPLOADS": True, "UPLOAD_WORKERS": 2})
+    service_factory = lambda: build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    root = tmp_path / "data"
+    root.mkdir()
+    filepath = root / "a.txt"
+    filepath.write_text("old")
+
+    try:
+        sync_mixed(service_factory(), [], [str(root)], "root", options, service_factory)
+        sync_mixed(service_factory(), [], [str(root)], "root", options, service_factory)
+        filepath.write_text("new content")
+        os.utime(filepath, ns = (time.time_ns(), time.time_ns() + 10 ** 9))
+        sync_mixed(service_factory(), [], [str(root)], "root", options, service_factory)
+    finally:
+        options.close()
+
+    uploaded: list[dict] = [file for file in fake_drive.files.values() if file.get("name") == "a.txt"]
+    assert len(uploaded) == 1
+    assert uploaded[0]["md5Checksum"] == hashlib.md5(b"new content").hexdigest()
+
+def test_unchanged_files_not_uploaded_again(fake_drive, settings, tmp_path) -> None:
+    """A second sync of untouched files sends no uploads"""
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    drive_service: any = build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    root = tmp_path / "data"
+    (root / "sub").mkdir(parents = True)
+    (root / "a.txt").write_text("a")
+    (root / "sub" / "b.txt").write_text("b")
+
+    sync_mixed(drive_service, [], [str(root)], "root", options)
+    files: dict[str, dict] = {file_id: dict(file) for file_id, file in fake_drive.files.items()}
+    sync_mixed(drive_service, [], [str(root)], "root", options)
+
+    assert fake_drive.files == files
+    assert sorted(file["name"] for file in files.values() if file["name"].endswith(".txt")) == ["a.txt", "b.txt"]
@@ -0,0 +1,104 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import json
+import time
+import pytest
+import tracing
+from google.oauth2.credentials import Credentials
+from authenticator import build_drive_service
+from uploader import UploadOptions, create_folder, upload_file
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+@pytest.fixture
+def recording() -> None:
+    """Tracing enabled for the test, disabled again after it"""
+    tracing.enable()
+    yield
+    tracing.disable()
+
+def test_disabled_records_nothing() -> None:
+    """While disabled, spans are the shared no-op and nothing is recorded"""
+    tracing.enable()
+    tracing.disable()
+    with tracing.span("scan", "scan") as span:
+        span.set(entries = 1)
+    tracing.wait("rate limit", "throttle", time.perf_counter() - 1)
+    assert span is tracing.NULL_SPAN
+    assert tracing.events == []
+
+def test_empty_path_does_not_trace(tmp_path) -> None:
+    """traced with no path leaves tracing off and writes nothing"""
+    with tracing.traced(""):
+        assert not tracing.enabled
+    assert list(tmp_path.iterdir()) == []
+
+def test_span_records_details_and_errors(recording) -> None:
+    """A span records its arguments, anything set inside it and the exception leaving it"""
+    with tracing.span("POST files", "request", bytes = 10) as span:
+        span.set(status = 200)
+    with pytest.raises(ValueError):
+        with tracing.span("hash", "hash"):
+            raise ValueError("unreadable")
+
+    (name, category, start, duration, thread_id, overlapping, args), failed = tracing.events
+    assert (name, category, overlapping, args) == ("POST files", "request", False, {"bytes": 10, "status": 200})
+    assert duration >= 0
+    assert failed[1] == "hash" and "unreadable" in failed[6]["error"]
+
+def test_short_waits_dropped(recording) -> None:
+    """Waits shorter than MIN_WAIT are not recorded"""
+    tracing.wait("rate limit", "throttle", time.perf_counter())
+    tracing.wait("rate limit", "throttle", time.perf_counter() - 0.01)
+    assert [event[3] >= 0.01 for event in tracing.events] == [True]
+
+def test_summary_names_what_bound_the_job(recording) -> None:
+    """The category holding the most time decides whether the job was quota, bandwidth, latency or local bound"""
+    now: float = time.perf_counter()
+    tracing.record("rate limit", "throttle", now, 2.0)
+    tracing.record("POST files", "request", now, 0.5, bytes = 100)
+    tracing.record("PUT upload", "request", now, 1.0, bytes = tracing.TRANSFER_BYTES)
+    summary: str = tracing.summary()
+    assert "mostly quota-bound" in summary
+    assert summary.splitlines()[1].split()[:2] == ["throttle", "1"]
+    assert summary.splitlines()[2].split()[:2] == ["request", "2"]
+
+    tracing.record("scan", "scan", now, 5.0)
+    assert "mostly local-bound" in tracing.summary()
+
+def test_export_writes_chrome_trace(recording, tmp_path) -> None:
+    """Events are exported as complete events, overlapping ones as begin and end pairs, with thread names"""
+    now: float = time.perf_counter()
+    tracing.record("POST files", "request", now, 0.5)
+    tracing.record("POST upload", "request", now, 0.25, overlapping = True)
+    path = tmp_path / "trace.json"
+    tracing.export(str(path))
+
+    events: list[dict] = json.loads(path.read_text())["traceEvents"]
+    assert [event["ph"] for event in events] == ["M", "M", "X", "b", "e"]
+    assert events[1]["args"]["name"] == "MainThread"
+    assert events[2]["dur"] == pytest.approx(500000)
+    assert events[4]["ts"] - events[3]["ts"] == pytest.approx(250000)
+
+def test_traces_upload(fake_drive, settings, tmp_path) -> None:
+    """Tracing an upload records its requests, each with its size and status, and exports them"""
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    drive_service: any = build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    filepath = tmp_path / "a.txt"
+    filepath.write_text("traced")
+    path = tmp_path / "trace.json"
+
+    with tracing.traced(str(path)):
+        upload_file(str(filepath), drive_service, create_folder("traced", drive_service, "root"), options)
+
+    assert not tracing.enabled
+    requests: list[tuple] = [event for event in tracing.events if event[1] == "request"]
+    assert [event[0] for event in requests] == ["POST files", "POST upload"]
+    assert all(event[6]["status"] == 200 for event in requests)
+    assert requests[1][6]["bytes"] > len("traced")
+    assert any(event["cat"] == "request" for event in json.loads(path.read_text())["traceEvents"] if event["ph"] == "X")
+    assert "request" in tracing.summary()
@@ -0,0 +1,89 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import sqlite3
+import pytest
+from google.oauth2.credentials import Credentials
+from authenticator import build_drive_service
+from folders import FOLDER_MIMETYPE
+from uploader import UploadOptions, create_folder, upload_mixed
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def test_asyncio_fanout_without_listener(fake_drive, settings, tmp_path) -> None:
+    """The asyncio engine mirrors into every extra destination when upload_mixed is given no listener"""
+    pytest.importorskip("aiohttp")
+    options: UploadOptions = UploadOptions.from_settings({**settings, "UPLOAD_ENGINE": "asyncio"})
+    credentials: Credentials = Credentials(token = "test")
+    drive_service: any = build_drive_service(credentials, options.rate_limiter, None, fake_drive.url)
+    destination_id: str = create_folder("mirror", drive_service, "root")
+    filepath = tmp_path / "file.txt"
+    filepath.write_text("content")
+
+    upload_mixed(drive_service, [str(filepath)], [], ["root", destination_id], options, credentials = credentials, root_url = fake_drive.url)
+
+    copies: list[dict] = [file for file in fake_drive.files.values() if file.get("name") == "file.txt"]
+    assert len(copies) == 2
+    mirrored_folders: set[str] = {file["id"] for file in fake_drive.files.values() if file["mimeType"] == FOLDER_MIMETYPE and destination_id in file.get("parents", [])}
+    assert any(parent in mirrored_folders for copy in copies for parent in copy["parents"])
+
+def test_asyncio_reads_bodies_only_with_a_free_slot(fake_drive, settings, tmp_path, monkeypatch) -> None:
+    """The asyncio engine never holds more small file bodies in memory than it has small request slots"""
+    pytest.importorskip("aiohttp")
+    import asyncengine
+    held: list[int] = [0, 0] # < Bodies read and not yet sent, and the most there ever were
+
+    def read_file(filepath: str) -> bytes:
+        held[0] += 1
+        held[1] = max(held)
+        return open(filepath, "rb").read()
+
+    async def upload_multipart(self, metadata: dict, content: bytes, mimetype: str) -> dict:
+        try:
+            return await original(self, metadata, content, mimetype)
+        finally:
+            held[0] -= 1
+
+    original = asyncengine.AsyncDrive.upload_multipart
+    monkeypatch.setattr(asyncengine, "read_file", read_file)
+    monkeypatch.setattr(asyncengine.AsyncDrive, "upload_multipart", upload_multipart)
+    options: UploadOptions = UploadOptions.from_settings({**settings, "UPLOAD_ENGINE": "asyncio", "ASYNC_LIMITS": {"small": 2}})
+    credentials: Credentials = Credentials(token = "test")
+    drive_service: any = build_drive_service(credentials, options.rate_limiter, None, fake_drive.url)
+    folder = tmp_path / "files"
+    folder.mkdir()
+    for index in range(20):
+        (folder / f"{index}.txt").write_text("content")
+
+    upload_mixed(drive_service, [], [str(folder)], "root", options, credentials = credentials, root_url = fake_drive.url)
+
+    assert sum(file.get("name", "").endswith(".txt") for file in fake_drive.files.values()) == 20
+    assert 1 <= held[1] <= 2
+
+def test_close_releases_hash_cache(settings) -> None:
+    """close shuts the hash cache opened by the options, and reusing the options opens a new one"""
+    options: UploadOptions = UploadOptions.from_settings(settings)
+    hash_cache: any = options.hash_cache
+
+    options.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        hash_cache.connection.execute("SELECT 1")
+    assert options.hash_cache is not hash_cache
+    options.close()
+
+def test_asyncio_warns_about_unsupported_settings(fake_drive, settings, tmp_path, caplog) -> None:
+    """The asyncio engine says which settings it ignores rather than dropping them silently"""
+    pytest.importorskip("aiohttp")
+    options: UploadOptions = UploadOptions.from_settings({**settings, "UPLOAD_ENGINE": "asyncio", "VERIFY_UPLOADS": True, "JOURNAL_PATH": str(tmp_path / "journal.db")})
+    credentials: Credentials = Credentials(token = "test")
+    drive_service: any = build_drive_service(credentials, options.rate_limiter, None, fake_drive.url)
+    filepath = tmp_path / "file.txt"
+    filepath.write_text("content")
+
+    upload_mixed(drive_service, [str(filepath)], [], "root", options, credentials = credentials, root_url = fake_drive.url)
+
+    assert "does not support VERIFY_UPLOADS, JOURNAL_PATH" in caplog.text
@@ -0,0 +1,56 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import pytest
+from google.oauth2.credentials import Credentials
+from authenticator import build_drive_service
+from engine import UploadCancelled, UploadListener
+from folders import FOLDER_MIMETYPE
+from sync import sync_mixed
+from uploader import UploadOptions
+from watcher import follow_changes
+
+# < ======================================================================================================
+# < Scripted Watcher Class
+# < ======================================================================================================
+
+class ScriptedWatcher:
+
+    def __init__(self, changes: list[tuple[str, str]], reads: int = 20) -> None:
+        """Initialise a watcher reporting changes on its first read, then nothing, cancelling listener after reads reads"""
+        self.changes: list[tuple[str, str]] = changes
+        self.reads: int = reads
+        self.listener: UploadListener = UploadListener()
+        self.listener.is_cancelled = lambda: self.reads <= 0
+
+    def read(self, timeout: float) -> tuple[set[tuple[str, str]], bool]:
+        self.reads -= 1
+        changes, self.changes = set(self.changes), []
+        return changes, False
+
+# < ======================================================================================================
+# < Tests
+# < ======================================================================================================
+
+def test_upload_into_folder_removed_on_drive(fake_drive, settings, tmp_path) -> None:
+    """A watched file whose indexed folder was removed on Drive is uploaded once the folder index is refreshed"""
+    options: UploadOptions = UploadOptions.from_settings({**settings, "WATCH_SETTLE_SECONDS": 0})
+    drive_service: any = build_drive_service(Credentials(token = "test"), options.rate_limiter, None, fake_drive.url)
+    root = tmp_path / "data"
+    (root / "sub").mkdir(parents = True)
+    (root / "sub" / "a.txt").write_text("a")
+    sync_mixed(drive_service, [], [str(root)], "root", options)
+
+    removed: str = next(file["id"] for file in fake_drive.files.values() if file["name"] == "sub")
+    for file_id in [file["id"] for file in fake_drive.files.values() if removed in (file["id"], *file.get("parents", []))]:
+        del fake_drive.files[file_id]
+    (root / "sub" / "b.txt").write_text("b")
+    watcher: ScriptedWatcher = ScriptedWatcher([(str(root), str(root / "sub" / "b.txt"))])
+
+    with pytest.raises(UploadCancelled):
+        follow_changes(watcher, drive_service, "root", options, listener = watcher.listener)
+
+    uploaded: dict = next(file for file in fake_drive.files.values() if file["name"] == "b.txt")
+    parent: dict = fake_drive.files[uploaded["parents"][0]]
+    assert parent["name"] == "sub" and parent["mimeType"] == FOLDER_MIMETYPE
@@ -0,0 +1,194 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+MIN_WAIT: float = 0.001 # < Waits shorter than this are not worth an event, most acquires never block at all
+TRANSFER_BYTES: int = 256 * 1024 # < Requests sending at least this much are counted as bandwidth rather than latency
+
+CATEGORIES: tuple[str, ...] = ("scan", "hash", "queue", "task", "throttle", "bandwidth", "request", "retry") # < In summary order
+
+enabled: bool = False
+started: float = time.perf_counter()
+stopped: float | None = None
+events: list[tuple] = []
+thread_names: dict[int, str] = {} # < Kept as events arrive, worker threads have usually exited by export
+
+# < ======================================================================================================
+# < Span Classes
+# < ======================================================================================================
+
+class Span:
+    """Times the block it wraps and records it as an event on exit, extra details can be attached with set"""
+
+    __slots__ = ("name", "category", "args", "overlapping", "start")
+
+    def __init__(self, name: str, category: str, args: dict, overlapping: bool = False) -> None:
+        self.name: str = name
+        self.category: str = category
+        self.args: dict = args
+        self.overlapping: bool = overlapping
+
+    def __enter__(self) -> "Span":
+        self.start: float = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type: type | None, exception: BaseException | None, traceback: any) -> None:
+        if exception is not None:
+            self.args["error"] = repr(exception)
+        record(self.name, self.category, self.start, time.perf_counter() - self.start, self.overlapping, **self.args)
+
+    def set(self, **args) -> None:
+        """Attach details only known once the block has run, such as a response status"""
+        self.args.update(args)
+
+class NullSpan:
+    """Stands in for a Span while tracing is disabled, doing nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exception_type: type | None, exception: BaseException | None, traceback: any) -> None:
+        pass
+
+    def set(self, **args) -> None:
+        pass
+
+NULL_SPAN: NullSpan = NullSpan()
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def enable() -> None:
+    """Start recording, dropping anything recorded before"""
+    global enabled, started, stopped
+    events.clear()
+    thread_names.clear()
+    started = time.perf_counter()
+    stopped = None
+    enabled = True
+
+def disable() -> None:
+    """Stop recording, keeping what was recorded for export and summary"""
+    global enabled, stopped
+    enabled = False
+    stopped = time.perf_counter()
+
+def span(name: str, category: str, overlapping: bool = False, **args) -> Span | NullSpan:
+    """Get a context manager timing the block it wraps as an event in category, or a shared no-op one when disabled
+
+    overlapping marks blocks that may overlap others on the same thread, such as requests from asyncio tasks"""
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, category, args, overlapping)
+
+def record(name: str, category: str, start: float, duration: float, overlapping: bool = False, **args) -> None:
+    """Record an event that began at start, a time.perf_counter() value, and lasted duration seconds"""
+    if enabled:
+        thread_id: int = threading.get_ident()
+        if thread_id not in thread_names:
+            thread_names[thread_id] = threading.current_thread().name
+        events.append((name, category, start, duration, thread_id, overlapping, args)) # < list.append is atomic
+
+def wait(name: str, category: str, start: float, overlapping: bool = False, **args) -> None:
+    """Record a wait that began at start and ends now, if it lasted long enough to matter"""
+    if enabled:
+        duration: float = time.perf_counter() - start
+        if duration >= MIN_WAIT:
+            record(name, category, start, duration, overlapping, **args)
+
+@contextmanager
+def traced(path: str) -> Iterator[None]:
+    """Record everything done inside the block, then export it to path and log the summary, or do nothing if path is empty"""
+    if not path:
+        yield
+        return
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+        export(path)
+        logging.info(f"Upload trace summary:\n{summary()}")
+
+def export(path: str) -> None:
+    """Write every recorded event to path as a Chrome trace, which chrome://tracing and ui.perfetto.dev can open"""
+
+    process_id: int = os.getpid()
+    output: list[dict] = [{"name": "process_name", "ph": "M", "pid": process_id, "args": {"name": "Drive upload"}}]
+
+    for thread_id in sorted({event[4] for event in events}):
+        output.append({"name": "thread_name", "ph": "M", "pid": process_id, "tid": thread_id, "args": {"name": thread_names.get(thread_id, str(thread_id))}})
+
+    for index, (name, category, start, duration, thread_id, overlapping, args) in enumerate(events):
+        timestamp: float = (start - started) * 1e6
+        if overlapping: # < Shown as its own async track, complete events on one thread must nest
+            output.append({"name": name, "cat": category, "ph": "b", "id": index, "ts": timestamp, "pid": process_id, "tid": thread_id, "args": args})
+            output.append({"name": name, "cat": category, "ph": "e", "id": index, "ts": timestamp + duration * 1e6, "pid": process_id, "tid": thread_id})
+        else:
+            output.append({"name": name, "cat": category, "ph": "X", "ts": timestamp, "dur": duration * 1e6, "pid": process_id, "tid": thread_id, "args": args})
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": output, "displayTimeUnit": "ms"}, f)
+    logging.info(f"Trace of {len(events)} events written to {path}")
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Get the value below which fraction of the sorted values fall, by nearest rank"""
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))] if values else 0.0
+
+def summary() -> str:
+    """Get a table of the time recorded in each category and a line on what bound the job
+
+    The job is called quota-bound, bandwidth-bound or latency-bound by whichever of the time waiting on the rate
+    limit and retries, the time sending large bodies and waiting on the bandwidth cap, and the time in small
+    requests is largest, or local-bound when scanning and hashing outweigh all three"""
+
+    durations: dict[str, list[float]] = {category: [] for category in CATEGORIES}
+    sent: dict[str, int] = dict.fromkeys(CATEGORIES, 0)
+    transfer: float = 0.0
+
+    for name, category, start, duration, thread_id, overlapping, args in events:
+        durations.setdefault(category, []).append(duration)
+        sent[category] = sent.get(category, 0) + args.get("bytes", 0)
+        if category == "request" and args.get("bytes", 0) >= TRANSFER_BYTES:
+            transfer += duration
+
+    lines: list[str] = [f"{'category':<10} {'count':>8} {'total s':>10} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'MB':>10}"]
+    for category, values in durations.items():
+        if values:
+            values.sort()
+            lines.append(f"{category:<10} {len(values):>8} {sum(values):>10.2f} {sum(values) / len(values) * 1000:>10.1f} {percentile(values, 0.5) * 1000:>10.1f} {percentile(values, 0.99) * 1000:>10.1f} {sent[category] / 1024 / 1024:>10.1f}")
+
+    totals: dict[str, float] = {category: sum(values) for category, values in durations.items()}
+    bounds: dict[str, float] = {
+        "quota-bound": totals["throttle"] + totals["retry"],
+        "bandwidth-bound": totals["bandwidth"] + transfer,
+        "latency-bound": totals["request"] - transfer,
+        "local-bound": totals["scan"] + totals["hash"]
+    }
+    bound: str = max(bounds, key = bounds.get)
+    lines.append(f"{(stopped or time.perf_counter()) - started:.1f}s traced, mostly {bound}, in seconds summed over threads: " + ", ".join(f"{name.split('-')[0]} {seconds:.1f}" for name, seconds in bounds.items()))
+    return "\n".join(lines)
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
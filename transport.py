@@ -0,0 +1,106 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import logging
+import requests
+from google.auth.credentials import Credentials
+from google.auth.transport.requests import AuthorizedSession
+from httplib2 import Response
+from requests.adapters import HTTPAdapter
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+TRANSPORTS: tuple[str, ...] = ("httplib2", "pooled")
+HOSTS: int = 4 # < Hosts kept in the pool, the API, upload and OAuth endpoints and a spare
+TIMEOUT: float = 120.0
+
+# < ======================================================================================================
+# < Connection Pool Class
+# < ======================================================================================================
+
+class ConnectionPool:
+
+    def __init__(self, size: int = 8, timeout: float = TIMEOUT) -> None:
+        """Initialise a pool of at most size keep-alive connections per host, shared by every Drive service built on it
+
+        A caller wanting a connection while all size are busy waits for one to come back rather than opening another,
+        so a handful of TLS handshakes are paid once per job instead of once per worker service or per file"""
+        self.size: int = max(1, size)
+        self.timeout: float = timeout
+        self.adapter: HTTPAdapter = HTTPAdapter(pool_connections = HOSTS, pool_maxsize = self.size, pool_block = True)
+
+    def http(self, credentials: Credentials) -> "PooledHttp":
+        """Get an authorised http object for googleapiclient sending its requests through this pool"""
+        return PooledHttp(credentials, self)
+
+    def stats(self) -> tuple[int, int]:
+        """Get the number of requests that reused a pooled connection and the number that opened a new one"""
+        requests_sent: int = 0
+        connections: int = 0
+        pools: any = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool: any = pools.get(key)
+            if pool is not None:
+                requests_sent += pool.num_requests
+                connections += pool.num_connections
+        return requests_sent - connections, connections
+
+    def report(self) -> str:
+        """Get a line describing how well connections have been reused"""
+        hits, misses = self.stats()
+        rate: float = hits / (hits + misses) * 100 if hits + misses else 0.0
+        return f"Connection pool of {self.size}: {hits} reused, {misses} opened, {rate:.1f}% hit rate"
+
+    def close(self) -> None:
+        """Close every pooled connection"""
+        self.adapter.close()
+
+# < ======================================================================================================
+# < Pooled Http Class
+# < ======================================================================================================
+
+class PooledHttp:
+
+    def __init__(self, credentials: Credentials, pool: ConnectionPool) -> None:
+        """Initialise an httplib2 compatible http object, as googleapiclient expects, backed by an AuthorizedSession
+
+        The session refreshes credentials as needed and sends requests through the connections of pool, it is never
+        closed itself as that would close the adapter it shares with every other session on pool"""
+        self.credentials: Credentials = credentials
+        self.pool: ConnectionPool = pool
+        self.session: AuthorizedSession = AuthorizedSession(credentials)
+        self.session.mount("https://", pool.adapter)
+        self.session.mount("http://", pool.adapter)
+
+    def request(self, uri: str, method: str = "GET", body: bytes | str | None = None, headers: dict | None = None, redirections: int = 5, connection_type: any = None) -> tuple[Response, bytes]:
+        """Send a request and return the response and content the way httplib2.Http.request does"""
+
+        if body is not None and not isinstance(body, (bytes, str)):
+            body = body.read() # < A slice of a streamed resumable upload, never more than one chunk
+
+        try:
+            response: requests.Response = self.session.request(method, uri, data = body, headers = headers, timeout = self.pool.timeout, allow_redirects = redirections > 0)
+        except requests.exceptions.Timeout as e:
+            raise TimeoutError(str(e)) from e # < Keeps the retries in googleapiclient and ratelimit working unchanged
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+
+        info: dict[str, str] = {key.lower(): value for key, value in response.headers.items()}
+        if "content-encoding" in info:
+            info["-content-encoding"] = info.pop("content-encoding") # < Content is already decoded, as httplib2 does
+        info["status"] = str(response.status_code)
+        output: Response = Response(info)
+        output.reason = response.reason
+        return output, response.content
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
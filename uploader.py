@@ -4,11 +4,178 @@
 # < ======================================================================================================
 
 import os
+import asyncio
 import logging
 import mimetypes
+import tracing
+from dataclasses import dataclass, field
+from functools import cached_property
 from datetime import datetime
+from typing import Callable, Iterable
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
+from engine import UploadEngine, UploadListener
+from folders import FolderBatcher
+from hashcache import HashCache
+from ignore import IgnoreRules
+from journal import PENDING, Journal, JournalListener
+from ratelimit import BandwidthLimiter, RateLimiter
+from scheduling import SchedulingPolicy, make_policy
+from transport import ConnectionPool
+from resumable import SessionStore, upload_file_resumable
+from walker import prefetch, walk
 
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+MB: int = 1024 * 1024
+VERIFY_FIELDS: str = 'id, md5Checksum, size'
+
+# < ======================================================================================================
+# < Exceptions
+# < ======================================================================================================
+
+class UploadVerificationError(Exception):
+    """Raised when a file still differs from its local copy after every verification retry"""
+
+# < ======================================================================================================
+# < Upload Options Class
+# < ======================================================================================================
+
+@dataclass
+class UploadOptions:
+    """Tunable upload behaviour, usually built from settings.json using UploadOptions.from_settings"""
+    workers: int = 1
+    queue_size: int = 1000
+    resumable_threshold: int = 8 * MB
+    chunk_size: int = 8 * MB
+    session_dir: str = "sessions"
+    sync: bool = False
+    sync_folder_name: str = "sync"
+    watch: bool = False
+    watch_settle: float = 2.0
+    watch_poll_interval: float = 10.0
+    manifest_path: str = "manifest.json"
+    folder_index_path: str = "folders.db"
+    ignored_patterns: list[str] = field(default_factory = list)
+    ignore_files: list[str] = field(default_factory = lambda: [".gitignore"])
+    pack_threshold: int = 64 * 1024
+    pack_target: int = 64 * MB
+    deduplicate: bool = False
+    dedup_threshold: int = 256 * 1024
+    hash_cache_path: str = "hashes.db"
+    hash_workers: int = 2
+    hash_processes: int = 0
+    verify: bool = False
+    verify_retries: int = 2
+    journal_path: str = ""
+    scheduling_policy: str = "fifo"
+    bandwidth_limit: int = 0
+    bandwidth_hours: tuple[int, int] | None = None
+    transport: str = "httplib2"
+    upload_engine: str = "threads"
+    async_limits: dict[str, int] = field(default_factory = dict)
+    trace_path: str = ""
+    requests_per_second: float = 20.0
+    request_burst: int = 40
+    max_retries: int = 8
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "UploadOptions":
+        """Build options from a settings dictionary, using defaults for any missing keys"""
+        return cls(
+            workers = settings.get("UPLOAD_WORKERS", cls.workers),
+            queue_size = settings.get("QUEUE_SIZE", cls.queue_size),
+            resumable_threshold = int(settings.get("RESUMABLE_THRESHOLD_MB", cls.resumable_threshold / MB) * MB),
+            chunk_size = int(settings.get("CHUNK_SIZE_MB", cls.chunk_size / MB) * MB),
+            session_dir = settings.get("SESSION_DIR", cls.session_dir),
+            sync = settings.get("SYNC_MODE", cls.sync),
+            sync_folder_name = settings.get("SYNC_FOLDER_NAME", cls.sync_folder_name),
+            watch = settings.get("WATCH_MODE", cls.watch),
+            watch_settle = settings.get("WATCH_SETTLE_SECONDS", cls.watch_settle),
+            watch_poll_interval = settings.get("WATCH_POLL_SECONDS", cls.watch_poll_interval),
+            manifest_path = settings.get("MANIFEST_PATH", cls.manifest_path),
+            folder_index_path = settings.get("FOLDER_INDEX_PATH", cls.folder_index_path),
+            ignored_patterns = settings.get("IGNORED_PATTERNS", []),
+            ignore_files = settings.get("IGNORE_FILES", [".gitignore"]),
+            pack_threshold = int(settings.get("PACK_THRESHOLD_KB", cls.pack_threshold / 1024) * 1024),
+            pack_target = int(settings.get("PACK_TARGET_MB", cls.pack_target / MB) * MB),
+            deduplicate = settings.get("DEDUPLICATE", cls.deduplicate),
+            dedup_threshold = int(settings.get("DEDUP_THRESHOLD_KB", cls.dedup_threshold / 1024) * 1024),
+            hash_cache_path = settings.get("HASH_CACHE_PATH", cls.hash_cache_path),
+            hash_workers = settings.get("HASH_WORKERS", cls.hash_workers),
+            hash_processes = settings.get("HASH_PROCESSES", cls.hash_processes),
+            verify = settings.get("VERIFY_UPLOADS", cls.verify),
+            verify_retries = settings.get("VERIFY_RETRIES", cls.verify_retries),
+            journal_path = settings.get("JOURNAL_PATH", cls.journal_path),
+            scheduling_policy = settings.get("SCHEDULING_POLICY", cls.scheduling_policy),
+            bandwidth_limit = int(settings.get("BANDWIDTH_LIMIT_MBPS", 0) * MB),
+            bandwidth_hours = tuple(settings["BANDWIDTH_LIMIT_HOURS"]) if settings.get("BANDWIDTH_LIMIT_HOURS") else None,
+            transport = settings.get("TRANSPORT", cls.transport),
+            upload_engine = settings.get("UPLOAD_ENGINE", cls.upload_engine),
+            async_limits = settings.get("ASYNC_LIMITS", {}),
+            trace_path = settings.get("TRACE_PATH", cls.trace_path),
+            requests_per_second = settings.get("REQUESTS_PER_SECOND", cls.requests_per_second),
+            request_burst = settings.get("REQUEST_BURST", cls.request_burst),
+            max_retries = settings.get("MAX_RETRIES", cls.max_retries)
+        )
+
+    @cached_property
+    def ignore_rules(self) -> IgnoreRules:
+        """IGNORED_PATTERNS compiled once, applied relative to each uploaded folder"""
+        return IgnoreRules(self.ignored_patterns)
+
+    @cached_property
+    def rate_limiter(self) -> RateLimiter:
+        """Limiter shared by every Drive service used for these uploads, allowing one request in flight per worker at most"""
+        bandwidth: BandwidthLimiter | None = BandwidthLimiter(self.bandwidth_limit, self.bandwidth_hours) if self.bandwidth_limit > 0 else None
+        return RateLimiter(self.requests_per_second, self.request_burst, self.workers, self.max_retries, bandwidth = bandwidth)
+
+    @cached_property
+    def connection_pool(self) -> ConnectionPool | None:
+        """Keep-alive connections shared by every Drive service when transport is 'pooled', one per worker plus one for
+        the folder batches sent from the calling thread, or None to give each service its own httplib2 transport"""
+        if self.transport != "pooled":
+            return None
+        return ConnectionPool(self.workers + 1)
+
+    def make_policy(self) -> SchedulingPolicy:
+        """Get a new instance of the scheduling policy named by scheduling_policy, files from resumable_threshold up count as large"""
+        return make_policy(self.scheduling_policy, self.workers, self.resumable_threshold)
+
+    @cached_property
+    def session_store(self) -> SessionStore:
+        """Resumable sessions saved in session_dir, which a later run can only resume when it uploads into the same
+        folders, so they are only saved with the journal, which reuses the dated subfolder, or in sync or watch mode.
+        Sessions older than Drive keeps them are pruned on first use"""
+        if not (self.journal_path or self.sync or self.watch):
+            return SessionStore(None)
+        store: SessionStore = SessionStore(self.session_dir)
+        store.prune()
+        return store
+
+    @cached_property
+    def hash_cache(self) -> HashCache:
+        """Local md5 and Drive copy cache at HASH_CACHE_PATH, opened on first use and shared by every upload"""
+        return HashCache(self.hash_cache_path, self.hash_workers, self.hash_processes)
+
+    def close(self) -> None:
+        """Close the hash cache if it was opened, stopping its hashing pools, it is opened again if the options are reused"""
+        hash_cache: HashCache | None = vars(self).pop("hash_cache", None)
+        if hash_cache is not None:
+            hash_cache.close()
+
+    def prefetch_hash(self, filepath: str) -> None:
+        """Start hashing a file that is about to be queued, if deduplication or verification will need its md5"""
+        if self.verify:
+            self.hash_cache.prefetch(filepath)
+        elif self.deduplicate:
+            try:
+                if os.path.getsize(filepath) >= self.dedup_threshold:
+                    self.hash_cache.prefetch(filepath)
+            except OSError:
+                pass
 # < ======================================================================================================
 # < Functions
 # < ======================================================================================================
@@ -20,10 +187,6 @@ def get_dated_folder_name() -> str:
     folder_name: str = f"{current_date}_{current_time}"
     return folder_name
 
-def should_ignore(name: str, ignored_patterns: list[str]) -> bool:
-    """Determine if a file or folder should be ignored based on the ignored patterns"""
-    return any(pattern.lower() in name.lower() for pattern in ignored_patterns)
-
 def create_folder(folder_name: str, drive_service: any, parent_folder_id: str = None) -> str:
     """Create a folder on google drive"""
 
@@ -41,54 +204,322 @@ def create_folder(folder_name: str, drive_service: any, parent_folder_id: str =
 
     return identifier
 
-def upload_file(filepath: str, drive_service: any, folder_id: str = None) -> str:
-    """Upload a given file to an existing folder on Google Drive"""
+def copy_file(source_id: str, filepath: str, drive_service: any, folder_id: str = None) -> str | None:
+    """Copy an existing Drive file into folder_id under the name of filepath, returning None if the source is gone"""
+    file_metadata = {'name': os.path.basename(filepath)}
+    if folder_id is not None:
+        file_metadata['parents'] = [folder_id]
+    try:
+        file = drive_service.files().copy(fileId = source_id, body = file_metadata, fields = 'id').execute()
+    except HttpError as e:
+        if e.resp.status in (403, 404):
+            return None
+        raise
+    return file.get('id')
+
+def upload_file(filepath: str, drive_service: any, folder_id: str = None, options: UploadOptions = None, listener: UploadListener = None, file_id: str = None) -> str:
+    """Upload a given file to an existing folder on Google Drive, using a resumable session for files above the size threshold
+
+    If file_id is given the content of that existing Drive file is replaced in place instead of creating a new file.
+    With options.deduplicate, a new file whose md5 matches a file already on Drive is copied server-side instead.
+    With options.verify, the md5Checksum and size Drive returns are checked against the local file, hashed in the
+    background since it was queued, and a mismatched upload is sent again over the same Drive file"""
 
     logging.info(f"Uploading file: {filepath}")
 
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+    listener.check_cancelled()
+
     mimetype, _ = mimetypes.guess_type(filepath)
-    media = MediaFileUpload(filepath, mimetype = mimetype)
     filename = os.path.basename(filepath)
     file_metadata = {'name': os.path.basename(filename)}
     if folder_id is not None:
         file_metadata['parents'] = [folder_id]
-    file = drive_service.files().create(body = file_metadata, media_body = media, fields = 'id').execute()
-    return file.get('id')
 
-def upload_folder(local_folder_path: str, drive_service: any, folder_id: str = None) -> None:
-    """Upload a given folder to an existing folder on Google Drive"""
+    size: int = os.path.getsize(filepath)
+    listener.file_started(filepath, size)
+
+    md5: str | None = None
+    file: dict | None = None
+    fields: str = VERIFY_FIELDS if options.verify else 'id'
+
+    def send(target_id: str | None) -> dict:
+        if size >= options.resumable_threshold:
+            def progress_callback(bytes_sent: int, total: int) -> None:
+                listener.file_progress(filepath, bytes_sent, total)
+                listener.check_cancelled() # < The session is already saved, so a cancelled upload resumes next time
+            return upload_file_resumable(filepath, drive_service, file_metadata, mimetype, options.chunk_size, options.session_store, folder_id, progress_callback, target_id, options.rate_limiter, fields)
+        media = MediaFileUpload(filepath, mimetype = mimetype)
+        if target_id is not None:
+            request = drive_service.files().update(fileId = target_id, media_body = media, fields = fields)
+        else:
+            request = drive_service.files().create(body = file_metadata, media_body = media, fields = fields)
+        sent: dict = request.execute()
+        listener.file_progress(filepath, size, size)
+        return sent
+
+    def mismatch(sent: dict) -> str | None:
+        nonlocal md5
+        if 'md5Checksum' not in sent:
+            return None # < Nothing to compare against, such as when uploading to a Google Docs type
+        md5 = md5 or options.hash_cache.md5(filepath)
+        if sent['md5Checksum'] != md5 or int(sent.get('size', size)) != size:
+            return f"Drive holds {sent.get('size')} bytes with md5 {sent['md5Checksum']}, local file has {size} bytes with md5 {md5}"
+        return None
+
+    try:
+        if options.deduplicate and file_id is None and size >= options.dedup_threshold:
+            md5 = options.hash_cache.md5(filepath)
+            source_id: str | None = options.hash_cache.find_remote(md5)
+            if source_id is not None:
+                copied_id: str | None = copy_file(source_id, filepath, drive_service, folder_id)
+                if copied_id is not None:
+                    logging.info(f"Copied identical Drive file {source_id} instead of uploading {filepath}")
+                    file = {'id': copied_id}
+                    listener.file_progress(filepath, size, size)
+                else:
+                    options.hash_cache.forget_remote(md5)
+
+        if file is None: # < Otherwise it was copied server-side and there is nothing to send
+            file = send(file_id)
+            for attempt in range(options.verify_retries + 1 if options.verify else 0):
+                problem: str | None = mismatch(file)
+                if problem is None:
+                    break
+                logging.warning(f"Verification of {filepath} failed on attempt {attempt + 1}: {problem}")
+                if attempt == options.verify_retries:
+                    raise UploadVerificationError(f"{filepath} failed verification: {problem}")
+                listener.check_cancelled()
+                file = send(file['id'])
+    except Exception as e:
+        listener.file_failed(filepath, e)
+        raise
+
+    identifier: str = file.get('id')
+    if md5 is not None:
+        options.hash_cache.record_remote(md5, identifier)
+    listener.file_done(filepath, identifier)
+    return identifier
+
+def upload_folder(local_folder_path: str, drive_service: any, folder_id: str = None, engine: UploadEngine = None, options: UploadOptions = None, listener: UploadListener = None) -> None:
+    """Upload a given folder to an existing folder on Google Drive, queueing files on engine if one is given"""
+    upload_folders([local_folder_path], drive_service, folder_id, engine, options, listener)
+
+def upload_folders(local_folder_paths: list[str], drive_service: any, folder_id: str = None, engine: UploadEngine = None, options: UploadOptions = None, listener: UploadListener = None, journal: Journal = None) -> None:
+    """Upload given folders to an existing folder on Google Drive, creating the remote tree in batch requests
 
-    logging.info(f"Uploading folder: {local_folder_path}")
+    Directories are scanned breadth first on a background thread, at most options.queue_size entries ahead, so every
+    folder is queued on the FolderBatcher after its parent, and each file is handed to engine, or uploaded on the
+    calling thread, as soon as the batch creating its folder returns, while the scan carries on.
+    Folders and files journal records as already uploaded are reused and skipped"""
 
-    folder_name: str = os.path.basename(local_folder_path)
-    created_folder_id: str = create_folder(folder_name, drive_service, folder_id)
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+    journal = journal or Journal()
+
+    def schedule(filepath: str, size: int, parent_folder_id: str) -> None:
+        if journal.is_done(filepath):
+            return
+        journal.record(filepath, PENDING)
+        options.prefetch_hash(filepath)
+        if engine is not None:
+            engine.submit(upload_file, filepath, folder_id = parent_folder_id, options = options, listener = listener, size = size)
+        else:
+            upload_file(filepath, drive_service, parent_folder_id, options, listener)
 
-    for item in os.listdir(local_folder_path):
+    batcher: FolderBatcher = FolderBatcher(drive_service, max_waiting = options.queue_size, limiter = options.rate_limiter)
+    folder_ids: dict[str, str] = {}
 
-        if should_ignore(item):
-            logging.info(f"Ignoring {item} as it matches one of the patterns in IGNORED_PATTERNS")
-            continue
+    for local_folder_path in local_folder_paths:
+        logging.info(f"Uploading folder: {local_folder_path}")
+        folder_ids[local_folder_path] = journal.add_folder(batcher, local_folder_path, folder_id)
 
-        local_item_path = os.path.join(local_folder_path, item)
+    for parent_path, entry in prefetch(walk(local_folder_paths, options.ignore_rules, options.ignore_files), options.queue_size):
 
-        if os.path.isdir(local_item_path):
-            upload_folder(local_item_path, drive_service, created_folder_id)
+        listener.check_cancelled()
+        parent_folder_id: str = folder_ids[parent_path]
+
+        if entry.is_dir():
+            folder_ids[entry.path] = journal.add_folder(batcher, entry.path, parent_folder_id)
         else:
-            upload_file(local_item_path, drive_service, created_folder_id)
+            batcher.when_created(parent_folder_id, lambda filepath = entry.path, size = entry.stat().st_size, parent_folder_id = parent_folder_id: schedule(filepath, size, parent_folder_id))
+
+    batcher.flush()
+    logging.info(f"Created folder tree for {len(local_folder_paths)} folder(s) using {batcher.requests} request(s)")
+
+def destination_ids(folder_id: str | list[str] | None) -> list[str | None]:
+    """Get the destination folder IDs from a FOLDER_ID setting, which is either one ID or a list of them"""
+    if folder_id is None or isinstance(folder_id, str):
+        return [folder_id]
+    return list(folder_id) or [None]
+
+def upload_mixed(drive_service: any, filepaths: list[str], folderpaths: list[str], folder_id: str | list[str] = None, options: UploadOptions = None, service_factory: Callable[[], any] = None, listener: UploadListener = None, packed_folderpaths: list[str] = None, credentials: any = None, root_url: str = None) -> None:
+    """Create dated subfolder within folder denoted by folder_id, and upload to it using given local filepaths and folderpaths
+
+    Folders are created in batches on the calling thread using drive_service, so each exists before any file is queued into it,
+    while files are uploaded by a pool of options.workers workers that each build their own Drive service from service_factory.
+    The shared drive_service is not thread-safe, so without a service_factory everything runs on the calling thread.
+    Folders in packed_folderpaths have their small files packed into archives by packer.upload_packed_folders.
+    With options.journal_path set, progress is journalled so running the same job again after it died part way
+    through resumes it inside the same dated subfolder, uploading only what is left.
+    With options.sync set, uploads go to a stable folder through sync.sync_mixed instead of a new dated subfolder.
+    With options.watch set, they go there through watcher.watch_mixed, which then keeps uploading files as they change
+    and only returns once the listener cancels it.
+    folder_id may be a list, every file is then uploaded once into the first folder and the finished dated subfolder
+    is copied server-side into each of the others by fanout.mirror_tree, so the bytes sent do not grow per destination.
+    With options.trace_path set, every scan, hash, queue wait, request and retry is traced, written there as a Chrome
+    trace and summarised in the log once the job ends, see tracing.summary.
+    The asyncio engine sends its own requests, so it needs the credentials drive_service was built with, and root_url
+    if drive_service points somewhere other than Google, without credentials the threaded engine is used"""
+
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+
+    with tracing.traced(options.trace_path):
+        packed_folderpaths = packed_folderpaths or []
+        folder_ids: list[str | None] = destination_ids(folder_id)
+        folder_id = folder_ids[0]
+
+        if options.sync or options.watch:
+            from sync import sync_mixed
+            from watcher import watch_mixed
+            if packed_folderpaths:
+                logging.info("Packing is not available in sync mode, packed folders will be synced file by file")
+            if len(folder_ids) > 1:
+                logging.info(f"Sync mode only syncs into the first destination folder {folder_id}, {len(folder_ids) - 1} other(s) ignored")
+            (watch_mixed if options.watch else sync_mixed)(drive_service, filepaths, folderpaths + packed_folderpaths, folder_id, options, service_factory, listener)
+            return
+
+        from fanout import mirror_tree
+        from packer import upload_packed_folders
+
+        if options.upload_engine == "asyncio" and credentials is None:
+            logging.warning("The asyncio engine needs the credentials to send its own requests and none were given, using the threaded engine")
+        elif options.upload_engine == "asyncio":
+            try:
+                from asyncengine import ROOT_URL, upload_mixed_async
+            except ImportError as e:
+                logging.info(f"The asyncio engine is not available ({e}), install aiohttp to use it, using the threaded engine")
+            else:
+                if packed_folderpaths:
+                    logging.info("Packing is not available with the asyncio engine, packed folders will be uploaded file by file")
+                unsupported: list[str] = [name for name, enabled in (("DEDUPLICATE", options.deduplicate), ("VERIFY_UPLOADS", options.verify), ("JOURNAL_PATH", options.journal_path)) if enabled]
+                if unsupported:
+                    logging.warning(f"The asyncio engine does not support {', '.join(unsupported)}, which will be ignored, use the threaded engine for them")
+                subfolder_id: str = asyncio.run(upload_mixed_async(credentials, filepaths, folderpaths + packed_folderpaths, folder_id, options, listener, root_url or ROOT_URL))
+                for destination_id in folder_ids[1:]:
+                    listener.check_cancelled()
+                    mirror_tree(drive_service, subfolder_id, destination_id, options.rate_limiter)
+                logging.info("upload_mixed ran without error")
+                return
+
+        journal: Journal = Journal()
+        if options.journal_path:
+            key: str = Journal.job_key(folder_id, sorted(map(os.path.abspath, filepaths)), sorted(map(os.path.abspath, folderpaths)), sorted(map(os.path.abspath, packed_folderpaths)))
+            journal = Journal(options.journal_path, key)
+        listener = JournalListener(journal, listener)
+
+        try:
+
+            if journal.resumed:
+                subfolder_id: str = journal.subfolder_id
+                logging.info(f"Resuming interrupted upload into existing subfolder {subfolder_id}")
+            else:
+                subfolder_name: str = get_dated_folder_name()
+                subfolder_id: str = create_folder(subfolder_name, drive_service, folder_id)
+                journal.start(subfolder_id)
+
+            def schedule_files(engine: UploadEngine | None) -> None:
+                for filepath in filepaths:
+                    if journal.is_done(filepath):
+                        continue
+                    journal.record(filepath, PENDING)
+                    if engine is not None:
+                        options.prefetch_hash(filepath)
+                        engine.submit(upload_file, filepath, folder_id = subfolder_id, options = options, listener = listener, size = os.path.getsize(filepath))
+                    else:
+                        upload_file(filepath, drive_service, subfolder_id, options, listener)
+
+            if service_factory is None:
+
+                upload_folders(folderpaths, drive_service, subfolder_id, None, options, listener, journal)
+                upload_packed_folders(packed_folderpaths, drive_service, subfolder_id, None, options, listener, journal)
+                schedule_files(None)
+
+            else:
+
+                with UploadEngine(service_factory, options.workers, options.queue_size, options.make_policy()) as engine:
+
+                    upload_folders(folderpaths, drive_service, subfolder_id, engine, options, listener, journal)
+                    upload_packed_folders(packed_folderpaths, drive_service, subfolder_id, engine, options, listener, journal)
+                    schedule_files(engine)
+
+            for destination_id in folder_ids[1:]:
+                listener.check_cancelled()
+                mirror_tree(drive_service, subfolder_id, destination_id, options.rate_limiter)
+
+            journal.finish()
+
+        finally:
+            journal.close()
+            if options.connection_pool is not None:
+                logging.info(options.connection_pool.report())
+
+        logging.info("upload_mixed ran without error")
+
+def upload_stream(drive_service: any, paths: Iterable[str], folder_id: str | list[str] = None, options: UploadOptions = None, service_factory: Callable[[], any] = None, listener: UploadListener = None) -> str:
+    """Create dated subfolder within folder denoted by folder_id and upload each file or folder to it as paths yields it, returning its ID
+
+    paths is consumed lazily, so it can be lines read from stdin: each file is queued on the same bounded UploadEngine
+    upload_mixed uses as soon as it is read, and each folder is walked then, so memory stays flat however many paths there are.
+    Paths that are neither a file nor a folder are reported to listener.file_failed and skipped. Sync, watch, packing,
+    journalling and the asyncio engine all need the whole job up front, so they are not available here"""
+
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+
+    with tracing.traced(options.trace_path):
+        from fanout import mirror_tree
+        folder_ids: list[str | None] = destination_ids(folder_id)
+        if options.sync or options.watch or options.upload_engine != "threads":
+            logging.info("Streamed uploads always go to a new dated subfolder through the threaded engine, sync, watch and engine settings are ignored")
+
+        subfolder_id: str = create_folder(get_dated_folder_name(), drive_service, folder_ids[0])
+        engine: UploadEngine | None = None if service_factory is None else UploadEngine(service_factory, options.workers, options.queue_size, options.make_policy())
+
+        try:
+
+            for path in paths:
+                listener.check_cancelled()
+                if os.path.isdir(path):
+                    upload_folders([path], drive_service, subfolder_id, engine, options, listener)
+                elif not os.path.isfile(path):
+                    logging.info(f"Skipping {path} as it is not a file or folder")
+                    listener.file_failed(path, FileNotFoundError(f"No such file or folder: {path}"))
+                elif engine is not None:
+                    options.prefetch_hash(path)
+                    engine.submit(upload_file, path, folder_id = subfolder_id, options = options, listener = listener, size = os.path.getsize(path))
+                else:
+                    upload_file(path, drive_service, subfolder_id, options, listener)
 
-def upload_mixed(drive_service: any, filepaths: list[str], folderpaths: list[str], folder_id: str = None) -> None:
-    """Create dated subfolder within folder denoted by folder_id, and upload to it using given local filepaths and folderpaths"""
+            listener.check_cancelled() # < Cancelled while waiting on a path that never came
 
-    subfolder_name: str = get_dated_folder_name()
-    subfolder_id: str = create_folder(subfolder_name, drive_service, folder_id)
+            if engine is not None:
+                engine.join()
 
-    for folderpath in folderpaths:
-        upload_folder(folderpath, drive_service, subfolder_id)
+            for destination_id in folder_ids[1:]:
+                listener.check_cancelled()
+                mirror_tree(drive_service, subfolder_id, destination_id, options.rate_limiter)
 
-    for filepath in filepaths:
-        upload_file(filepath, drive_service, subfolder_id)
+        finally:
+            if engine is not None:
+                engine.shutdown(cancel = True)
+            if options.connection_pool is not None:
+                logging.info(options.connection_pool.report())
 
-    logging.info("upload_mixed ran without error")
+        logging.info("upload_stream ran without error")
+        return subfolder_id
 
 # < ======================================================================================================
 # < Execution
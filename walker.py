@@ -0,0 +1,189 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import queue
+import logging
+import time
+import threading
+import tracing
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+from ignore import IgnoreMatcher, IgnoreRules
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+DONE: object = object() # < Marks the end of a prefetched iterator
+
+# < ======================================================================================================
+# < Directory Totals Class
+# < ======================================================================================================
+
+@dataclass
+class DirectoryTotals:
+    """What a scan found directly inside one directory, valid while its modification time is unchanged"""
+    mtime: int
+    files: int
+    size: int
+    ignored: int
+    subdirectories: list[str]
+    ignore_filepaths: list[str]
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def walk(roots: Iterable[str], rules: IgnoreRules = None, ignore_filenames: Iterable[str] = (), on_ignored: Callable[[os.DirEntry], None] = None, ordered: bool = False) -> Iterator[tuple[str, os.DirEntry]]:
+    """Yield (parent_path, entry) for everything below the given root folders that is not ignored, breadth first
+
+    Entries come straight from os.scandir, so entry.is_dir() and entry.stat() reuse what the directory listing
+    already returned instead of making a separate stat call per entry. Entries are checked against rules, applied
+    relative to each root, and against any ignore files named in ignore_filenames found along the way, ignored
+    folders are pruned without being descended into and every ignored entry is passed to on_ignored. With ordered set,
+    each directory's entries are sorted by name, so an unchanged tree is always walked in the same order"""
+
+    rules = rules or IgnoreRules([])
+    ignore_filenames = set(ignore_filenames)
+    directories: deque[tuple[str, IgnoreMatcher]] = deque((root, IgnoreMatcher(rules, root)) for root in roots)
+
+    while directories:
+
+        directory, matcher = directories.popleft()
+
+        with tracing.span("scandir", "scan", path = directory), os.scandir(directory) as iterator:
+            entries: list[os.DirEntry] = list(iterator)
+        if ordered:
+            entries.sort(key = lambda entry: entry.name)
+
+        if ignore_filenames:
+            matcher = matcher.child(directory, [entry.path for entry in entries if entry.name in ignore_filenames and entry.is_file()])
+
+        for entry in entries:
+            is_dir: bool = entry.is_dir()
+            if matcher.is_ignored(entry.path, entry.name, is_dir):
+                logging.info(f"Ignoring {entry.path} as it matches an ignore rule")
+                if on_ignored is not None:
+                    on_ignored(entry)
+                continue
+            if is_dir:
+                directories.append((entry.path, matcher))
+            yield directory, entry
+
+def scan_directory(directory: str, matcher: IgnoreMatcher, ignore_filenames: set[str]) -> DirectoryTotals:
+    """Count what is directly inside directory, applying ignore rules exactly as walk does"""
+
+    with os.scandir(directory) as iterator:
+        entries: list[os.DirEntry] = list(iterator)
+
+    ignore_filepaths: list[str] = [entry.path for entry in entries if entry.name in ignore_filenames and entry.is_file()]
+    matcher = matcher.child(directory, ignore_filepaths) if ignore_filepaths else matcher
+    totals: DirectoryTotals = DirectoryTotals(os.stat(directory).st_mtime_ns, 0, 0, 0, [], ignore_filepaths)
+
+    for entry in entries:
+        is_dir: bool = entry.is_dir()
+        if matcher.is_ignored(entry.path, entry.name, is_dir):
+            totals.ignored += 1
+        elif is_dir:
+            totals.subdirectories.append(entry.path)
+        else:
+            totals.files += 1
+            try:
+                totals.size += entry.stat().st_size
+            except OSError:
+                pass
+
+    return totals
+
+def scan(root: str, rules: IgnoreRules = None, ignore_filenames: Iterable[str] = (), cache: dict[str, DirectoryTotals] = None, on_progress: Callable[[int, int, int], None] = None, interval: float = 0.25) -> tuple[int, int, int]:
+    """Count the files, total bytes and ignored entries below root, without descending into ignored folders
+
+    Each directory's counts are kept in cache, keyed by path, and reused while its modification time is unchanged,
+    so scanning a folder again only lists the directories that gained or lost entries since. Sizes of files changed
+    in place are not noticed until their directory changes, which is fine for an estimate. on_progress receives the
+    running totals at most once per interval seconds"""
+
+    rules = rules or IgnoreRules([])
+    ignore_filenames = set(ignore_filenames)
+    cache = {} if cache is None else cache
+    directories: deque[tuple[str, IgnoreMatcher]] = deque([(root, IgnoreMatcher(rules, root))])
+    files: int = 0
+    size: int = 0
+    ignored: int = 0
+    reported: float = time.monotonic()
+
+    while directories:
+
+        directory, matcher = directories.popleft()
+
+        totals: DirectoryTotals | None = cache.get(directory)
+        if totals is None or totals.mtime != os.stat(directory).st_mtime_ns:
+            totals = scan_directory(directory, matcher, ignore_filenames)
+            cache[directory] = totals
+
+        files += totals.files
+        size += totals.size
+        ignored += totals.ignored
+        if totals.ignore_filepaths:
+            matcher = matcher.child(directory, totals.ignore_filepaths)
+        directories.extend((subdirectory, matcher) for subdirectory in totals.subdirectories)
+
+        if on_progress is not None and time.monotonic() - reported >= interval:
+            reported = time.monotonic()
+            on_progress(files, size, ignored)
+
+    return files, size, ignored
+
+def prefetch(iterator: Iterable, size: int) -> Iterator:
+    """Run iterator on a background thread, buffering at most size items ahead of the consumer
+
+    Lets a slow scan and the work consuming it overlap, while memory stays bounded by size rather than by the
+    length of the iterator, errors raised by the iterator are re-raised to the consumer"""
+
+    buffer: queue.Queue = queue.Queue(maxsize = max(1, size))
+    stopped: threading.Event = threading.Event()
+
+    def put(item: object) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout = 0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((DONE, e))
+        else:
+            put((DONE, None))
+
+    thread: threading.Thread = threading.Thread(target = produce, name = "scanner", daemon = True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")
@@ -0,0 +1,375 @@
+# < ======================================================================================================
+# < Imports
+# < ======================================================================================================
+
+import os
+import sys
+import time
+import ctypes
+import select
+import struct
+import logging
+from collections import deque
+from concurrent.futures import Future, wait
+from typing import Callable
+from googleapiclient.errors import HttpError
+from engine import UploadEngine, UploadListener
+from folderindex import FolderIndex
+from folders import FolderBatcher
+from ignore import IgnoreMatcher, IgnoreRules
+from sync import Manifest, sync_file, sync_mixed
+from uploader import UploadOptions
+
+# < ======================================================================================================
+# < Constants
+# < ======================================================================================================
+
+IN_MODIFY: int = 0x00000002
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+IN_DELETE_SELF: int = 0x00000400
+IN_Q_OVERFLOW: int = 0x00004000
+IN_IGNORED: int = 0x00008000
+IN_ONLYDIR: int = 0x01000000
+IN_ISDIR: int = 0x40000000
+
+WATCH_MASK: int = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER: struct.Struct = struct.Struct("iIII") # < wd, mask, cookie, len, followed by len bytes of NUL padded name
+READ_SIZE: int = 64 * 1024
+IDLE_TIMEOUT: float = 1.0 # < How often an idle watch wakes to check for cancellation
+
+# < ======================================================================================================
+# < Inotify Watcher Class
+# < ======================================================================================================
+
+class InotifyWatcher:
+
+    def __init__(self, roots: list[str], rules: IgnoreRules = None, ignore_filenames: list[str] = ()) -> None:
+        """Initialise a watch on every folder below roots through Linux inotify, called through ctypes from libc
+
+        Folders created or moved in later are watched as they appear, ignored folders are never watched,
+        and the kernel queues events while nothing reads them, so a watch that is not read costs nothing"""
+        self.libc: any = ctypes.CDLL(None, use_errno = True)
+        self.fd: int = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self.rules: IgnoreRules = rules or IgnoreRules([])
+        self.ignore_filenames: set[str] = set(ignore_filenames)
+        self.directories: dict[int, tuple[str, str, IgnoreMatcher]] = {} # < Watch descriptor to (directory, root, matcher)
+        for root in roots:
+            self.add_tree(root, root, IgnoreMatcher(self.rules, root))
+        logging.info(f"Watching {len(self.directories)} folders through inotify")
+
+    def add_tree(self, directory: str, root: str, matcher: IgnoreMatcher) -> list[tuple[str, str]]:
+        """Watch directory and every folder below it that is not ignored, returning the (root, filepath) of each file found
+
+        The files are returned because any written before the watch was in place would otherwise never be reported"""
+
+        found: list[tuple[str, str]] = []
+        directories: deque[tuple[str, IgnoreMatcher]] = deque([(directory, matcher)])
+
+        while directories:
+
+            directory, matcher = directories.popleft()
+            watch: int = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if watch < 0:
+                logging.info(f"An error occurred watching {directory}: {os.strerror(ctypes.get_errno())}. Skipping it")
+                continue
+
+            try:
+                with os.scandir(directory) as iterator:
+                    entries: list[os.DirEntry] = list(iterator)
+            except OSError as e:
+                logging.info(f"An error occurred listing {directory}: {e}. Skipping it")
+                continue
+
+            if self.ignore_filenames:
+                matcher = matcher.child(directory, [entry.path for entry in entries if entry.name in self.ignore_filenames and entry.is_file()])
+            self.directories[watch] = (directory, root, matcher) # < Adding an existing inode again returns its descriptor, so moves update the path
+
+            for entry in entries:
+                is_dir: bool = entry.is_dir()
+                if matcher.is_ignored(entry.path, entry.name, is_dir):
+                    continue
+                if is_dir:
+                    directories.append((entry.path, matcher))
+                elif entry.is_file():
+                    found.append((root, entry.path))
+
+        return found
+
+    def read(self, timeout: float | None) -> tuple[set[tuple[str, str]], bool]:
+        """Wait up to timeout seconds for events, returning the (root, filepath) of each file written or moved in,
+        and whether events were lost or the ignore rules changed so that only a full rescan can be trusted"""
+
+        changed: set[tuple[str, str]] = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed, False
+
+        try:
+            data: bytes = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return changed, False
+
+        rescan: bool = False
+        offset: int = 0
+
+        while offset < len(data):
+
+            watch, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name: str = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                logging.info("The inotify event queue overflowed, events were lost")
+                rescan = True
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self.directories.pop(watch, None)
+                continue
+            if watch not in self.directories or not name:
+                continue
+
+            directory, root, matcher = self.directories[watch]
+            path: str = os.path.join(directory, name)
+
+            if name in self.ignore_filenames and not mask & IN_ISDIR:
+                logging.info(f"Ignore file {path} changed, rescanning")
+                rescan = True
+            elif matcher.is_ignored(path, name, bool(mask & IN_ISDIR)):
+                continue
+            elif mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self.add_tree(path, root, matcher))
+            else:
+                changed.add((root, path))
+
+        return changed, rescan
+
+    def close(self) -> None:
+        """Stop watching, dropping every watch"""
+        os.close(self.fd)
+        self.directories.clear()
+
+# < ======================================================================================================
+# < Polling Watcher Class
+# < ======================================================================================================
+
+class PollingWatcher:
+
+    def __init__(self, roots: list[str], rules: IgnoreRules = None, ignore_filenames: list[str] = (), interval: float = 10.0) -> None:
+        """Initialise a watch on roots that rescans them every interval seconds, for platforms without inotify"""
+        self.roots: list[str] = roots
+        self.rules: IgnoreRules = rules or IgnoreRules([])
+        self.ignore_filenames: list[str] = list(ignore_filenames)
+        self.interval: float = interval
+        self.files: dict[tuple[str, str], tuple[int, int]] = self.snapshot()
+        self.next_poll: float = time.monotonic() + interval
+        logging.info(f"Watching {len(self.files)} files by polling every {interval}s")
+
+    def snapshot(self) -> dict[tuple[str, str], tuple[int, int]]:
+        """Get the size and modification time of every file below roots that is not ignored"""
+        from walker import walk
+        files: dict[tuple[str, str], tuple[int, int]] = {}
+        for root in self.roots:
+            for parent_path, entry in walk([root], self.rules, self.ignore_filenames):
+                if entry.is_file():
+                    try:
+                        stat: os.stat_result = entry.stat()
+                    except OSError:
+                        continue
+                    files[(root, entry.path)] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def read(self, timeout: float | None) -> tuple[set[tuple[str, str]], bool]:
+        """Wait up to timeout seconds, rescanning if a poll falls due, see InotifyWatcher.read"""
+        delay: float = max(0.0, self.next_poll - time.monotonic())
+        if timeout is not None and timeout < delay:
+            time.sleep(timeout)
+            return set(), False
+        time.sleep(delay)
+        files: dict[tuple[str, str], tuple[int, int]] = self.snapshot()
+        changed: set[tuple[str, str]] = {key for key, state in files.items() if self.files.get(key) != state}
+        self.files = files
+        self.next_poll = time.monotonic() + self.interval
+        return changed, False
+
+    def close(self) -> None:
+        """Stop watching"""
+        self.files.clear()
+
+# < ======================================================================================================
+# < Functions
+# < ======================================================================================================
+
+def make_watcher(roots: list[str], rules: IgnoreRules = None, ignore_filenames: list[str] = (), poll_interval: float = 10.0) -> InotifyWatcher | PollingWatcher:
+    """Get an inotify watch on roots on Linux, or a polling one where inotify is not available"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots, rules, ignore_filenames)
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify is not available ({e}), polling for changes instead")
+    return PollingWatcher(roots, rules, ignore_filenames, poll_interval)
+
+def file_state(filepath: str) -> tuple[int, int] | None:
+    """Get the size and modification time of a regular file, or None if it is gone or not a file"""
+    try:
+        stat: os.stat_result = os.stat(filepath)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns) if os.path.isfile(filepath) else None
+
+def is_missing(error: BaseException) -> bool:
+    """Check whether error is Drive reporting that a file or folder, such as the parent of an upload, no longer exists"""
+    return isinstance(error, HttpError) and error.resp.status == 404
+
+def follow_changes(watcher: InotifyWatcher | PollingWatcher, drive_service: any, folder_id: str, options: UploadOptions, service_factory: Callable[[], any] = None, listener: UploadListener = None) -> None:
+    """Upload files as the watcher reports them written into the sync folder already mirrored by sync_mixed, until a rescan is needed
+
+    A reported file is only uploaded once no event has touched it for options.watch_settle seconds and its size and
+    modification time have then stayed the same for another options.watch_settle seconds, so a burst of writes to one
+    file is coalesced into one upload that does not catch it half written. Files settled together are uploaded together,
+    each through sync_file, so a file whose content did not actually change costs no request. While nothing is pending
+    the watch blocks on the kernel, waking every IDLE_TIMEOUT only to check for cancellation. When Drive no longer has a
+    folder or file the index and manifest recorded, the folder index is refreshed and those files are tried once more,
+    and a rescan is asked for if that does not help"""
+
+    listener = listener or UploadListener()
+    index: FolderIndex = FolderIndex(options.folder_index_path, folder_id)
+    target_id: str = index.lookup(options.sync_folder_name)
+    manifest: Manifest = Manifest(options.manifest_path, target_id)
+    batcher: FolderBatcher = FolderBatcher(drive_service, max_waiting = options.queue_size, limiter = options.rate_limiter)
+    engine: UploadEngine | None = None if service_factory is None else UploadEngine(service_factory, options.workers, options.queue_size, options.make_policy())
+    pending: dict[tuple[str, str], tuple[float, tuple[int, int] | None]] = {} # < (root, filepath) to (time last touched, state when checked)
+    retried: set[tuple[str, str]] = set() # < Files requeued after the last refresh of the folder index
+
+    def upload(settled: list[tuple[str, str, tuple[int, int]]]) -> list[tuple[str, str]]:
+        # < Returns the (root, filepath) of every file that failed because Drive no longer has a folder or file recorded for it
+        nonlocal batcher
+        futures: dict[Future, tuple[str, str]] = {}
+        missing: list[tuple[str, str]] = []
+
+        def submit(root: str, filepath: str, relative_path: str, parent_folder_id: str, size: int) -> None:
+            if engine is not None:
+                futures[engine.submit(sync_file, filepath, relative_path, folder_id = parent_folder_id, remote = remote(relative_path), manifest = manifest, options = options, listener = listener, size = size)] = (root, filepath)
+                return
+            try:
+                sync_file(filepath, relative_path, drive_service, parent_folder_id, remote(relative_path), manifest, options, listener)
+            except Exception as e:
+                failed(root, filepath, e)
+
+        def failed(root: str, filepath: str, error: BaseException) -> None:
+            logging.info(f"An error occurred uploading {filepath}, it will be retried when it next changes: {error!r}")
+            if is_missing(error):
+                missing.append((root, filepath))
+
+        try:
+            for root, filepath, state in settled:
+                relative_path: str = f"{os.path.basename(root)}/{os.path.relpath(filepath, root).replace(os.sep, '/')}"
+                parent_folder_id: str = index.resolve(f"{options.sync_folder_name}/{relative_path.rpartition('/')[0]}", drive_service, batcher)
+                batcher.when_created(parent_folder_id, lambda root = root, filepath = filepath, relative_path = relative_path, parent_folder_id = parent_folder_id, size = state[0]: submit(root, filepath, relative_path, parent_folder_id, size))
+            batcher.flush()
+        except HttpError as e:
+            if not is_missing(e):
+                raise
+            logging.info(f"A folder could not be created as its parent no longer exists on Drive: {e!r}")
+            missing = [(root, filepath) for root, filepath, state in settled]
+            batcher = FolderBatcher(drive_service, max_waiting = options.queue_size, limiter = options.rate_limiter) # < Drops uploads waiting on folders never created
+
+        wait(futures)
+        for future, (root, filepath) in futures.items():
+            if not future.cancelled() and future.exception() is not None:
+                failed(root, filepath, future.exception())
+        manifest.save()
+        index.save()
+        return list(dict.fromkeys(missing))
+
+    def remote(relative_path: str) -> dict | None:
+        # < The manifest records what sync_mixed found or uploaded, so no listing is needed to update in place
+        entry: dict | None = manifest.get(relative_path)
+        return None if entry is None else {'id': entry["id"], 'md5Checksum': entry["md5"]}
+
+    try:
+
+        while True:
+
+            listener.check_cancelled()
+            now: float = time.monotonic()
+            timeout: float = IDLE_TIMEOUT
+            if pending:
+                timeout = min(timeout, max(0.0, min(touched for touched, state in pending.values()) + options.watch_settle - now))
+
+            changed, rescan = watcher.read(timeout)
+            now = time.monotonic()
+            for key in changed:
+                pending[key] = (now, None)
+            if rescan:
+                return
+
+            settled: list[tuple[str, str, tuple[int, int]]] = []
+            for (root, filepath), (touched, checked) in list(pending.items()):
+                if now - touched < options.watch_settle:
+                    continue
+                state: tuple[int, int] | None = file_state(filepath)
+                if state is None:
+                    del pending[(root, filepath)]
+                elif state != checked:
+                    pending[(root, filepath)] = (now, state) # < Check again once it has stayed like this for a full settle period
+                else:
+                    del pending[(root, filepath)]
+                    settled.append((root, filepath, state))
+
+            if settled:
+                logging.info(f"Uploading {len(settled)} changed file(s)")
+                missing: list[tuple[str, str]] = upload(settled)
+                if retried.intersection(missing):
+                    logging.info("Drive is still missing folders after refreshing the folder index, rescanning")
+                    return
+                if missing:
+                    # < Someone removed a folder on Drive since it was indexed, so relist the tree and try these files once more
+                    logging.info(f"Refreshing the folder index after {len(missing)} upload(s) found a folder missing")
+                    index.refresh(drive_service, options.sync_folder_name)
+                    for key in missing:
+                        pending[key] = (time.monotonic(), None)
+                retried.difference_update((root, filepath) for root, filepath, state in settled)
+                retried.update(missing)
+
+    finally:
+        if engine is not None:
+            engine.shutdown(cancel = True)
+        manifest.save()
+        index.close()
+
+def watch_mixed(drive_service: any, filepaths: list[str], folderpaths: list[str], folder_id: str = None, options: UploadOptions = None, service_factory: Callable[[], any] = None, listener: UploadListener = None) -> None:
+    """Mirror filepaths and folderpaths into the sync folder with sync_mixed, then keep uploading files changed below
+    folderpaths as they are written, until the listener cancels it with UploadCancelled
+
+    The watch is started before the first sync so nothing written during it is missed, and a full sync_mixed pass
+    is only run again when the watcher loses events or an ignore file changes. Deletions are not mirrored, as in sync mode"""
+
+    options = options or UploadOptions()
+    listener = listener or UploadListener()
+    watcher: InotifyWatcher | PollingWatcher = make_watcher(folderpaths, options.ignore_rules, options.ignore_files, options.watch_poll_interval)
+
+    try:
+        while True:
+            sync_mixed(drive_service, filepaths, folderpaths, folder_id, options, service_factory, listener)
+            logging.info(f"Watching {len(folderpaths)} folder(s) for changes")
+            follow_changes(watcher, drive_service, folder_id, options, service_factory, listener)
+            logging.info("Rescanning watched folders")
+            if isinstance(watcher, InotifyWatcher):
+                watcher.close()
+                watcher = make_watcher(folderpaths, options.ignore_rules, options.ignore_files, options.watch_poll_interval)
+    finally:
+        watcher.close()
+
+# < ======================================================================================================
+# < Execution
+# < ======================================================================================================
+
+if __name__ == "__main__":
+    pass
+else:
+    logging.info(f"Module '{__name__}' running")